@@ -0,0 +1,48 @@
+import importlib
+import os
+import sys
+
+import pytest
+from cookiecutter.main import cookiecutter
+
+TEMPLATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROJECT_SLUG = "baked_pset"
+
+# Placeholders of the template that the framework code imports, filled in as a project would
+PLACEHOLDERS = {
+    "preprocess/cleandata.py": [("[<Add yours here>]", "[]"), ('TARGET_NAME = "<Add yours here>"', 'TARGET_NAME = "y"')],
+    "model/trainmodel.py": [
+        ('label = "<Add yours here>"', 'label = "y"'),
+        ("    model =\n", "    from sklearn.linear_model import SGDRegressor\n    model = SGDRegressor(random_state=0)\n"),
+    ],
+}
+
+
+@pytest.fixture(scope="session")
+def project(tmp_path_factory):
+    """
+    Bakes the template once per test session, with its placeholders filled in, and makes the project importable
+    :return: function importing a module of the project, e.g. project("preprocess.splitdata")
+    """
+    output_dir = tmp_path_factory.mktemp("baked")
+    repo_dir = cookiecutter(
+        TEMPLATE_DIR, no_input=True, output_dir=str(output_dir), extra_context={"project_name": PROJECT_SLUG}
+    )
+
+    for path, replacements in PLACEHOLDERS.items():
+        path = os.path.join(repo_dir, PROJECT_SLUG, path)
+        with open(path) as f:
+            source = f.read()
+        for placeholder, value in replacements:
+            source = source.replace(placeholder, value)
+        with open(path, "w") as f:
+            f.write(source)
+
+    sys.path.insert(0, repo_dir)
+    try:
+        yield lambda name: importlib.import_module(PROJECT_SLUG + "." + name)
+    finally:
+        sys.path.remove(repo_dir)
+        for name in [name for name in sys.modules if name == PROJECT_SLUG or name.startswith(PROJECT_SLUG + ".")]:
+            del sys.modules[name]
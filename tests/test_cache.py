@@ -0,0 +1,95 @@
+import luigi
+import pytest
+from luigi.task_register import Register
+
+STAGE_MODULE = "fingerprint_stage"
+
+
+@pytest.fixture
+def tasks(project, tmp_path, monkeypatch):
+    """Upstream and Downstream tasks fingerprinting a stage module written to tmp_path"""
+    cache = project("utils.luigi.cache")
+    task = project("utils.luigi.task")
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / (STAGE_MODULE + ".py")).write_text("def stage(df):\n    return df\n")
+
+    class Upstream(luigi.Task):
+        alpha = luigi.IntParameter(default=1)
+
+        fingerprint = cache.Fingerprint(STAGE_MODULE)
+
+    class Downstream(luigi.Task):
+        # Passed on to Upstream, without being significant for Downstream itself
+        alpha = luigi.IntParameter(default=1, significant=False)
+
+        fingerprint = cache.Fingerprint()
+
+        requires = task.Requires()
+        source_data = task.Requirement(Upstream)
+
+    yield Upstream, Downstream
+    Register.clear_instance_cache()
+
+
+def fingerprint(task_class, **params):
+    # Tasks are cached by parameters, and their fingerprint with them
+    Register.clear_instance_cache()
+    return task_class(**params).fingerprint
+
+
+def test_fingerprint_is_stable(tasks):
+    upstream, downstream = tasks
+
+    assert fingerprint(downstream) == fingerprint(downstream)
+    assert fingerprint(upstream) != fingerprint(downstream)
+
+
+def test_fingerprint_changes_with_upstream_module(tasks, tmp_path):
+    upstream, downstream = tasks
+    before = fingerprint(upstream), fingerprint(downstream)
+
+    (tmp_path / (STAGE_MODULE + ".py")).write_text("def stage(df):\n    return df.dropna()\n")
+
+    after = fingerprint(upstream), fingerprint(downstream)
+    assert before[0] != after[0]
+    assert before[1] != after[1]
+
+
+def test_fingerprint_changes_with_upstream_param(tasks):
+    upstream, downstream = tasks
+
+    assert fingerprint(upstream, alpha=1) != fingerprint(upstream, alpha=2)
+    assert fingerprint(downstream, alpha=1) != fingerprint(downstream, alpha=2)
+
+
+def test_output_cache_evicts_least_recently_used(project, tmp_path):
+    cache_module = project("utils.luigi.cache")
+    cache = cache_module.OutputCache(str(tmp_path), max_bytes=2500)
+
+    entries = {}
+    for accessed, name in enumerate(["a" * 16, "b" * 16, "c" * 16]):
+        entry = tmp_path / "Task" / name
+        entry.mkdir(parents=True)
+        (entry / "part.0.parquet").write_bytes(b"x" * 1000)
+        (entry / cache.ACCESS_FLAG).write_text(repr(float(accessed)))
+        entries[name] = str(entry)
+
+    evicted = cache.evict()
+
+    assert evicted == [entries["a" * 16]]
+    assert not (tmp_path / "Task" / ("a" * 16)).exists()
+    assert (tmp_path / "Task" / ("c" * 16)).exists()
+
+
+def test_output_cache_keeps_entries_in_use(project, tmp_path):
+    cache_module = project("utils.luigi.cache")
+    cache = cache_module.OutputCache(str(tmp_path), max_bytes=0)
+
+    entry = tmp_path / "Task" / ("a" * 16)
+    entry.mkdir(parents=True)
+    (entry / "part.0.parquet").write_bytes(b"x" * 1000)
+
+    assert cache.entry(str(entry / "part.0.parquet")) == str(entry)
+    assert cache.evict(keep={str(entry)}) == []
+    assert entry.exists()
@@ -0,0 +1,84 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+from dask.delayed import Delayed
+
+
+def make_rows(rows=3000, duplicate_rate=0.1, nan_rate=0.05):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "size": rng.integers(50, 60, rows).astype("float64"),
+        "rooms": rng.integers(1, 4, rows).astype("float64"),
+        # The string dtype dask converts text to
+        "city": pd.array(rng.choice(["Boston", "Seattle", None], rows), dtype=pd.StringDtype("pyarrow")),
+        "y": rng.integers(0, 3, rows).astype("float64"),
+    })
+    for column in ("size", "y"):
+        df.loc[rng.random(rows) < nan_rate, column] = np.nan
+
+    # Copies of earlier rows, shuffled in so that most land in other partitions than their original
+    copies = df.sample(frac=duplicate_rate, random_state=1)
+    return pd.concat([df, copies]).sample(frac=1, random_state=2).reset_index(drop=True)
+
+
+def expected_clean(df, drop_columns, required_columns, key_columns=None):
+    # Same as drop_duplicates().dropna() on whole rows, whose copies are all complete or all not. On key columns,
+    # only complete rows count as the first row of a key
+    df = df.drop(columns=drop_columns)
+    return df.dropna(subset=required_columns).drop_duplicates(subset=key_columns).reset_index(drop=True)
+
+
+def test_clean_data_matches_pandas(project):
+    cleandata = project("preprocess.cleandata")
+    df = make_rows()
+
+    for npartitions in (1, 4, 9):
+        cleaned = cleandata.clean_data(dd.from_pandas(df, npartitions=npartitions), ["id"], "y")
+
+        pd.testing.assert_frame_equal(
+            cleaned.compute().reset_index(drop=True), expected_clean(df, ["id"], ["size", "rooms", "y"])
+        )
+
+
+def test_clean_data_drops_duplicates_across_partitions(project):
+    cleandata = project("preprocess.cleandata")
+    df = pd.DataFrame({"x": [1.0, 2.0, 3.0, 1.0, 2.0, 4.0], "y": [0.0] * 6})
+
+    # Each partition holds distinct rows, all the duplicates are in the second one
+    cleaned = cleandata.clean_data(dd.from_pandas(df, npartitions=2, sort=False), [], "y")
+
+    assert cleaned.compute()["x"].tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_clean_data_with_key_columns(project):
+    cleandata = project("preprocess.cleandata")
+    df = make_rows()
+
+    cleaned = cleandata.clean_data(dd.from_pandas(df, npartitions=4), ["id"], "y", key_columns=["size", "rooms"])
+
+    pd.testing.assert_frame_equal(
+        cleaned.compute().reset_index(drop=True),
+        expected_clean(df, ["id"], ["size", "rooms", "y"], key_columns=["size", "rooms"]),
+    )
+
+
+def test_clean_data_without_deduplication(project):
+    cleandata = project("preprocess.cleandata")
+    df = make_rows()
+
+    cleaned = cleandata.clean_data(dd.from_pandas(df, npartitions=4), ["id"], "y", deduplicate=False)
+
+    expected = df.drop(columns=["id"]).dropna(subset=["size", "rooms", "y"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(cleaned.compute().reset_index(drop=True), expected)
+
+
+def test_find_duplicate_rows_is_lazy(project):
+    cleandata = project("preprocess.cleandata")
+    df = pd.DataFrame({"x": [1.0, 2.0, 1.0, np.nan, np.nan], "y": [0.0] * 5})
+
+    duplicate_rows = cleandata.find_duplicate_rows(dd.from_pandas(df, npartitions=1), ["x", "y"])
+
+    assert isinstance(duplicate_rows, Delayed)
+    # Rows missing a required value are never duplicates
+    assert duplicate_rows.compute().tolist() == [2]
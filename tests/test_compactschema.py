@@ -0,0 +1,53 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+
+
+def make_frame(rows=1000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows, dtype="int64"),
+        "rooms": rng.integers(1, 5, rows).astype("float64"),
+        "size": rng.integers(50, 60, rows) + 0.5,
+        "price": rng.normal(size=rows),
+        "floors": pd.array([1, None] * (rows // 2), dtype="Int64"),
+        "city": pd.array(rng.choice(["Boston", "Seattle", "Austin"], rows), dtype=pd.StringDtype("pyarrow")),
+    })
+
+
+def test_plan_and_apply_round_trip(project):
+    compactschema = project("preprocess.compactschema")
+    df = make_frame()
+    ddf = dd.from_pandas(df, npartitions=4)
+
+    schema = compactschema.plan_compact_schema(ddf)
+    compacted = compactschema.apply_compact_schema(ddf, schema).compute()
+
+    assert schema["rows"] == len(df)
+    assert schema["bytes_after"] < schema["bytes_before"]
+    assert {column: entry["dtype_after"] for column, entry in schema["columns"].items()} == {
+        "id": "int16",
+        "rooms": "int8",
+        "size": "float32",
+        "price": "float64",
+        # Integers with nulls are kept
+        "floors": "Int64",
+        "city": "category",
+    }
+    assert schema["columns"]["city"]["categories"] == ["Austin", "Boston", "Seattle"]
+    assert compacted.dtypes.astype(str).to_dict() == {
+        "id": "int16", "rooms": "int8", "size": "float32", "price": "float64", "floors": "Int64", "city": "category",
+    }
+    assert compacted["city"].cat.categories.tolist() == ["Austin", "Boston", "Seattle"]
+
+    # No value is changed by the conversion
+    pd.testing.assert_frame_equal(compacted.astype(df.dtypes.to_dict()), df)
+
+
+def test_float32_tolerance(project):
+    compactschema = project("preprocess.compactschema")
+    ddf = dd.from_pandas(pd.DataFrame({"price": [0.1, 0.2, 0.3]}), npartitions=2)
+
+    assert compactschema.plan_compact_schema(ddf)["columns"]["price"]["dtype_after"] == "float64"
+    schema = compactschema.plan_compact_schema(ddf, float32_tolerance=1e-6)
+    assert schema["columns"]["price"]["dtype_after"] == "float32"
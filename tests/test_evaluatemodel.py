@@ -0,0 +1,79 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_predictions(evaluatemodel, dtype="float64", rows=1000, npartitions=4):
+    values = np.arange(rows).astype(dtype)
+    return values, dd.from_pandas(pd.DataFrame({evaluatemodel.PREDICTION_COLUMN: values}), npartitions=npartitions)
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32", "int64", "bool"])
+def test_prediction_array_round_trip(project, tmp_path, dtype):
+    evaluatemodel = project("model.evaluatemodel")
+    values, predictions = make_predictions(evaluatemodel, dtype)
+    path = str(tmp_path / "predictions.npy")
+
+    header = evaluatemodel.save_prediction_array(predictions, path)
+    array, loaded_header = evaluatemodel.load_prediction_array(path)
+
+    assert loaded_header == header
+    assert header["rows"] == len(values)
+    assert header["partition_rows"] == [len(part) for part in predictions.partitions]
+    assert isinstance(array, np.memmap)
+    assert array.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(array, values)
+
+
+def test_prediction_array_in_memory(project, tmp_path):
+    evaluatemodel = project("model.evaluatemodel")
+    values, predictions = make_predictions(evaluatemodel)
+    path = str(tmp_path / "predictions.npy")
+    evaluatemodel.save_prediction_array(predictions, path)
+
+    array, _ = evaluatemodel.load_prediction_array(path, mmap_mode=None)
+
+    assert not isinstance(array, np.memmap)
+    np.testing.assert_array_equal(array, values)
+
+
+def test_prediction_dask_array_lines_up_with_chunks(project, tmp_path):
+    evaluatemodel = project("model.evaluatemodel")
+    values, predictions = make_predictions(evaluatemodel)
+    path = str(tmp_path / "predictions.npy")
+    evaluatemodel.save_prediction_array(predictions, path)
+
+    array = evaluatemodel.prediction_dask_array(path, (300, 300, 400))
+
+    assert array.chunks == ((300, 300, 400),)
+    np.testing.assert_array_equal(array.compute(), values)
+    with pytest.raises(ValueError):
+        evaluatemodel.prediction_dask_array(path, (300, 300))
+
+
+def test_text_predictions_are_refused(project, tmp_path):
+    evaluatemodel = project("model.evaluatemodel")
+    predictions = dd.from_pandas(pd.DataFrame({evaluatemodel.PREDICTION_COLUMN: ["a", "b"]}), npartitions=1)
+
+    with pytest.raises(TypeError):
+        evaluatemodel.save_prediction_array(predictions, str(tmp_path / "predictions.npy"))
+
+
+@pytest.mark.parametrize("dtype", ["float64", "int64", "bool"])
+def test_parquet_prediction_array_reads_rows_from_footers(project, tmp_path, dtype, monkeypatch):
+    evaluatemodel = project("model.evaluatemodel")
+    target_module = project("utils.luigi.dask.target")
+    values, predictions = make_predictions(evaluatemodel, dtype, npartitions=5)
+    target = target_module.ParquetTarget(str(tmp_path / "predictions") + "/", glob="*.parquet")
+    target.write_dask(predictions)
+    path = str(tmp_path / "predictions.npy")
+    # Fewer partitions at once than there are files
+    monkeypatch.setattr(evaluatemodel, "WRITE_PARALLEL_PARTITIONS", 2)
+
+    header = evaluatemodel.save_parquet_prediction_array(target, path)
+    array, _ = evaluatemodel.load_prediction_array(path)
+
+    assert header["partition_rows"] == [len(part) for part in predictions.partitions]
+    assert array.dtype == np.dtype(dtype)
+    np.testing.assert_array_equal(array, values)
@@ -0,0 +1,81 @@
+import re
+
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+
+FEATURES = {
+    "is_city": ["new york", "york", "boston", "san francisco", "san"],
+    "is_new": ["new", "brand new", "renovated"],
+    "is_loft": ["loft", "lofts", "loft-style"],
+    "is_symbol": ["c++", "a.b", "50%"],
+}
+
+VOCABULARY = [
+    "new", "york", "yorkshire", "boston", "bostonian", "san", "francisco", "brand", "renovated", "loft", "lofts",
+    "loft-style", "c++", "a.b", "axb", "50%", "flat", "cosy", ",", ".", "-",
+]
+
+
+def make_texts(rows=500):
+    rng = np.random.default_rng(0)
+    texts = [" ".join(rng.choice(VOCABULARY, rng.integers(0, 8))) for _ in range(rows)]
+    return pd.Series(texts + ["New York loft", "newyork", "san-francisco", "", None], dtype="object")
+
+
+def contains(texts, words):
+    # The regex of extract_features_from_text_column, on a pandas series
+    pattern = r'\b(?:{})\b'.format('|'.join(map(re.escape, words)))
+    return texts.str.contains(pattern, regex=True, na=False).astype("uint8").to_numpy()
+
+
+def test_matcher_matches_str_contains_per_feature(project):
+    extractfeatures = project("preprocess.extractfeatures")
+    texts = make_texts()
+
+    flags = extractfeatures.TextFeatureMatcher(FEATURES).flags(texts)
+
+    for index, (name, words) in enumerate(FEATURES.items()):
+        np.testing.assert_array_equal(flags[:, index], contains(texts, words), err_msg=name)
+
+
+def test_batch_matches_one_feature_at_a_time(project):
+    extractfeatures = project("preprocess.extractfeatures")
+    df = pd.DataFrame({"description": make_texts().fillna(""), "price": 1.0})
+
+    ddf = dd.from_pandas(df, npartitions=3)
+    expected = ddf.copy()
+    for name, words in FEATURES.items():
+        expected = extractfeatures.extract_features_from_text_column(expected, "description", name, words)
+
+    actual = extractfeatures.extract_features_from_text_column_batch(ddf, "description", FEATURES)
+
+    pd.testing.assert_frame_equal(actual.compute(), expected.compute())
+
+
+def test_trie_regex_matches_the_words(project):
+    extractfeatures = project("preprocess.extractfeatures")
+    words = ["abc", "abd", "ab", "b", "a.c"]
+
+    regex = re.compile("^(?:{})$".format(extractfeatures.trie_regex(words)))
+
+    assert all(regex.match(word) for word in words)
+    assert not any(regex.match(word) for word in ["a", "abcd", "axc", "c", ""])
+
+
+def test_empty_word_lists_match_nothing(project):
+    extractfeatures = project("preprocess.extractfeatures")
+    texts = make_texts()
+
+    flags = extractfeatures.TextFeatureMatcher({"is_city": [], "is_new": []}).flags(texts)
+
+    assert flags.shape == (len(texts), 2)
+    assert not flags.any()
+    assert extractfeatures.TextFeatureMatcher({}).flags(texts).shape == (len(texts), 0)
+
+    df = pd.DataFrame({"description": texts.fillna(""), "price": 1.0})
+    extracted = extractfeatures.extract_features_from_text_column_batch(
+        dd.from_pandas(df, npartitions=2), "description", {"is_city": []}
+    ).compute()
+    assert extracted["is_city"].dtype == "uint8"
+    assert not extracted["is_city"].any()
@@ -0,0 +1,50 @@
+import json
+
+import fsspec
+import pandas as pd
+
+
+def write_csv(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_integer_columns_are_read_as_int64(project, tmp_path):
+    ingestdata = project("preprocess.ingestdata")
+    target = project("utils.luigi.dask.target")
+    # The missing rooms is after the sampled rows
+    write_csv(tmp_path, "src0.csv", "id,rooms,size,city\n1,2,50.5,Boston\n2,3,51.0,Seattle\n3,,52.0,Austin\n")
+    write_csv(tmp_path, "src1.csv", "id,rooms,size,city\n4,1,53.0,Boston\n5,2,54,Austin\n")
+    source = target.CSVTarget(str(tmp_path) + "/", glob="*.csv", flag="")
+    fs = fsspec.filesystem("file")
+
+    schema = ingestdata.load_csv_schema(str(tmp_path / "_CSV_SCHEMA.json"), fs, source.files(), sample_rows=2)
+    ddf = source.read_dask(**ingestdata.csv_read_options(schema, ["id"], blocksize=None, engine="c"))
+
+    assert {column: schema["dtypes"][column] for column in ("id", "rooms", "size")} == {
+        "id": "Int64", "rooms": "Int64", "size": "float64"
+    }
+    df = ddf.compute()
+    assert list(df.columns) == ["rooms", "size", "city"]
+    assert str(df["rooms"].dtype) == "Int64"
+    assert df["rooms"].isna().sum() == 1
+    assert str(df["size"].dtype) == "float64"
+
+
+def test_schema_of_an_old_version_is_inferred_again(project, tmp_path):
+    ingestdata = project("preprocess.ingestdata")
+    path = write_csv(tmp_path, "src0.csv", "id,rooms\n1,2\n2,3\n")
+    schema_path = tmp_path / "_CSV_SCHEMA.json"
+    fs = fsspec.filesystem("file")
+
+    schema = ingestdata.load_csv_schema(str(schema_path), fs, [path])
+    # Cached schemas of the current version are reused as they are
+    schema_path.write_text(json.dumps(dict(schema, dtypes={"id": "float64", "rooms": "float64"})))
+    assert ingestdata.load_csv_schema(str(schema_path), fs, [path])["dtypes"]["rooms"] == "float64"
+
+    schema_path.write_text(json.dumps(dict(schema, version=ingestdata.CSV_SCHEMA_VERSION - 1, dtypes={})))
+
+    assert ingestdata.load_csv_schema(str(schema_path), fs, [path]) == schema
+    assert json.loads(schema_path.read_text()) == schema
+    assert not fs.exists(str(schema_path) + ".tmp")
@@ -0,0 +1,69 @@
+import fsspec
+
+
+def write_sources(directory, names):
+    directory.mkdir(exist_ok=True)
+    for name in names:
+        (directory / name).write_text("id,y\n1,2.0\n")
+    return sorted(str(directory / name) for name in names)
+
+
+def test_pending_until_added_and_saved(project, tmp_path):
+    manifest_module = project("utils.luigi.manifest")
+    fs = fsspec.filesystem("file")
+    path = str(tmp_path / "_SOURCES.json")
+    sources = write_sources(tmp_path / "src", ["a.csv", "b.csv"])
+
+    manifest = manifest_module.SourceManifest(fs, path)
+    pending = manifest.pending(fs, sources)
+    assert [signature["path"] for signature in pending] == sources
+
+    manifest.add(pending)
+    assert manifest.pending(fs, sources) == []
+
+    # Only saved batches are seen by the next run
+    assert manifest_module.SourceManifest(fs, path).pending(fs, sources) == pending
+    manifest.save()
+    assert manifest_module.SourceManifest(fs, path).pending(fs, sources) == []
+
+
+def test_new_and_rewritten_files_are_pending(project, tmp_path):
+    manifest_module = project("utils.luigi.manifest")
+    fs = fsspec.filesystem("file")
+    path = str(tmp_path / "_SOURCES.json")
+    sources = write_sources(tmp_path / "src", ["a.csv", "b.csv"])
+
+    manifest = manifest_module.SourceManifest(fs, path)
+    manifest.add(manifest.pending(fs, sources))
+    manifest.save()
+
+    (tmp_path / "src" / "a.csv").write_text("id,y\n1,2.0\n3,4.0\n")
+    sources = write_sources(tmp_path / "src", ["c.csv"]) + sources
+
+    manifest = manifest_module.SourceManifest(fs, path)
+    pending = [signature["path"] for signature in manifest.pending(fs, sources)]
+    assert pending == [str(tmp_path / "src" / "c.csv"), str(tmp_path / "src" / "a.csv")]
+    assert len(manifest.batches) == 1
+
+
+def test_uncommitted_files_are_discarded(project, tmp_path):
+    manifest_module = project("utils.luigi.manifest")
+    target_module = project("utils.luigi.dask.target")
+    fs = fsspec.filesystem("file")
+    output = target_module.ParquetTarget(str(tmp_path / "data") + "/", glob="*.parquet")
+    manifest = manifest_module.SourceManifest(fs, output.path + manifest_module.SourceManifest.FILENAME)
+    sources = write_sources(tmp_path / "src", ["a.csv"])
+
+    write_sources(tmp_path / "data", ["part.0.parquet"])
+    manifest.add(manifest.pending(fs, sources), manifest.uncommitted(output))
+    manifest.save()
+    assert manifest.files == ["part.0.parquet"]
+
+    # A run appending a partition, which fails before saving the manifest
+    write_sources(tmp_path / "data", ["part.1.parquet"])
+    manifest = manifest_module.SourceManifest(fs, manifest.path)
+    assert manifest.uncommitted(output) == ["part.1.parquet"]
+
+    assert manifest.discard_uncommitted(output) == ["part.1.parquet"]
+    assert not (tmp_path / "data" / "part.1.parquet").exists()
+    assert (tmp_path / "data" / "part.0.parquet").exists()
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def modelstore(project):
+    modelstore = project("model.modelstore")
+    modelstore.clear_model_cache()
+    yield modelstore
+    modelstore.clear_model_cache()
+
+
+def save(modelstore, tmp_path):
+    path = str(tmp_path / "model.joblib")
+    modelstore.save_model({"weights": np.arange(1000, dtype="float64")}, path)
+    return path
+
+
+def tamper(path):
+    '''Flips a byte of the weights, keeping the size and modification time of the file'''
+    stat = os.stat(path)
+    with open(path, "r+b") as f:
+        f.seek(stat.st_size - 100)
+        byte = f.read(1)
+        f.seek(stat.st_size - 100)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_load_round_trip_is_cached(modelstore, tmp_path):
+    path = save(modelstore, tmp_path)
+
+    model = modelstore.load_model(path)
+
+    assert isinstance(model["weights"], np.memmap)
+    np.testing.assert_array_equal(model["weights"], np.arange(1000))
+    assert modelstore.load_model(path) is model
+
+
+def test_tampered_model_is_refused(modelstore, tmp_path):
+    path = save(modelstore, tmp_path)
+    modelstore.load_model(path)
+
+    tamper(path)
+
+    with pytest.raises(ValueError):
+        modelstore.verify_model(path)
+    # Not even from the cache
+    with pytest.raises(ValueError):
+        modelstore.load_model(path)
+
+
+def test_trust_stat_skips_hashing(modelstore, tmp_path):
+    path = save(modelstore, tmp_path)
+
+    tamper(path)
+
+    # Opted in: the size and modification time match the verified version
+    modelstore.verify_model(path, trust_stat=True)
+
+    os.utime(path)
+    with pytest.raises(ValueError):
+        modelstore.verify_model(path, trust_stat=True)
@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+SOURCE = '''# -*- coding: utf-8 -*-
+import module_that_is_not_installed
+
+BINS = 20
+BINNINGS = ("fixed", "quantile")
+LIMIT: int = 5
+NAME = "café"
+BINS = 30
+DEFAULTS = {"a": [1, 2]}
+COMPUTED = len(BINNINGS)
+'''
+
+
+@pytest.fixture
+def stage_module(tmp_path, monkeypatch):
+    package = tmp_path / "modules_test_package"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "stage.py").write_text(SOURCE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "modules_test_package.stage"
+    for name in ("modules_test_package", "modules_test_package.stage"):
+        sys.modules.pop(name, None)
+
+
+def test_module_constant_reads_literals_without_importing(project, stage_module):
+    modules = project("utils.modules")
+
+    assert modules.module_constant(stage_module, "BINNINGS") == ("fixed", "quantile")
+    assert modules.module_constant(stage_module, "LIMIT") == 5
+    assert modules.module_constant(stage_module, "NAME") == "café"
+    assert modules.module_constant(stage_module, "DEFAULTS") == {"a": [1, 2]}
+    # The last assignment wins, as when importing
+    assert modules.module_constant(stage_module, "BINS") == 30
+    assert stage_module not in sys.modules
+
+
+def test_module_constant_errors(project, stage_module):
+    modules = project("utils.modules")
+
+    with pytest.raises(AttributeError):
+        modules.module_constant(stage_module, "MISSING")
+    with pytest.raises(ValueError):
+        modules.module_constant(stage_module, "COMPUTED")
+    with pytest.raises(ImportError):
+        modules.module_source("modules_test_package.missing")
+
+
+def test_module_constant_matches_the_stage_modules(project):
+    modules = project("utils.modules")
+    visualizepredictions = project("visualize.visualizepredictions")
+
+    for constant in ("BINS", "BINNING", "BINNINGS"):
+        assert modules.module_constant(visualizepredictions.__name__, constant) == getattr(
+            visualizepredictions, constant
+        )
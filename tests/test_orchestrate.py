@@ -0,0 +1,85 @@
+import collections
+import functools
+
+import dask
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+
+NPARTITIONS = 4
+
+
+@pytest.fixture
+def calls():
+    return collections.Counter()
+
+
+def counted(function, calls):
+    '''Wraps a stage function to count its calls, by name'''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        calls[function.__name__] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def make_source(rows=4000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "size": rng.integers(50, 60, rows).astype("float64"),
+        "city": rng.choice(["Boston", "Seattle", "Austin"], rows),
+        "y": rng.normal(size=rows),
+    })
+    return dd.from_pandas(pd.concat([df, df.iloc[:100]], ignore_index=True), npartitions=NPARTITIONS)
+
+
+@pytest.fixture
+def count_cleaning(project, calls, monkeypatch):
+    cleandata = project("preprocess.cleandata")
+    for name in ("_row_occurrences", "_clean_partition"):
+        monkeypatch.setattr(cleandata, name, counted(getattr(cleandata, name), calls))
+    return calls
+
+
+@pytest.mark.parametrize("materialize_intermediates", [False, True])
+def test_fused_run_computes_each_stage_once(project, count_cleaning, tmp_path, monkeypatch, materialize_intermediates):
+    orchestrate = project("orchestration.orchestrate")
+    source = make_source()
+    monkeypatch.setattr(orchestrate.TransformData, "read_source", lambda task, files=None: source)
+
+    task = orchestrate.TransformData(
+        dir_path=str(tmp_path), fused=True, materialize_intermediates=materialize_intermediates
+    )
+    with dask.config.set(scheduler="sync"):
+        task.run()
+
+    # Once per source partition, shared by the vocabulary fit and the writes
+    assert count_cleaning == {"_row_occurrences": NPARTITIONS, "_clean_partition": NPARTITIONS}
+
+    transformed = task.output().read_dask().compute()
+    assert len(transformed) == 4000
+    assert str(transformed["city"].dtype) == "int32"
+    assert task.output().fs.exists(task.state_path())
+
+
+def test_compacted_clean_data_is_cleaned_once(project, count_cleaning, tmp_path, monkeypatch):
+    orchestrate = project("orchestration.orchestrate")
+    target = project("utils.luigi.dask.target")
+    source = target.ParquetTarget(str(tmp_path / "source") + "/", glob="*.parquet")
+    source.write_dask(make_source())
+    monkeypatch.setattr(orchestrate.CleanData, "input", lambda task: {"source_data": source})
+
+    task = orchestrate.CleanData(dir_path=str(tmp_path), compact=True)
+    with dask.config.set(scheduler="sync"):
+        task.run()
+
+    # The compaction is planned from the written cleaned data, rather than cleaning it again
+    assert count_cleaning == {"_row_occurrences": NPARTITIONS, "_clean_partition": NPARTITIONS}
+
+    cleaned = task.output().read_dask().compute()
+    assert len(cleaned) == 4000
+    assert str(cleaned["size"].dtype) == "int8"
+    assert str(cleaned["city"].dtype) == "category"
+    assert task.output().exists()
+    assert not task.output().fs.exists(task.output().path + "_uncompacted/")
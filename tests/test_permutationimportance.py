@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+
+def make_sample(rows=500):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({"signal": rng.normal(size=rows), "noise": rng.normal(size=rows)})
+    y = 3 * X["signal"] + rng.normal(scale=0.1, size=rows)
+    return X, y
+
+
+def test_permutation_importance_ranks_the_features(project):
+    permutationimportance = project("model.permutationimportance")
+    X, y = make_sample()
+    model = LinearRegression().fit(X, y)
+
+    result = permutationimportance.permutation_importance(model, X, y, n_repeats=3, n_jobs=1)
+
+    assert result["features"] == ["signal", "noise"]
+    assert result["rows"] == len(y) and result["n_repeats"] == 3
+    assert result["baseline_score"] > 0.99
+    signal, noise = result["importances_mean"]
+    assert signal > 1 and abs(noise) < 0.01
+    assert all(std >= 0 for std in result["importances_std"])
+
+
+def test_permutation_importance_is_reproducible_across_processes(project):
+    permutationimportance = project("model.permutationimportance")
+    X, y = make_sample()
+    # Fitted on arrays, as models fitted on dask collections are
+    model = LinearRegression().fit(X.to_numpy(), y)
+
+    in_process = permutationimportance.permutation_importance(model, X, y, n_repeats=2, n_jobs=1)
+    on_pool = permutationimportance.permutation_importance(model, X, y, n_repeats=2, n_jobs=2)
+
+    assert in_process == on_pool
+
+
+def test_cached_permutation_importance_samples_once(project, tmp_path):
+    permutationimportance = project("model.permutationimportance")
+    X, y = make_sample()
+    model = LinearRegression().fit(X, y)
+    samples = []
+
+    def load_sample():
+        samples.append(1)
+        return X, y
+
+    path = str(tmp_path / "importance" / "key.json")
+    first = permutationimportance.cached_permutation_importance(model, load_sample, path, n_repeats=2, n_jobs=1)
+    second = permutationimportance.cached_permutation_importance(model, load_sample, path, n_repeats=2, n_jobs=1)
+
+    assert first == second
+    assert len(samples) == 1
+    assert not (tmp_path / "importance" / "key.json.tmp").exists()
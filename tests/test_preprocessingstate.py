@@ -0,0 +1,48 @@
+import json
+
+import dask.dataframe as dd
+import pandas as pd
+import pytest
+
+
+def strings(values):
+    return pd.array(values, dtype=pd.StringDtype("pyarrow"))
+
+
+def test_save_load_and_apply_round_trip(project, tmp_path):
+    preprocessingstate = project("preprocess.preprocessingstate")
+    transformdata = project("preprocess.transformdata")
+    train = dd.from_pandas(
+        pd.DataFrame({"city": strings(["Boston", "Seattle", "Boston", "Austin"]), "y": [1.0, 2.0, 3.0, 4.0]}),
+        npartitions=2,
+    )
+    vocabularies = transformdata.fit_categorical_vocabularies(train)
+    path = str(tmp_path / preprocessingstate.PREPROCESSING_STATE_FILENAME)
+
+    preprocessingstate.save_preprocessing_state(preprocessingstate.build_preprocessing_state(vocabularies), path)
+    state = preprocessingstate.load_preprocessing_state(path)
+
+    assert state["version"] == preprocessingstate.PREPROCESSING_STATE_VERSION
+    assert state["target_name"] == "y"
+    assert state["vocabularies"] == vocabularies
+    assert not (tmp_path / (preprocessingstate.PREPROCESSING_STATE_FILENAME + ".tmp")).exists()
+
+    # New rows keep their nulls and unseen categories, and may miss the label
+    new = dd.from_pandas(pd.DataFrame({"city": strings(["Seattle", "Denver", None, "Austin"])}), npartitions=2)
+    transformed = preprocessingstate.apply_preprocessing_state(new, state).compute()
+
+    assert str(transformed["city"].dtype) == "int32"
+    assert transformed["city"].tolist() == [2, -1, -1, 0]
+    # The same codes as the training data
+    encoded = transformdata.apply_categorical_vocabularies(train, vocabularies).compute()
+    assert encoded["city"].tolist() == [1, 2, 1, 0]
+
+
+def test_state_of_another_version_is_refused(project, tmp_path):
+    preprocessingstate = project("preprocess.preprocessingstate")
+    path = tmp_path / preprocessingstate.PREPROCESSING_STATE_FILENAME
+    state = preprocessingstate.build_preprocessing_state({})
+    path.write_text(json.dumps(dict(state, version=preprocessingstate.PREPROCESSING_STATE_VERSION + 1)))
+
+    with pytest.raises(ValueError, match="Rerun TransformData"):
+        preprocessingstate.load_preprocessing_state(str(path))
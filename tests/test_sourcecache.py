@@ -0,0 +1,77 @@
+from unittest import mock
+
+import fsspec
+import pytest
+
+
+@pytest.fixture
+def source():
+    """In-memory filesystem standing in for a bucket, with three source files"""
+    fs = fsspec.filesystem("memory")
+    if fs.exists("/bucket"):
+        fs.rm("/bucket", recursive=True)
+    for index in range(3):
+        fs.pipe("/bucket/src{}.csv".format(index), b"id,y\n" + b"1,2.0\n" * (index + 1) * 100)
+    yield fs, sorted(fs.glob("/bucket/*.csv"))
+    fs.rm("/bucket", recursive=True)
+
+
+def test_fetch_copies_missing_files_once(project, tmp_path, source):
+    sourcecache = project("utils.luigi.sourcecache")
+    fs, paths = source
+    cache = sourcecache.SourceCache(str(tmp_path / "cache"), max_bytes=0)
+
+    with mock.patch.object(fs, "get", wraps=fs.get) as get:
+        local_paths = cache.fetch(fs, paths)
+        assert get.call_count == 1
+        assert cache.fetch(fs, paths) == local_paths
+        assert get.call_count == 1
+
+    for path, local in zip(paths, local_paths):
+        assert local.endswith("/" + path.rsplit("/", 1)[1])
+        with open(local, "rb") as f:
+            assert f.read() == fs.cat(path)
+    assert not list((tmp_path / "cache").glob("*/*.tmp"))
+
+
+def test_rewritten_files_are_fetched_again(project, tmp_path, source):
+    sourcecache = project("utils.luigi.sourcecache")
+    fs, paths = source
+    cache = sourcecache.SourceCache(str(tmp_path / "cache"), max_bytes=0)
+    before = cache.fetch(fs, paths)
+
+    fs.pipe(paths[0], b"id,y\n3,4.0\n")
+
+    after = cache.fetch(fs, paths)
+    assert after[0] != before[0]
+    assert after[1:] == before[1:]
+    with open(after[0], "rb") as f:
+        assert f.read() == b"id,y\n3,4.0\n"
+
+
+def test_evicts_least_recently_used_files(project, tmp_path, source):
+    sourcecache = project("utils.luigi.sourcecache")
+    fs, paths = source
+    sizes = [fs.size(path) for path in paths]
+    # Room for the last two files and their access stamps, not for all three
+    cache = sourcecache.SourceCache(str(tmp_path / "cache"), max_bytes=sizes[1] + sizes[2] + 200)
+
+    first = cache.fetch(fs, paths[:1])
+    cache.fetch(fs, paths[1:2])
+    in_use = cache.fetch(fs, paths[2:])
+
+    evicted = cache.evict(keep=cache.entries_of(in_use))
+
+    assert evicted == list(cache.entries_of(first))
+    assert [entry for entry, _, _ in cache.entries()] == [cache.entry(path) for path in cache.fetch(fs, paths[1:])]
+
+
+def test_cache_source_files_skips_local_sources(project, tmp_path):
+    sourcecache = project("utils.luigi.sourcecache")
+    target_module = project("utils.luigi.dask.target")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "src0.csv").write_text("id,y\n1,2.0\n")
+    target = target_module.CSVTarget(str(tmp_path / "src") + "/", glob="*.csv", flag="")
+
+    assert sourcecache.cache_source_files(target, target.files(), str(tmp_path)) == (target, target.files())
+    assert not (tmp_path / "_source_cache").exists()
@@ -0,0 +1,46 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+
+
+def make_rows(rows=2000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "size": rng.normal(100, 10, rows),
+        "city": rng.choice(["Boston", "Seattle", "Austin"], rows),
+    })
+
+
+def test_assign_test_rows_is_stable_across_partitions(project):
+    splitdata = project("preprocess.splitdata")
+    df = make_rows()
+
+    expected = set(df["id"][splitdata.assign_test_rows(df, 0.2)])
+
+    for npartitions in (1, 3, 7):
+        ddf = dd.from_pandas(df.sample(frac=1, random_state=npartitions), npartitions=npartitions)
+        _, test = splitdata.split_dataframe(ddf, 0.2)
+        assert set(test["id"].compute()) == expected
+
+
+def test_assign_test_rows_with_key_columns(project):
+    splitdata = project("preprocess.splitdata")
+    df = make_rows()
+
+    is_test = splitdata.assign_test_rows(df, 0.2, key_columns=["id"])
+    # Columns outside the key do not move a row between the sets
+    changed = splitdata.assign_test_rows(df.assign(size=0.0, city="Denver"), 0.2, key_columns=["id"])
+    assert (is_test == changed).all()
+
+
+def test_split_dataframe_partitions_the_rows(project):
+    splitdata = project("preprocess.splitdata")
+    df = make_rows()
+
+    train, test = splitdata.split_dataframe(dd.from_pandas(df, npartitions=4), 0.2)
+    train_ids, test_ids = set(train["id"].compute()), set(test["id"].compute())
+
+    assert not train_ids & test_ids
+    assert train_ids | test_ids == set(df["id"])
+    assert 0.15 < len(test_ids) / len(df) < 0.25
@@ -0,0 +1,67 @@
+import dask.dataframe as dd
+import luigi
+import pandas as pd
+
+
+def write_dataset(target_module, path, rows=100, npartitions=2):
+    target = target_module.ParquetTarget(str(path) + "/", glob="*.parquet")
+    df = pd.DataFrame({"id": range(rows), "y": [float(row) for row in range(rows)]})
+    target.write_dask(dd.from_pandas(df, npartitions=npartitions))
+    return target, df
+
+
+def test_flag_lists_the_data_files(project, tmp_path):
+    target_module = project("utils.luigi.dask.target")
+    target, df = write_dataset(target_module, tmp_path / "data")
+
+    assert target.exists()
+    assert target.manifest() == ["part.0.parquet", "part.1.parquet"]
+    assert target.files() == target._list_files()
+    pd.testing.assert_frame_equal(target.read_dask().compute().reset_index(drop=True), df)
+
+
+def test_files_added_after_the_flag_are_not_read(project, tmp_path):
+    target_module = project("utils.luigi.dask.target")
+    target, df = write_dataset(target_module, tmp_path / "data")
+
+    # e.g. a partition left by a later run that failed before marking the dataset complete
+    pd.DataFrame({"id": [-1], "y": [-1.0]}).to_parquet(tmp_path / "data" / "part.2.parquet")
+
+    assert len(target.files()) == 2
+    assert len(target.read_dask().compute()) == len(df)
+
+    target.mark_complete()
+    assert len(target.files()) == 3
+
+
+def test_empty_flag_falls_back_to_listing(project, tmp_path):
+    target_module = project("utils.luigi.dask.target")
+    target, df = write_dataset(target_module, tmp_path / "data")
+
+    # Flag written by earlier versions
+    (tmp_path / "data" / "_SUCCESS").write_text("")
+
+    assert target.exists()
+    assert target.manifest() is None
+    assert target.files() == target._list_files()
+    assert len(target.read_dask().compute()) == len(df)
+
+
+def test_target_output_is_resolved_once_per_task(project, tmp_path):
+    target_module = project("utils.luigi.dask.target")
+    task_module = project("utils.luigi.task")
+
+    class Output(luigi.Task):
+        dir_path = luigi.Parameter()
+
+        output = task_module.TargetOutput(
+            file_pattern="{task.dir_path}/{task.__class__.__name__}/",
+            target_class=target_module.ParquetTarget,
+            glob="*.parquet",
+        )
+
+    task = Output(dir_path=str(tmp_path))
+
+    assert task.output() is task.output()
+    assert task.output().path == str(tmp_path) + "/Output/"
+    assert task.output().glob == "*.parquet"
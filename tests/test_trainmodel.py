@@ -0,0 +1,95 @@
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression, SGDClassifier, SGDRegressor
+
+NPARTITIONS = 10
+
+
+def make_frame(rows=2000):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x1": rng.normal(size=rows), "x2": rng.normal(size=rows)})
+    df["y"] = 3 * df["x1"] - 2 * df["x2"] + 1
+    return df
+
+
+def partition_bytes(ddf):
+    return [int(ddf.get_partition(i).compute().memory_usage(deep=True).sum()) for i in range(ddf.npartitions)]
+
+
+def test_stream_batches_stays_within_the_budget(project):
+    trainmodel = project("model.trainmodel")
+    df = make_frame()
+    ddf = dd.from_pandas(df, npartitions=NPARTITIONS)
+    sizes = partition_bytes(ddf)
+    # Room for two and a half partitions
+    budget = int(sizes[0] * 2.5)
+
+    batches = list(trainmodel.stream_batches(ddf, budget))
+
+    # Batches close once they reach the budget, so hold at most the budget plus one partition
+    assert len(batches) == 4
+    assert all(int(batch.memory_usage(deep=True).sum()) <= budget + max(sizes) for batch in batches)
+    pd.testing.assert_frame_equal(pd.concat(batches), df)
+
+    # A budget smaller than a partition streams the partitions one at a time
+    assert len(list(trainmodel.stream_batches(ddf, 1))) == NPARTITIONS
+
+
+def test_shuffled_batches_hold_every_row_once(project):
+    trainmodel = project("model.trainmodel")
+    df = make_frame()
+    ddf = dd.from_pandas(df, npartitions=NPARTITIONS)
+
+    batches = list(trainmodel.stream_batches(ddf, 1, shuffle=True, random_state=0))
+    shuffled = pd.concat(batches)
+
+    assert not shuffled.index.equals(df.index)
+    pd.testing.assert_frame_equal(shuffled.sort_index(), df)
+    # The same seed gives the same order
+    again = pd.concat(trainmodel.stream_batches(ddf, 1, shuffle=True, random_state=0))
+    assert shuffled.index.equals(again.index)
+
+
+def test_partial_fit_model(project):
+    trainmodel = project("model.trainmodel")
+    ddf = dd.from_pandas(make_frame(), npartitions=NPARTITIONS)
+
+    model = SGDRegressor(random_state=0)
+    history = trainmodel.partial_fit_model(model, ddf, "y", epochs=3, shuffle=True, memory_budget_mb=0, random_state=0)
+
+    assert [epoch["epoch"] for epoch in history] == [0, 1, 2]
+    assert all(epoch["rows"] == 2000 and epoch["batches"] == NPARTITIONS for epoch in history)
+    np.testing.assert_allclose(model.coef_, [3, -2], atol=0.1)
+
+
+def test_partial_fit_classifier_gets_all_the_classes(project):
+    trainmodel = project("model.trainmodel")
+    df = make_frame()
+    # The first partition holds a single class
+    df["y"] = np.where(df.index < 200, 0, (df["x1"] > 0).astype(int) + 1)
+    ddf = dd.from_pandas(df, npartitions=NPARTITIONS)
+
+    model = SGDClassifier(random_state=0)
+    trainmodel.partial_fit_model(model, ddf, "y", memory_budget_mb=0)
+
+    assert model.classes_.tolist() == [0, 1, 2]
+
+
+def test_partial_fit_needs_an_incremental_model(project):
+    trainmodel = project("model.trainmodel")
+    ddf = dd.from_pandas(make_frame(), npartitions=2)
+
+    with pytest.raises(TypeError, match="partial_fit"):
+        trainmodel.partial_fit_model(LinearRegression(), ddf, "y")
+
+
+def test_train_model_streaming(project):
+    trainmodel = project("model.trainmodel")
+    ddf = dd.from_pandas(make_frame(), npartitions=NPARTITIONS)
+
+    model, history = trainmodel.train_model(ddf, streaming=True, epochs=2, memory_budget_mb=0, random_state=0)
+
+    assert len(history) == 2
+    assert hasattr(model, "coef_")
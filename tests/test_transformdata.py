@@ -0,0 +1,62 @@
+import dask
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+
+
+def make_frame(rows=1200):
+    rng = np.random.default_rng(0)
+    # Frequencies decreasing from a to f, so that the most frequent values are well defined
+    cities = rng.choice(list("abcdef"), rows, p=[0.3, 0.25, 0.2, 0.12, 0.08, 0.05])
+    city = pd.array(cities, dtype=pd.StringDtype("pyarrow"))
+    city[::50] = pd.NA
+    return pd.DataFrame({"city": city, "size": rng.normal(size=rows)})
+
+
+def test_fit_and_apply_vocabularies(project):
+    transformdata = project("preprocess.transformdata")
+    df = make_frame()
+    ddf = dd.from_pandas(df, npartitions=6)
+
+    vocabularies = transformdata.fit_categorical_vocabularies(ddf)
+    encoded = transformdata.apply_categorical_vocabularies(ddf, vocabularies).compute()
+
+    assert vocabularies == {"city": {"categories": list("abcdef"), "other": False}}
+    assert str(encoded["city"].dtype) == "int32"
+    assert str(encoded["size"].dtype) == "float64"
+    expected = df["city"].map({value: code for code, value in enumerate("abcdef")}).fillna(-1).astype("int32")
+    pd.testing.assert_series_equal(encoded["city"], expected)
+
+
+def test_capped_vocabularies_have_an_other_bucket(project):
+    transformdata = project("preprocess.transformdata")
+    df = make_frame()
+    ddf = dd.from_pandas(df, npartitions=6)
+
+    vocabularies = transformdata.fit_categorical_vocabularies(ddf, max_categories=3)
+    encoded = transformdata.apply_categorical_vocabularies(ddf, vocabularies).compute()
+
+    assert vocabularies == {"city": {"categories": ["a", "b", "c"], "other": True}}
+    assert str(encoded["city"].dtype) == "int32"
+    # The values beyond the cap share code 3, nulls stay -1
+    expected = df["city"].map({"a": 0, "b": 1, "c": 2, "d": 3, "e": 3, "f": 3}).fillna(-1).astype("int32")
+    pd.testing.assert_series_equal(encoded["city"], expected)
+
+    # Values never seen when fitting are "other" in capped columns, and -1 in the others
+    new = dd.from_pandas(pd.DataFrame({"city": pd.array(["b", "z"], dtype=pd.StringDtype("pyarrow"))}), npartitions=1)
+    assert transformdata.apply_categorical_vocabularies(new, vocabularies).compute()["city"].tolist() == [1, 3]
+    uncapped = transformdata.fit_categorical_vocabularies(ddf)
+    assert transformdata.apply_categorical_vocabularies(new, uncapped).compute()["city"].tolist() == [1, -1]
+
+
+def test_lazy_vocabularies_match(project):
+    transformdata = project("preprocess.transformdata")
+    ddf = dd.from_pandas(make_frame(), npartitions=6)
+
+    lazy = transformdata.fit_categorical_vocabularies(ddf, max_categories=3, compute=False)
+    encoded, vocabularies = dask.compute(transformdata.apply_categorical_vocabularies(ddf, lazy), lazy)
+
+    assert vocabularies == transformdata.fit_categorical_vocabularies(ddf, max_categories=3)
+    pd.testing.assert_frame_equal(
+        encoded, transformdata.apply_categorical_vocabularies(ddf, vocabularies).compute()
+    )
@@ -0,0 +1,72 @@
+import dask.array as da
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def make_values(rows=5000):
+    rng = np.random.default_rng(0)
+    actuals = rng.normal(size=rows)
+    return actuals, actuals + rng.normal(scale=0.1, size=rows)
+
+
+def test_error_histogram_matches_numpy(project):
+    visualizepredictions = project("visualize.visualizepredictions")
+    actuals, predictions = make_values()
+
+    counts, edges = visualizepredictions.error_histogram(
+        da.from_array(actuals, chunks=1000), da.from_array(predictions, chunks=1000), bins=10
+    )
+
+    expected_counts, expected_edges = np.histogram(actuals - predictions, bins=10)
+    np.testing.assert_allclose(edges, expected_edges)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+
+def test_quantile_bins_hold_similar_counts(project):
+    visualizepredictions = project("visualize.visualizepredictions")
+    actuals, predictions = make_values()
+
+    counts, edges = visualizepredictions.error_histogram(
+        da.from_array(actuals, chunks=1000), da.from_array(predictions, chunks=1000), bins=10, binning="quantile"
+    )
+
+    errors = actuals - predictions
+    assert counts.sum() == len(errors)
+    assert edges[0] == errors.min() and edges[-1] == errors.max()
+    assert counts.min() > 0.8 * len(errors) / 10 and counts.max() < 1.2 * len(errors) / 10
+
+
+def test_bin_edges_of_constant_values(project):
+    visualizepredictions = project("visualize.visualizepredictions")
+
+    edges = visualizepredictions.bin_edges(da.from_array(np.ones(10), chunks=5))
+
+    np.testing.assert_array_equal(edges, [0.5, 1.5])
+    with pytest.raises(ValueError):
+        visualizepredictions.bin_edges(da.from_array(np.ones(10), chunks=5), binning="log")
+
+
+def test_prediction_heatmap_matches_numpy(project):
+    visualizepredictions = project("visualize.visualizepredictions")
+    actuals, predictions = make_values()
+
+    counts, edges = visualizepredictions.prediction_heatmap(
+        da.from_array(actuals, chunks=1000), da.from_array(predictions, chunks=1000), bins=8
+    )
+
+    expected, _, _ = np.histogram2d(actuals, predictions, bins=[edges, edges])
+    np.testing.assert_array_equal(counts, expected)
+    assert counts.sum() == len(actuals)
+
+
+def test_series_dask_array_has_known_chunks(project):
+    visualizepredictions = project("visualize.visualizepredictions")
+    values = np.arange(100, dtype="float64")
+    series = dd.from_pandas(pd.Series(values), npartitions=3)
+
+    array = visualizepredictions.series_dask_array(series)
+
+    assert not np.isnan(sum(array.chunks[0]))
+    np.testing.assert_array_equal(array.compute(), values)
@@ -0,0 +1,6 @@
+# Benchmarks of the pipeline stages on synthetic data, see run.py and compare.py
+
+import os
+
+# Results of every benchmark run, one JSON record per line, kept in git to compare commits
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), "results.jsonl")
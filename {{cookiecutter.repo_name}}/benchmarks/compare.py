@@ -0,0 +1,124 @@
+'''
+Compares the benchmark results of two commits, exiting with an error when a stage got slower than its threshold, e.g.
+python -m benchmarks.compare --baseline 1a2b3c4 --candidate 5d6e7f8
+By default, compares the last two commits found in benchmarks/results.jsonl. Runs on a working tree with uncommitted
+changes are recorded as <commit>+dirty
+'''
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+from . import RESULTS_PATH
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "thresholds.json")
+
+
+def load_results(path=RESULTS_PATH):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    '''Returns the allowed slowdown of each stage as a fraction, with a "default" for the other stages, and the
+    "proxies" timing a stand-in for the project code'''
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def revision(record):
+    '''Commit of a record, suffixed with "+dirty" when the working tree had uncommitted changes'''
+    return "{}{}".format(record["commit"], "+dirty" if record.get("dirty") else "")
+
+
+def commits_in_order(records):
+    '''Revisions of the records, in the order they were first benchmarked'''
+    commits = []
+    for record in sorted(records, key=lambda record: record["timestamp"]):
+        if revision(record) not in commits:
+            commits.append(revision(record))
+    return commits
+
+
+def median_seconds(records, commit):
+    '''Median wall time of each (stage, rows) benchmarked at a commit'''
+    seconds = {}
+    for record in records:
+        if revision(record) == commit:
+            seconds.setdefault((record["stage"], record["rows"]), []).append(record["seconds"])
+    return {key: statistics.median(values) for key, values in seconds.items()}
+
+
+def compare(records, baseline, candidate, thresholds):
+    '''
+    Compares the median wall time of the stages benchmarked at both commits, at the same number of rows
+    :param records: list of dicts
+            Results of benchmarks.run
+    :param thresholds: dict
+            Allowed slowdown of each stage as a fraction, e.g. {"default": 0.2, "train_model": 0.3}, and under
+            "proxies" the stages timing a stand-in for the project code, with what they time
+    :return: list of dicts, one per stage and number of rows, with "regression" set when the slowdown exceeds the
+             threshold of the stage, and "proxy" for stand-in stages
+    '''
+    before = median_seconds(records, baseline)
+    after = median_seconds(records, candidate)
+
+    rows = []
+    for stage, size in sorted(set(before) & set(after), key=lambda key: (key[1], key[0])):
+        change = after[stage, size] / before[stage, size] - 1 if before[stage, size] else 0.0
+        threshold = thresholds.get(stage, thresholds.get("default", 0.2))
+        rows.append({
+            "stage": stage,
+            "rows": size,
+            "baseline_seconds": before[stage, size],
+            "candidate_seconds": after[stage, size],
+            "change": change,
+            "threshold": threshold,
+            "regression": change > threshold,
+            "proxy": stage in thresholds.get("proxies", {}),
+        })
+    return rows
+
+
+def format_comparison(rows):
+    lines = ["{:<42} {:>12} {:>10} {:>10} {:>8}".format("stage", "rows", "before s", "after s", "change")]
+    for row in rows:
+        lines.append("{:<42} {:>12,} {:>10.2f} {:>10.2f} {:>+7.0%}{}".format(
+            row["stage"] + (" (proxy)" if row.get("proxy") else ""), row["rows"], row["baseline_seconds"], row["candidate_seconds"], row["change"],
+            "  REGRESSION (> {:.0%})".format(row["threshold"]) if row["regression"] else "",
+        ))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compares the benchmark results of two commits")
+    parser.add_argument("--baseline", help="Commit to compare against (default: the one before the candidate)")
+    parser.add_argument("--candidate", help="Commit to check (default: the last one benchmarked)")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument("--thresholds", default=THRESHOLDS_PATH)
+    args = parser.parse_args(argv)
+
+    records = load_results(args.results)
+    commits = commits_in_order(records)
+    candidate = args.candidate or (commits[-1] if commits else None)
+    baseline = args.baseline
+    if baseline is None and candidate in commits and commits.index(candidate) > 0:
+        baseline = commits[commits.index(candidate) - 1]
+    if baseline is None or candidate is None:
+        parser.error("need results of two commits, found {}".format(", ".join(map(str, commits)) or "none"))
+
+    machines = {json.dumps(record.get("machine"), sort_keys=True)
+                for record in records if revision(record) in (baseline, candidate)}
+    if len(machines) > 1:
+        print("Warning: the results come from different machines, timings may not be comparable")
+
+    rows = compare(records, baseline, candidate, load_thresholds(args.thresholds))
+    print("{} -> {}".format(baseline, candidate))
+    print(format_comparison(rows))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
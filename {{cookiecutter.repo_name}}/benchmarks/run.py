@@ -0,0 +1,321 @@
+'''
+Times the pipeline stages on synthetic data. Run from the repository root, e.g.
+python -m benchmarks.run --rows 1e5 --rows 1e6
+Results are appended to benchmarks/results.jsonl, compare commits with python -m benchmarks.compare
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import dask.dataframe as dd
+from luigi import build
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression, SGDRegressor
+
+# The stages are imported by the benchmarks running them, as some modules hold placeholders, e.g. the model of
+# trainmodel.py, until they are filled in for the project
+from {{ cookiecutter.project_slug }}.preprocess.ingestdata import ENGINE, ENGINES, csv_read_options, infer_csv_schema
+from {{ cookiecutter.project_slug }}.utils.luigi.task import TargetOutput
+from {{ cookiecutter.project_slug }}.utils.luigi.dask.target import CSVTarget, ParquetTarget
+
+from . import RESULTS_PATH
+from .synthetic import LABEL, TEXT_COLUMN, TEXT_FEATURES, generate_dataset
+
+STAGES = [
+    "clean_data",
+    "extract_features_from_text_column",
+    "extract_features_from_text_column_batch",
+    "encode_categorical_data",
+    "train_model",
+    "train_model_streaming",
+    "evaluate_model",
+    "ingest_data",
+    "luigi_build",
+]
+
+# Stages whose output each stage reads. Only these run untimed before the stages asked for, so that timing e.g.
+# ingest_data does not import the modules of the model stages
+STAGE_INPUTS = {
+    "extract_features_from_text_column": ["clean_data"],
+    "extract_features_from_text_column_batch": ["clean_data"],
+    "encode_categorical_data": ["extract_features_from_text_column"],
+    "train_model": ["encode_categorical_data"],
+    "train_model_streaming": ["encode_categorical_data"],
+    "evaluate_model": ["train_model"],
+}
+
+# Models timed by the train_model stage, the streaming stage always uses SGDRegressor. train_model and evaluate_model
+# of the project hold its own label and model, so the model stages time the framework code they run on the synthetic
+# data instead, see "proxies" in thresholds.json
+MODELS = {
+    "linear": LinearRegression,
+    "sgd": SGDRegressor,
+    "forest": lambda: RandomForestRegressor(n_estimators=20, n_jobs=-1),
+}
+
+
+def git_commit():
+    '''Returns the current commit and whether the working tree has changes, or None outside of git'''
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL)
+        status = subprocess.check_output(["git", "status", "--porcelain"], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.decode().strip(), bool(status.strip())
+
+
+def machine():
+    return {"node": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class Benchmark:
+    """Runs the stages on one synthetic dataset, each reading its input from parquet and writing its output to
+    parquet, as the luigi tasks do. Inputs of later stages are produced by the earlier ones, so run them in order
+    """
+
+    def __init__(self, rows, scratch_dir, partition_rows, nan_rate, duplicate_rate, model, csv_engine=ENGINE):
+        self.rows = int(rows)
+        self.scratch_dir = scratch_dir
+        self.partition_rows = partition_rows
+        self.nan_rate = nan_rate
+        self.duplicate_rate = duplicate_rate
+        self.model = model
+        self.csv_engine = csv_engine
+        self.fitted_model = None
+
+    def path(self, name):
+        return os.path.join(self.scratch_dir, name) + "/"
+
+    def read(self, name):
+        return dd.read_parquet(self.path(name))
+
+    def generate(self):
+        '''Writes the synthetic source data, not timed'''
+        ddf = generate_dataset(self.rows, self.partition_rows, self.nan_rate, self.duplicate_rate)
+        ddf.to_parquet(self.path("source"))
+
+    def clean_data(self):
+        from {{ cookiecutter.project_slug }}.preprocess.cleandata import clean_data
+
+        clean_data(self.read("source"), ["id"], LABEL).to_parquet(self.path("clean"))
+
+    def extract_features_from_text_column(self):
+        from {{ cookiecutter.project_slug }}.preprocess.extractfeatures import extract_features_from_text_column
+
+        ddf = self.read("clean")
+        for name, words in TEXT_FEATURES.items():
+            ddf = extract_features_from_text_column(ddf, TEXT_COLUMN, name, words)
+        ddf.to_parquet(self.path("extract"))
+
+    def extract_features_from_text_column_batch(self):
+        from {{ cookiecutter.project_slug }}.preprocess.extractfeatures import extract_features_from_text_column_batch
+
+        ddf = extract_features_from_text_column_batch(self.read("clean"), TEXT_COLUMN, TEXT_FEATURES)
+        ddf.to_parquet(self.path("extract_batch"))
+
+    def encode_categorical_data(self):
+        from {{ cookiecutter.project_slug }}.preprocess.splitdata import split_dataframe
+        from {{ cookiecutter.project_slug }}.preprocess.transformdata import encode_categorical_data
+
+        encode_categorical_data(self.read("extract")).to_parquet(self.path("encode"))
+
+        # Split for the model stages, not timed
+        train, test = split_dataframe(self.read("encode"), 0.2)
+        train.to_parquet(self.path("train"))
+        test.to_parquet(self.path("test"))
+
+    def train_model(self):
+        # As train_model does, fit the model on the dask collections
+        train = self.read("train")
+        model = MODELS[self.model]()
+        model.fit(train.drop(LABEL, axis=1), train[LABEL])
+        self.fitted_model = model
+
+    def train_model_streaming(self):
+        from {{ cookiecutter.project_slug }}.model.trainmodel import partial_fit_model
+
+        partial_fit_model(SGDRegressor(), self.read("train"), LABEL)
+
+    def evaluate_model(self):
+        from {{ cookiecutter.project_slug }}.model.evaluatemodel import (
+            predict_dask_dataframe, save_parquet_prediction_array,
+        )
+
+        # As EvaluateModel does, write the predictions to parquet, then the prediction array from the parquet
+        X_test = self.read("test").drop(LABEL, axis=1)
+        predictions = ParquetTarget(self.path("predictions"), flag="", glob="*.parquet")
+        predictions.write_dask(predict_dask_dataframe(self.fitted_model, X_test))
+        save_parquet_prediction_array(predictions, os.path.join(self.scratch_dir, "predicted.npy"))
+
+    def write_csv(self):
+        '''Writes the synthetic source data as csv files, not timed'''
+        csv_dir = self.path("csv")
+        if not os.path.isdir(csv_dir):
+            self.read("source").to_csv(csv_dir + "part-*.csv", index=False)
+        return csv_dir
+
+    def ingest_data(self):
+        csv_dir = self.write_csv()
+
+        # As IngestData does, sample a schema from every file, then parse the files in blocks to parquet
+        target = CSVTarget(csv_dir, flag="", glob="*.csv")
+        start = time.perf_counter()
+        schema = infer_csv_schema(target.fs, target.files())
+        ddf = target.read_dask(**csv_read_options(schema, ["id"], engine=self.csv_engine))
+        ddf.to_parquet(self.path("ingest"))
+        return time.perf_counter() - start
+
+    def luigi_build(self):
+        from {{ cookiecutter.project_slug }}.orchestration import orchestrate
+        from {{ cookiecutter.project_slug }}.preprocess import cleandata, extractfeatures
+
+        # Source csv files and settings matching the synthetic data, set up before timing
+        csv_dir = self.write_csv()
+
+        settings = [
+            (orchestrate.DownloadData, "output", TargetOutput(
+                file_pattern=csv_dir, flag="", target_class=CSVTarget, glob="*.csv"
+            )),
+            (cleandata, "DROP_COLUMNS", ["id"]),
+            (cleandata, "TARGET_NAME", LABEL),
+            (extractfeatures, "TEXT_COLUMN", TEXT_COLUMN),
+            (extractfeatures, "TEXT_FEATURES", TEXT_FEATURES),
+        ]
+        previous = [(owner, name, getattr(owner, name)) for owner, name, _ in settings]
+        for owner, name, value in settings:
+            setattr(owner, name, value)
+
+        # Through MakeDatasets, as the tasks after it use the label and model defined in the project
+        try:
+            dir_path = tempfile.mkdtemp(dir=self.scratch_dir)
+            start = time.perf_counter()
+            succeeded = build([orchestrate.MakeDatasets(dir_path=dir_path)], local_scheduler=True, workers=1)
+            seconds = time.perf_counter() - start
+        finally:
+            for owner, name, value in previous:
+                setattr(owner, name, value)
+
+        if not succeeded:
+            raise RuntimeError("luigi build failed")
+        return seconds
+
+    def run(self, stage):
+        '''Runs a stage and returns its wall time in seconds'''
+        seconds, result = timed(getattr(self, stage))
+        return result if stage in ("ingest_data", "luigi_build") else seconds
+
+
+def stages_to_run(stages):
+    '''The stages asked for and those they read from, in the order of STAGES'''
+    needed = set()
+    pending = list(stages)
+    while pending:
+        stage = pending.pop()
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGE_INPUTS.get(stage, []))
+    return [stage for stage in STAGES if stage in needed]
+
+
+def run_benchmarks(rows_list, stages, partition_rows=1000000, nan_rate=0.01, duplicate_rate=0.01, model="linear",
+                   repeat=1, scratch_dir=None, csv_engine=ENGINE):
+    '''
+    Runs the stages at each scale, returning one record per stage, scale and repetition
+    :param rows_list: list of ints
+            Number of rows of each synthetic dataset, e.g. [1e5, 1e6, 1e7, 1e8]
+    :param stages: list of strings
+            Stages to time, in the order of STAGES. Stages still run the ones they depend on, untimed
+    :return: list of dicts
+    '''
+
+    commit, dirty = git_commit()
+    timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+    records = []
+
+    for rows in rows_list:
+        for repetition in range(repeat):
+            scratch = tempfile.mkdtemp(prefix="benchmark-", dir=scratch_dir)
+            try:
+                benchmark = Benchmark(rows, scratch, partition_rows, nan_rate, duplicate_rate, model, csv_engine)
+                benchmark.generate()
+
+                for stage in stages_to_run(stages):
+                    seconds = benchmark.run(stage)
+                    if stage not in stages:
+                        continue
+                    record = {
+                        "commit": commit,
+                        "dirty": dirty,
+                        "timestamp": timestamp,
+                        "machine": machine(),
+                        "rows": int(rows),
+                        "partition_rows": partition_rows,
+                        "model": model if stage in ("train_model", "evaluate_model") else None,
+                        "csv_engine": csv_engine if stage == "ingest_data" else None,
+                        "stage": stage,
+                        "repetition": repetition,
+                        "seconds": seconds,
+                        "rows_per_second": int(rows) / seconds if seconds else None,
+                    }
+                    print("{stage:<42} {rows:>12,} rows {seconds:>10.2f} s".format(**record))
+                    records.append(record)
+            finally:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+    return records
+
+
+def save_results(records, path=RESULTS_PATH):
+    '''Appends records to a JSON lines file, one record per line'''
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Times the pipeline stages on synthetic data")
+    parser.add_argument(
+        "--rows", type=float, action="append",
+        help="Rows of a synthetic dataset, repeat for several scales, e.g. --rows 1e5 --rows 1e8 (default: 1e5)",
+    )
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages (default: all)")
+    parser.add_argument("--partition-rows", type=int, default=1000000)
+    parser.add_argument("--nan-rate", type=float, default=0.01)
+    parser.add_argument("--duplicate-rate", type=float, default=0.01)
+    parser.add_argument("--model", choices=sorted(MODELS), default="linear")
+    parser.add_argument("--csv-engine", choices=ENGINES, default=ENGINE, help="Csv parser timed by ingest_data")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each scale, compare uses the median")
+    parser.add_argument("--scratch-dir", default=None, help="Where datasets are written (default: temp dir)")
+    parser.add_argument("--results", default=RESULTS_PATH)
+    args = parser.parse_args(argv)
+
+    args.rows = args.rows or [1e5]
+    args.stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error("unknown stages {}, use {}".format(", ".join(sorted(unknown)), ", ".join(STAGES)))
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    records = run_benchmarks(
+        args.rows, args.stages, partition_rows=args.partition_rows, nan_rate=args.nan_rate,
+        duplicate_rate=args.duplicate_rate, model=args.model, repeat=args.repeat, scratch_dir=args.scratch_dir,
+        csv_engine=args.csv_engine,
+    )
+    save_results(records, args.results)
+    print("Appended {} results to {}".format(len(records), args.results))
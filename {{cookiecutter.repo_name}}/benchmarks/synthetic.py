@@ -0,0 +1,100 @@
+'''
+Synthetic datasets for the benchmarks, with numeric, categorical and free-text columns
+'''
+
+import numpy as np
+import pandas as pd
+import dask.dataframe as dd
+
+LABEL = "price"
+TEXT_COLUMN = "description"
+NUMERIC_COLUMNS = ["size", "rooms", "age", "distance"]
+# Categorical columns and their number of distinct values
+CATEGORICAL_COLUMNS = {"city": 50, "property_type": 6, "zipcode": 10000}
+
+WORDS = [
+    "garden", "pool", "garage", "balcony", "renovated", "quiet", "bright", "spacious", "cosy", "modern", "view",
+    "river", "park", "school", "station", "downtown", "loft", "terrace", "fireplace", "basement", "kitchen", "new",
+    "old", "charming", "family", "studio", "penthouse", "waterfront", "historic", "elevator",
+]
+
+# Word lists of the text features extracted by the benchmarks, by feature name
+TEXT_FEATURES = {
+    "has_outdoor_space": ["garden", "balcony", "terrace", "pool"],
+    "is_renovated": ["renovated", "modern", "new"],
+    "is_central": ["downtown", "station", "park"],
+    "has_view": ["view", "river", "waterfront"],
+}
+
+
+def make_partition(rows, seed, nan_rate=0.01, duplicate_rate=0.01, words_per_text=8):
+    '''
+    Generates one partition of the synthetic dataset
+    :param rows: int
+            Number of rows
+    :param seed: int
+            Seed of the partition, so that each partition differs and is reproducible
+    :param nan_rate: float
+            Fraction of missing values in each numeric and categorical column
+    :param duplicate_rate: float
+            Fraction of the rows replaced with copies of other rows of the partition
+    :param words_per_text: int
+            Number of words of each text
+    :return: pandas dataframe
+    '''
+
+    rng = np.random.default_rng(seed)
+
+    df = pd.DataFrame({
+        "size": rng.gamma(4.0, 25.0, rows),
+        "rooms": rng.integers(1, 8, rows).astype("float64"),
+        "age": rng.uniform(0, 120, rows),
+        "distance": rng.exponential(5.0, rows),
+    })
+    for column, cardinality in CATEGORICAL_COLUMNS.items():
+        values = np.array(["{}_{}".format(column, i) for i in range(cardinality)], dtype=object)
+        # Zipf-like frequencies, as real categories are rarely uniform
+        weights = 1.0 / np.arange(1, cardinality + 1)
+        df[column] = values[rng.choice(cardinality, rows, p=weights / weights.sum())]
+
+    words = np.array(WORDS, dtype=object)
+    texts = words[rng.integers(0, len(WORDS), (rows, words_per_text))]
+    df[TEXT_COLUMN] = [" ".join(text) for text in texts]
+
+    df[LABEL] = (
+        1000 * df["size"] + 5000 * df["rooms"] - 300 * df["age"] - 2000 * df["distance"] + rng.normal(0, 10000, rows)
+    )
+
+    # The text column stays complete, as the text feature extraction expects cleaned text
+    for column in NUMERIC_COLUMNS + list(CATEGORICAL_COLUMNS):
+        df.loc[rng.random(rows) < nan_rate, column] = np.nan
+
+    duplicates = rng.random(rows) < duplicate_rate
+    if duplicates.any():
+        take = np.arange(rows)
+        take[duplicates] = rng.integers(0, rows, duplicates.sum())
+        df = df.iloc[take].reset_index(drop=True)
+
+    df.insert(0, "id", np.arange(rows, dtype="int64") + seed * rows)
+    return df
+
+
+def generate_dataset(rows, partition_rows=1000000, nan_rate=0.01, duplicate_rate=0.01, seed=0):
+    '''
+    Builds a lazy synthetic dask dataframe. Partitions are generated when computed, so datasets of 1e8 rows never
+    need to fit in memory
+    :param rows: int
+            Total number of rows, e.g. 1e5 to 1e8
+    :param partition_rows: int
+            Rows per partition
+    :return: dask dataframe
+    '''
+
+    rows = int(rows)
+    sizes = [min(partition_rows, rows - start) for start in range(0, rows, partition_rows)]
+    seeds = [seed * 1000003 + i for i in range(len(sizes))]
+
+    return dd.from_map(
+        make_partition, sizes, seeds, nan_rate=nan_rate, duplicate_rate=duplicate_rate,
+        meta=make_partition(1, 0).iloc[:0],
+    )
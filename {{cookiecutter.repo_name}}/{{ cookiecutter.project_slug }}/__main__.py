@@ -1,12 +1,108 @@
 '''
 Call from command line as
-python -m <project-name>
+python -m <project-name> [ingest|clean|features|train|evaluate|visualize|status] [--workers N] [--dask-processes N]
+    [--threads-per-worker N] [--profile]
 '''
 
+import argparse
+import os
+import sys
+
 from luigi import build
-from .orchestration.orchestrate import VisualizeFeatureImportance, VisualizePreditions
+from luigi.configuration import get_config
+from luigi.task import flatten
+from .orchestration.orchestrate import (
+    CleanData, EvaluateModel, IngestData, TrainModel, TransformData, VisualizeFeatureImportance, VisualizePredictions
+)
+from .utils.luigi.dask.cluster import local_dask_cluster
+from .utils.luigi.report import summarize_run_report, write_run_report
+
+# Tasks built by each command, with everything they require
+COMMANDS = {
+    "ingest": [IngestData],
+    "clean": [CleanData],
+    "features": [TransformData],
+    "train": [TrainModel],
+    "evaluate": [EvaluateModel],
+    "visualize": [VisualizeFeatureImportance, VisualizePredictions],
+}
+
+
+def parse_args(argv=None):
+    cores = os.cpu_count() or 1
+
+    parser = argparse.ArgumentParser(description="Runs the pipeline")
+    parser.add_argument(
+        "command", nargs="?", default="visualize", choices=list(COMMANDS) + ["status"],
+        help="Stage to build, with the ones it requires: ingest (csv to parquet), clean, features (cleaned, extracted "
+             "and encoded), train, evaluate or visualize, the whole pipeline. Or status, to list the tasks not up to "
+             "date without building them (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=2,
+        help="Luigi workers, running tasks whose requirements are complete in parallel (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--threads-per-worker", type=int, default=1,
+        help="Threads in each dask worker process (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--dask-processes", type=int, default=None,
+        help="Processes of the local dask cluster shared by all tasks, 0 for dask's threaded scheduler in each task "
+             "(default: cores / threads per worker)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Profile the dask computations of each task into data/_profiles/<Task>/, see ProfileConfig",
+    )
+    args = parser.parse_args(argv)
+
+    # Size the cluster to the cores, the luigi workers mostly wait on it
+    if args.dask_processes is None:
+        args.dask_processes = max(1, cores // args.threads_per_worker)
+    return args
+
+
+def task_status(tasks):
+    '''Checks which tasks of the pipeline are complete, without running them or importing their stages
+
+    :param tasks: list of luigi tasks
+            Tasks to check, with everything they require
+    :return: list of (task, complete) tuples, requirements first
+    '''
+    statuses, seen = [], set()
+
+    def visit(task):
+        if task.task_id in seen:
+            return
+        seen.add(task.task_id)
+        for requirement in flatten(task.requires()):
+            visit(requirement)
+        statuses.append((task, task.complete()))
+
+    for task in tasks:
+        visit(task)
+    return statuses
+
 
 if __name__ == '__main__':
-    build([VisualizeFeatureImportance(), VisualizePreditions()], local_scheduler=True)
-    # luigi.run() # Use this to get luigid graph at http://localhost:8082 
+    args = parse_args()
+
+    if args.command == "status":
+        statuses = task_status([task() for task in COMMANDS["visualize"]])
+        for task, complete in statuses:
+            print("{:<9} {}".format("complete" if complete else "pending", task))
+        sys.exit(0 if all(complete for _, complete in statuses) else 1)
+
+    if args.profile:
+        get_config().set("ProfileConfig", "enabled", "true")
+
+    tasks = [task() for task in COMMANDS[args.command]]
+    with local_dask_cluster(args.dask_processes, args.threads_per_worker):
+        build(tasks, workers=args.workers, local_scheduler=True)
 
+    # Tasks already complete did not run, and are not in the report
+    report = write_run_report(tasks[0].dir_path)
+    if report["tasks"]:
+        print(summarize_run_report(report))
+    # luigi.run() # Use this to get luigid graph at http://localhost:8082
@@ -1,5 +1,230 @@
+import json
+import os
 
-def evaluate_model(model, test_ddf):
+import dask
+import dask.array as da
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from numpy.lib.format import open_memmap
+
+# Name of the column holding the predictions
+PREDICTION_COLUMN = "predicted"
+
+# Bump when the layout of the prediction array header changes
+PREDICTION_ARRAY_VERSION = 1
+
+# Partitions computed at once while writing the prediction array, which bounds the predictions held in memory
+WRITE_PARALLEL_PARTITIONS = 8
+
+
+def predict_partition(df, model, batch_size=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Predicts a pandas dataframe in batches of rows, bounding the memory model.predict needs at once
+
+    :param df: pandas dataframe
+             Features of one partition
+    :param model: model object
+             Fitted model
+    :param batch_size: int
+             Rows per call to model.predict, None to predict the partition at once
+    :return: pandas dataframe with the PREDICTION_COLUMN, and the index of df
+    '''
+
+    # Models fitted on dask collections saw arrays, only pass the column names to those fitted with them
+    X = df if hasattr(model, "feature_names_in_") else df.to_numpy()
+
+    if batch_size is None or len(df) <= batch_size:
+        predicted = np.asarray(model.predict(X))
+    else:
+        predicted = np.concatenate([
+            np.asarray(model.predict(X[start:start + batch_size])) for start in range(0, len(df), batch_size)
+        ])
+
+    return pd.DataFrame({PREDICTION_COLUMN: predicted}, index=df.index)
+
+
+def predict_dask_dataframe(model, X_ddf, batch_size=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Predicts each partition in parallel. The model is a single node of the graph, so it is serialized once and sent
+    once to each worker instead of once per partition
+
+    :param model: model object
+             Fitted model
+    :param X_ddf: dask dataframe
+             Features to predict
+    :param batch_size: int
+             Rows per call to model.predict, None to predict each partition at once
+    :return: Dask dataframe with the PREDICTION_COLUMN, row for row with X_ddf
+    '''
+
+    # From the first fake row only, as the second holds missing values in nullable columns such as Int64 ones
+    meta = predict_partition(X_ddf._meta_nonempty.iloc[:1], model).iloc[:0]
+
+    return X_ddf.map_partitions(predict_partition, dask.delayed(model, pure=True), batch_size, meta=meta)
+
+
+def _header_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _prediction_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "biuf":
+        raise TypeError("Predictions of dtype {} cannot be stored as a numeric array, encode the label".format(dtype))
+    return dtype
+
+
+def _write_prediction_array(path, dtype, partition_rows, partitions):
+    '''Writes the numpy arrays of delayed partitions, of known rows, to a .npy file with its JSON header. The
+    partitions are computed WRITE_PARALLEL_PARTITIONS at a time, and written in order'''
+    header = {
+        "version": PREDICTION_ARRAY_VERSION,
+        "dtype": dtype.str,
+        "rows": sum(partition_rows),
+        "partition_rows": partition_rows,
+    }
+
+    with open(_header_path(path), "w") as f:
+        json.dump(header, f, indent=2)
+
+    temp_path = path + ".tmp.npy"
+    array = open_memmap(temp_path, mode="w+", dtype=dtype, shape=(header["rows"],))
+    start = 0
+    for first in range(0, len(partitions), WRITE_PARALLEL_PARTITIONS):
+        batch = dask.compute(*partitions[first:first + WRITE_PARALLEL_PARTITIONS])
+        for values, rows in zip(batch, partition_rows[first:first + WRITE_PARALLEL_PARTITIONS]):
+            if len(values) != rows:
+                raise ValueError("Partition of {} rows holds {} predictions".format(rows, len(values)))
+            array[start:start + rows] = values
+            start += rows
+    array.flush()
+    del array
+
+    os.replace(temp_path, path)
+    return header
+
+
+def save_prediction_array(y_predicted, path):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Writes predictions to a .npy file of fixed numeric dtype, with a JSON header next to it recording the number of
+    rows and the rows of each partition. Row i of the array is row i of y_predicted. The rows of the partitions are
+    counted first, then the partitions are computed a few at a time and written in order. The array is moved into
+    place last, so it only exists once complete. For predictions saved as parquet, save_parquet_prediction_array
+    takes the rows from the file footers instead
+
+    :param y_predicted: dask dataframe
+             Predictions in the PREDICTION_COLUMN
+    :param path: string
+             Path of the .npy file, the header is written to the same path with a .json extension
+    :return: dict, the header
+    '''
+
+    predictions = y_predicted[PREDICTION_COLUMN]
+    dtype = _prediction_dtype(predictions.dtype)
+
+    partition_rows = [int(rows) for rows in predictions.map_partitions(len).compute()]
+
+    partitions = [partition.to_numpy(dtype=dtype) for partition in predictions.to_delayed()]
+    return _write_prediction_array(path, dtype, partition_rows, partitions)
+
+
+def _parquet_footer(fs, path):
+    '''Rows and prediction dtype of a parquet file, from its footer'''
+    with fs.open(path, "rb") as f:
+        parquet_file = pq.ParquetFile(f)
+        field = parquet_file.schema_arrow.field(PREDICTION_COLUMN)
+        return parquet_file.metadata.num_rows, np.dtype(field.type.to_pandas_dtype())
+
+
+def _read_parquet_predictions(fs, path, dtype):
+    with fs.open(path, "rb") as f:
+        return pq.read_table(f, columns=[PREDICTION_COLUMN]).column(0).to_numpy().astype(dtype, copy=False)
+
+
+def save_parquet_prediction_array(target, path):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Writes the predictions of a parquet target to a .npy file, as save_prediction_array does, with a partition per
+    file. The rows of each file are taken from its footer, so the predictions are read once, a few files at a time.
+    Row i of the array is row i of the target read in file order
+
+    :param target: ParquetTarget
+             Complete target holding predictions in the PREDICTION_COLUMN, e.g. written by EvaluateModel
+    :param path: string
+             Path of the .npy file, the header is written to the same path with a .json extension
+    :return: dict, the header
+    '''
+
+    files = target.files()
+    footers = dask.compute(*[dask.delayed(_parquet_footer)(target.fs, file) for file in files])
+
+    dtypes = {dtype for _, dtype in footers}
+    if len(dtypes) > 1:
+        raise TypeError("Predictions of {} have several dtypes: {}".format(target.path, sorted(map(str, dtypes))))
+    dtype = _prediction_dtype(dtypes.pop() if dtypes else "float64")
+
+    partition_rows = [rows for rows, _ in footers]
+    partitions = [dask.delayed(_read_parquet_predictions)(target.fs, file, dtype) for file in files]
+    return _write_prediction_array(path, dtype, partition_rows, partitions)
+
+
+def load_prediction_array(path, mmap_mode="r"):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Opens predictions written by save_prediction_array. With mmap_mode, the array is memory-mapped, so opening it takes
+    the same time whatever the size of the test set, and pages are read only when used
+
+    :param path: string
+             Path of the .npy file
+    :param mmap_mode: string
+             Memory-map mode, "r" for read only, None to read the array into memory
+    :return: Tuple (numpy array, header dict)
+    '''
+
+    with open(_header_path(path), "r") as f:
+        header = json.load(f)
+
+    if header.get("version") != PREDICTION_ARRAY_VERSION:
+        raise ValueError("Prediction array {} has version {!r}, expected {}".format(
+            path, header.get("version"), PREDICTION_ARRAY_VERSION
+        ))
+
+    array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+    if array.shape != (header["rows"],) or array.dtype.str != header["dtype"]:
+        raise ValueError("Prediction array {} does not match its header".format(path))
+
+    return array, header
+
+
+def _read_prediction_rows(path, start, stop):
+    return np.array(np.load(path, mmap_mode="r")[start:stop])
+
+
+def prediction_dask_array(path, chunks):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Opens predictions written by save_prediction_array as a dask array. Each chunk memory-maps the file and copies
+    only its own rows, so no worker holds more than a chunk, and no array is shipped between processes
+
+    :param path: string
+             Path of the .npy file
+    :param chunks: tuple of ints
+             Rows of each chunk, e.g. the chunks of the label column of the test set, to line up with it
+    :return: dask array
+    '''
+
+    _, header = load_prediction_array(path)
+    dtype = np.dtype(header["dtype"])
+
+    offsets = np.cumsum((0,) + tuple(chunks)).tolist()
+    if offsets[-1] != header["rows"]:
+        raise ValueError("Chunks cover {} rows, prediction array {} has {}".format(offsets[-1], path, header["rows"]))
+
+    return da.concatenate([
+        da.from_delayed(dask.delayed(_read_prediction_rows)(path, start, stop), shape=(stop - start,), dtype=dtype)
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ])
+
+
+def evaluate_model(model, test_ddf, batch_size=None):
     ''' FRAMEWORK EXAMPLE - You can leave it mostly as is, customize label and model as needed
      Generate predictions using the model and test dataset
 
@@ -7,7 +232,10 @@ def evaluate_model(model, test_ddf):
              Model object containing already fitted model
     :param test_ddf: dask dataframe
              Dataframe object containing test set
-    :return: Dask series containing predictions of label for each row of features in test set
+    :param batch_size: int
+             Rows per call to model.predict, None to predict each partition at once
+    :return: Dask dataframe containing predictions of label for each row of features in test set, partitioned and
+             indexed as the test set
     '''
 
     # Specify the column name you want as the label on which to train the model
@@ -17,12 +245,10 @@ def evaluate_model(model, test_ddf):
     y_test = test_ddf[label]
     X_test = test_ddf.drop(label, axis=1)
 
-    y_predicted = model.predict(X_test)
-    print(type(y_predicted))
+    y_predicted = predict_dask_dataframe(model, X_test, batch_size=batch_size)
     # END FRAMEWORK CODE
 
     # TODO - Add scoring function here such as MSE
 
     # FRAMEWORK CODE - Modify at your own peril
     return y_predicted
-
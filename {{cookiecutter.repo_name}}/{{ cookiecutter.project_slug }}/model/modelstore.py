@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+
+import joblib
+
+# Suffix of the checksum file written next to each model
+CHECKSUM_SUFFIX = ".sha256"
+
+# Suffix of the file recording the size and modification time of the model file last found to match its checksum
+VERIFIED_SUFFIX = ".verified"
+
+# Loaded models by path and checksum, or file version when not verified, shared by all the tasks run in this process
+_MODEL_CACHE = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+def file_checksum(path, chunk_size=2 ** 20):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Hashes a file in chunks, without holding it in memory
+
+    :param path: string
+            Path of the file
+    :param chunk_size: int
+            Bytes read at a time
+    :return: sha256 hex digest
+    '''
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_version(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _mark_verified(path, checksum):
+    '''Records that the current version of the model file matches checksum'''
+    temp_path = path + VERIFIED_SUFFIX + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(dict(_file_version(path), sha256=checksum), f)
+    os.replace(temp_path, path + VERIFIED_SUFFIX)
+
+
+def _is_verified(path, checksum):
+    '''Whether the current version of the model file was already found to match checksum'''
+    try:
+        with open(path + VERIFIED_SUFFIX, "r") as f:
+            verified = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return verified == dict(_file_version(path), sha256=checksum)
+
+
+def verify_model(path, trust_stat=False):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Checks a model file against the checksum next to it, by hashing the whole file
+
+    :param path: string
+            Path of the model file
+    :param trust_stat: boolean
+            Skip hashing when the size and modification time of the file are those of the last version found to
+            match. Faster for large models, but misses changes which keep both, e.g. a corrupted block
+    :return: Checksum of the model file, raises ValueError when the file does not match it
+    '''
+
+    with open(path + CHECKSUM_SUFFIX, "r") as f:
+        expected = f.read().strip()
+    if trust_stat and _is_verified(path, expected):
+        return expected
+
+    actual = file_checksum(path)
+    if actual != expected:
+        raise ValueError("Checksum of model {} is {}, expected {}".format(path, actual, expected))
+    _mark_verified(path, actual)
+    return actual
+
+
+def save_model(model, path):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Saves a model with joblib, uncompressed so that its numpy arrays are stored as raw buffers which load_model can
+    memory-map, and writes the checksum of the file next to it. The model file is moved into place last, so it only
+    exists once complete, and recorded as verified, for loads which trust its size and modification time
+
+    :param model: model object
+            Fitted model
+    :param path: string
+            Path of the model file
+    :return: Checksum of the model file
+    '''
+
+    temp_path = path + ".tmp"
+    joblib.dump(model, temp_path)
+
+    checksum = file_checksum(temp_path)
+    with open(path + CHECKSUM_SUFFIX, "w") as f:
+        f.write(checksum)
+
+    os.replace(temp_path, path)
+    _mark_verified(path, checksum)
+    return checksum
+
+
+def load_model(path, mmap_mode="r", verify=True, trust_stat=False):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Loads a model saved by save_model. Its numpy arrays are memory-mapped rather than read, so loading is fast and the
+    pages are shared by all the processes using the model. Models are cached by path and checksum, so the tasks of a
+    worker process share a single loaded copy, and a model file changed in place is loaded again
+
+    :param path: string
+            Path of the model file
+    :param mmap_mode: string
+            Memory-map mode of the numpy arrays, "r" for read only, None to read them into memory
+    :param verify: boolean
+            Check the model file against its checksum before loading it, or a cached copy, see verify_model
+    :param trust_stat: boolean
+            Only hash the model file when its size or modification time changed since it was saved or last verified,
+            see verify_model
+    :return: model object
+    '''
+
+    with _MODEL_CACHE_LOCK:
+        if verify:
+            version = verify_model(path, trust_stat=trust_stat)
+        else:
+            stat = os.stat(path)
+            version = (stat.st_size, stat.st_mtime_ns)
+        key = (os.path.abspath(path), version, mmap_mode)
+        if key in _MODEL_CACHE:
+            return _MODEL_CACHE[key]
+
+        model = joblib.load(path, mmap_mode=mmap_mode)
+        _MODEL_CACHE[key] = model
+        return model
+
+
+def clear_model_cache():
+    '''Forgets the models loaded by this process'''
+    with _MODEL_CACHE_LOCK:
+        _MODEL_CACHE.clear()
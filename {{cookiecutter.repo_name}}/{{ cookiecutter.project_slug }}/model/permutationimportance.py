@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import check_scoring
+
+
+def _model_input(model, X, feature_names):
+    # Models fitted on dask collections saw arrays, only pass the column names to those fitted with them
+    if hasattr(model, "feature_names_in_"):
+        return pd.DataFrame(X, columns=feature_names)
+    return X
+
+
+def _permuted_score(model, scorer, X, y, feature_names, column, seed):
+    X_permuted = np.array(X)
+    X_permuted[:, column] = np.random.default_rng(seed).permutation(X_permuted[:, column])
+    return scorer(model, _model_input(model, X_permuted, feature_names), y)
+
+
+def permutation_importance(model, X, y, n_repeats=5, scoring=None, n_jobs=None, random_state=0):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Computes permutation importance: the drop in score when the values of a feature are shuffled. Works with any
+    fitted model, including those without feature_importances_ (linear models, SVR, kNN, ...).
+    Each (feature, repeat) pair is scored on a process pool. The sample is dumped to a memory-mapped file first, so the
+    workers share its pages instead of each receiving a copy
+
+    :param model: model object
+            Fitted model
+    :param X: pandas dataframe
+            Features of the sample to score on
+    :param y: pandas series or numpy array
+            Label of the sample
+    :param n_repeats: int
+            Number of shuffles of each feature
+    :param scoring: string or callable
+            Scorer as accepted by sklearn, None for the score method of the model
+    :param n_jobs: int
+            Number of worker processes, None for the threads of the build's dask cluster, whose cores they share, or
+            one per core without a cluster
+    :param random_state: int
+            Seed of the shuffles
+    :return: dict with the feature names, the baseline score, and the mean and standard deviation of the importances
+    '''
+
+    if n_jobs is None:
+        from ..utils.luigi.dask.cluster import cluster_threads
+
+        n_jobs = cluster_threads() or -1
+
+    scorer = check_scoring(model, scoring=scoring)
+    feature_names = list(X.columns)
+    y = np.asarray(y)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "sample.joblib")
+        joblib.dump(np.ascontiguousarray(X.to_numpy(dtype="float64")), path)
+        X_shared = joblib.load(path, mmap_mode="r")
+
+        baseline = scorer(model, _model_input(model, X_shared, feature_names), y)
+
+        pairs = [(column, repeat) for column in range(len(feature_names)) for repeat in range(n_repeats)]
+        scores = Parallel(n_jobs=n_jobs)(
+            delayed(_permuted_score)(model, scorer, X_shared, y, feature_names, column, [random_state, column, repeat])
+            for column, repeat in pairs
+        )
+
+    importances = baseline - np.array(scores).reshape(len(feature_names), n_repeats)
+
+    return {
+        "features": feature_names,
+        "baseline_score": float(baseline),
+        "importances_mean": importances.mean(axis=1).tolist(),
+        "importances_std": importances.std(axis=1).tolist(),
+        "n_repeats": n_repeats,
+        "rows": len(y),
+    }
+
+
+def cached_permutation_importance(model, load_sample, cache_path, **kwargs):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Returns the permutation importance saved at cache_path, computing and saving it first if there is none.
+    Key the path on everything the result depends on, e.g. the model, the sample and the parameters
+
+    :param load_sample: callable
+            Returns the features and the label of the sample, called only when nothing is cached
+    :param cache_path: string
+            Path of the JSON file holding the result
+    :return: dict, see permutation_importance, whose other parameters are passed through
+    '''
+
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            return json.load(f)
+
+    X, y = load_sample()
+    result = permutation_importance(model, X, y, **kwargs)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(temp_path, cache_path)
+
+    return result
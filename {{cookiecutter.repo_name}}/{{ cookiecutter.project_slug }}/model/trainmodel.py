@@ -1,9 +1,109 @@
-def train_model(train_ddf):
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.base import is_classifier
+
+
+def stream_batches(ddf, memory_budget_bytes, shuffle=False, random_state=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Iterates over a dask dataframe as pandas dataframes, computing one partition at a time.
+    Partitions are gathered into a batch until it reaches the memory budget, so a batch holds at most the budget plus
+    one partition. Repartition the data if single partitions are too large for the budget
+
+    :param ddf: dask dataframe
+            Dataframe to iterate over
+    :param memory_budget_bytes: int
+            Target in-memory size of each batch
+    :param shuffle: boolean
+            Visit the partitions in random order, and shuffle the rows within each batch
+    :param random_state: numpy random Generator, int or None
+            Seed of the shuffle
+    :return: generator of pandas dataframes
+    '''
+
+    rng = np.random.default_rng(random_state)
+    partitions = ddf.to_delayed()
+    order = rng.permutation(len(partitions)) if shuffle else range(len(partitions))
+
+    batch, batch_bytes = [], 0
+    for i in order:
+        df = partitions[i].compute()
+        batch.append(df)
+        batch_bytes += int(df.memory_usage(deep=True).sum())
+
+        if batch_bytes >= memory_budget_bytes:
+            yield _concat_batch(batch, shuffle, rng)
+            batch, batch_bytes = [], 0
+
+    if batch:
+        yield _concat_batch(batch, shuffle, rng)
+
+
+def _concat_batch(frames, shuffle, rng):
+    df = frames[0] if len(frames) == 1 else pd.concat(frames)
+    if shuffle:
+        df = df.iloc[rng.permutation(len(df))]
+    return df
+
+
+def partial_fit_model(model, train_ddf, label, epochs=1, shuffle=False, memory_budget_mb=512, random_state=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Trains a model supporting partial_fit (e.g. SGDRegressor, SGDClassifier, MultinomialNB, MLPRegressor) on batches
+    streamed from the training set, so that the training set never has to fit in memory
+
+    :param model: model object
+            Estimator with a partial_fit method
+    :param train_ddf: dask dataframe
+            Dataframe object containing training set
+    :param label: string
+            Name of the label column
+    :param epochs: int
+            Number of passes over the training set
+    :param shuffle: boolean
+            Shuffle the partitions, and the rows within each batch, at every epoch
+    :param memory_budget_mb: int
+            Target in-memory size of each batch in MB
+    :param random_state: int
+            Seed of the shuffle
+    :return: list of dicts with the rows, batches and seconds of each epoch
+    '''
+
+    if not hasattr(model, "partial_fit"):
+        raise TypeError("{} has no partial_fit, use an incremental estimator to train in streaming mode".format(
+            model.__class__.__name__
+        ))
+
+    # Classifiers need all the classes on the first call, find them from the label column alone
+    fit_kwargs = {}
+    if is_classifier(model):
+        fit_kwargs["classes"] = np.sort(train_ddf[label].dropna().unique().compute().values)
+
+    rng = np.random.default_rng(random_state)
+    history = []
+    for epoch in range(epochs):
+        start = time.perf_counter()
+        rows = batches = 0
+
+        for df in stream_batches(train_ddf, memory_budget_mb * 2 ** 20, shuffle=shuffle, random_state=rng):
+            model.partial_fit(df.drop(label, axis=1), df[label], **fit_kwargs)
+            rows += len(df)
+            batches += 1
+
+        history.append({"epoch": epoch, "rows": rows, "batches": batches, "seconds": time.perf_counter() - start})
+
+    return history
+
+
+def train_model(train_ddf, streaming=False, epochs=1, shuffle=False, memory_budget_mb=512, random_state=None):
     ''' FRAMEWORK EXAMPLE - You can leave it mostly as is, customize label and model as needed
     Define label, extract train X and y from dask ddf, define model, fit model, return the history and model
 
     :param train_ddf: dask dataframe
             Dataframe object containing training set
+    :param streaming: boolean
+            Train with partial_fit on batches of partitions instead of fit on the whole training set, see
+            partial_fit_model for the other parameters
     :return: Fitted model and history from model.fit
     '''
 
@@ -16,9 +116,16 @@ def train_model(train_ddf):
     # END FRAMEWORK CODE
 
     # TODO - Add model definition here. All sklearn models supported. TF/Keras support pending
+    # With streaming, use a model that has partial_fit, e.g. SGDRegressor
     model =
 
     # FRAMEWORK CODE - Modify at your own peril
-    history = model.fit(X, y)
+    if streaming:
+        history = partial_fit_model(
+            model, train_ddf, label, epochs=epochs, shuffle=shuffle, memory_budget_mb=memory_budget_mb,
+            random_state=random_state
+        )
+    else:
+        history = model.fit(X, y)
 
-    return model, history
\ No newline at end of file
+    return model, history
@@ -3,24 +3,41 @@ All methods in this file are luigi Tasks. The flow is called from __main__.py.
 '''
 
 import luigi
-from luigi import ExternalTask, Task, LocalTarget
+from luigi import ExternalTask, Task, LocalTarget, Event
+
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+
+# Change these utils if moved out of the project and into its own repo, e.g. csci_utils.utils.luigi.task
+from ..utils.luigi.task import Requirement, Requires, TargetOutput
+from ..utils.luigi.dask.target import CSVTarget, ParquetTarget
+from ..utils.luigi.cache import FINGERPRINT_LENGTH, Fingerprint, source_fingerprint, update_output_cache
+from ..utils.luigi.manifest import SourceManifest
+from ..utils.luigi.sourcecache import cache_source_files
+from ..utils.luigi.dask.cluster import connect_dask_client
+from ..utils.luigi.report import fail_task_report, start_task_report, succeed_task_report
+from ..utils.luigi.dask.profile import finish_task_profile, start_task_profile
+from ..utils.luigi.dask.storage import STORAGE_PROFILES, storage_profile, task_storage_profile
+from ..utils.modules import module_constant
 
-import numpy as np
+from ..preprocess.getsource import getsourceurl
 
-import pickle
 
-# Change these utils if removed out of the project and into its own repo
-from csci_utils.utils.luigi.task import Requirement, Requires, TargetOutput
-from csci_utils.utils.luigi.dask.target import CSVTarget, ParquetTarget
+def stage(name):
+    '''Absolute name of a stage module given relative to this one, e.g. "..preprocess.cleandata"'''
+    return importlib.util.resolve_name(name, __package__)
 
-from ..preprocess.getsource import getsourceurl
-from ..preprocess.cleandata import clean_datasets
-from ..preprocess.extractfeatures import extract_features_from_dask_dataframe
-from ..preprocess.transformdata import transform_dataframe
-from ..model.trainmodel import train_model
-from ..visualize.visualizefeaturesignificance import visualizefeaturesignificance
-from ..model.evaluatemodel import evaluate_model
-from ..visualize.visualizepredictions import visualizepredictions
+
+# Stage modules, and the libraries they use (dask, sklearn, matplotlib, ...), are imported only within the run methods
+# of the tasks, so that importing the tasks to schedule them or check their status stays fast. Fingerprints hash their
+# source, and parameter defaults are read from it, without importing them
+PREPROCESSING_STATE_FILENAME = module_constant(stage("..preprocess.preprocessingstate"), "PREPROCESSING_STATE_FILENAME")
+CSV_SCHEMA_FILENAME = module_constant(stage("..preprocess.ingestdata"), "CSV_SCHEMA_FILENAME")
+
+logger = logging.getLogger("luigi-interface")
 
 
 # VERSION = os.getenv('PIPELINE_VERSION', '0.1')
@@ -40,6 +57,24 @@ from ..visualize.visualizepredictions import visualizepredictions
 #         ]
 
 
+# Outputs live under {dir_path}/<Task>/<fingerprint>/, keyed by the upstream data, stage source and parameters.
+# Stamp them as used whenever a task succeeds, and evict the least recently used ones beyond the size limit
+Task.event_handler(Event.SUCCESS)(update_output_cache)
+
+# Run the dask computations of every task on the build's shared cluster, when __main__ started one
+Task.event_handler(Event.START)(connect_dask_client)
+
+# Measure time, memory, rows and bytes of every task into data/_reports/<run id>/, see __main__ for the summary
+Task.event_handler(Event.START)(start_task_report)
+Task.event_handler(Event.SUCCESS)(succeed_task_report)
+Task.event_handler(Event.FAILURE)(fail_task_report)
+
+# With [ProfileConfig] enabled, profile the dask computations of each task into data/_profiles/<Task>/<run id>/
+Task.event_handler(Event.START)(start_task_profile)
+Task.event_handler(Event.SUCCESS)(finish_task_profile)
+Task.event_handler(Event.FAILURE)(finish_task_profile)
+
+
 class DownloadData(ExternalTask):
     SOURCE_URL = getsourceurl()
 
@@ -52,206 +87,647 @@ class DownloadData(ExternalTask):
     )
 
 
-class CleanData(Task):
+class IngestData(Task):
+    '''Converts the source csv files to parquet, parsed in parallel blocks with a schema sampled once from every file'''
     dir_path = luigi.Parameter(default="data")
+    # Rows sampled from the start of each file to infer the schema, cached in _CSV_SCHEMA.json next to the dataset
+    sample_rows = luigi.IntParameter(default=module_constant(stage("..preprocess.ingestdata"), "SAMPLE_ROWS"))
+    # Bytes of csv parsed into each partition, and the csv parser, "c" or "pyarrow"
+    blocksize = luigi.OptionalParameter(
+        default=module_constant(stage("..preprocess.ingestdata"), "BLOCKSIZE"), significant=False
+    )
+    engine = luigi.ChoiceParameter(
+        default=module_constant(stage("..preprocess.ingestdata"), "ENGINE"),
+        choices=module_constant(stage("..preprocess.ingestdata"), "ENGINES"),
+        significant=False,
+    )
+
+    # The columns dropped while parsing are those of cleandata.py
+    fingerprint = Fingerprint(stage("..preprocess.ingestdata"), stage("..preprocess.cleandata"))
 
     requires = Requires()
     source_data = Requirement(DownloadData)
 
     output = TargetOutput(
-        file_pattern="{task.dir_path}/{task.__class__.__name__}/",
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
         target_class=ParquetTarget,
         glob="*.parquet",
     )
 
+    def read_source(self, source, schema_path, files=None):
+        '''Reads csv files of a source target with the schema cached at schema_path, inferring it on first use.
+        Remote files are read through the local source cache, see SourceCacheConfig
+
+        :param source: CSVTarget
+        :param schema_path: string
+                Path of the cached schema, next to the output of the calling task
+        :param files: list of strings
+                Subset of the source files to read, defaults to all of them
+        :return: dask dataframe
+        '''
+        from ..preprocess.cleandata import DROP_COLUMNS
+        from ..preprocess.ingestdata import csv_read_options, load_csv_schema
+
+        files = source.files() if files is None else files
+        source, files = cache_source_files(source, files, self.dir_path)
+
+        schema = load_csv_schema(schema_path, source.fs, files, sample_rows=self.sample_rows)
+
+        return source.read_dask(
+            files=files, **csv_read_options(schema, DROP_COLUMNS, blocksize=self.blocksize, engine=self.engine)
+        )
+
     def run(self):
+        output = self.output()
+
+        ddf = self.read_source(self.input()["source_data"], output.path + CSV_SCHEMA_FILENAME)
+
+        task_storage_profile(self).write(output, ddf)
+
+
+class CleanData(Task):
+    dir_path = luigi.Parameter(default="data")
+    # Narrow the dtypes of the cleaned dataset, and report the memory saved in _SCHEMA.json next to it
+    compact = luigi.BoolParameter(default=False)
+
+    fingerprint = Fingerprint(stage("..preprocess.cleandata"), stage("..preprocess.compactschema"))
+
+    requires = Requires()
+    source_data = Requirement(IngestData)
+
+    output = TargetOutput(
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
+        target_class=ParquetTarget,
+        glob="*.parquet",
+    )
+
+    def run(self):
+        from ..preprocess.cleandata import clean_datasets
+
         ddf = self.input()["source_data"].read_dask()
 
         ddf = clean_datasets(ddf)
 
-        self.output().write_dask(ddf, compression='gzip')
+        output = self.output()
+        profile = task_storage_profile(self)
+        if not self.compact:
+            profile.write(output, ddf)
+            return
+
+        from ..preprocess.compactschema import SCHEMA_REPORT_FILENAME, compact_schema, save_schema_report
+
+        # Planning the compaction takes a pass over the cleaned data before it is written, so write the cleaned data
+        # once to a scratch directory, and plan and compact from there, rather than cleaning and deduplicating twice
+        scratch = ParquetTarget(output.path + "_uncompacted/", glob="*.parquet", flag="")
+        if scratch.fs.exists(scratch.path):
+            # Left by a failed run
+            scratch.fs.rm(scratch.path, recursive=True)
+        profile.write(scratch, ddf)
+
+        ddf, schema = compact_schema(scratch.read_dask())
+        # Saved before the data, whose flag marks the task complete
+        save_schema_report(schema, output.path + SCHEMA_REPORT_FILENAME)
+
+        profile.write(output, ddf, compute=False).compute()
+        scratch.fs.rm(scratch.path, recursive=True)
+        output.mark_complete()
 
 
 class ExtractFeatures(Task):
     dir_path = luigi.Parameter(default="data")
 
+    fingerprint = Fingerprint(stage("..preprocess.extractfeatures"))
+
     requires = Requires()
     source_data = Requirement(CleanData)
 
     output = TargetOutput(
-        file_pattern="{task.dir_path}/{task.__class__.__name__}/",
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
         target_class=ParquetTarget,
         glob="*.parquet",
     )
 
     def run(self):
+        from ..preprocess.extractfeatures import extract_features_from_dask_dataframe
+
         ddf = self.input()["source_data"].read_dask()
 
         ddf = extract_features_from_dask_dataframe(ddf)
 
-        self.output().write_dask(ddf, compression='gzip')
+        task_storage_profile(self).write(self.output(), ddf)
 
 
 class TransformData(Task):
     dir_path = luigi.Parameter(default="data")
-
-    requires = Requires()
-    source_data = Requirement(ExtractFeatures)
+    # Clean, extract and transform only the source files not processed yet, appending them as new partitions
+    incremental = luigi.BoolParameter(default=False)
+    # Clean, extract and transform the source files as one dask graph, writing only the transformed dataset
+    fused = luigi.BoolParameter(default=False)
+    # With fused, also write the cleaned and extracted datasets under _intermediates/ for debugging
+    materialize_intermediates = luigi.BoolParameter(default=False, significant=False)
+
+    fingerprint = Fingerprint(
+        stage("..preprocess.cleandata"), stage("..preprocess.extractfeatures"), stage("..preprocess.transformdata"),
+        stage("..preprocess.preprocessingstate"), stage("..preprocess.ingestdata"),
+    )
 
     output = TargetOutput(
-        file_pattern="{task.dir_path}/{task.__class__.__name__}/",
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
         target_class=ParquetTarget,
         glob="*.parquet",
     )
 
+    def requires(self):
+        if self.incremental or self.fused:
+            return {"source_data": self.clone(DownloadData)}
+        return {"source_data": self.clone(ExtractFeatures)}
+
+    def state_path(self):
+        '''Path of the fitted preprocessing state, saved next to the transformed dataset'''
+        return self.output().path + PREPROCESSING_STATE_FILENAME
+
+    def save_state(self, vocabularies):
+        from ..preprocess.preprocessingstate import build_preprocessing_state, save_preprocessing_state
+
+        save_preprocessing_state(build_preprocessing_state(vocabularies), self.state_path())
+
+    def read_source(self, files=None):
+        '''Reads the source csv files of fused and incremental runs as IngestData does, with the schema cached next to
+        the output, so that later batches are read with the schema of the first'''
+        return self.clone(IngestData).read_source(
+            self.input()["source_data"], self.output().path + CSV_SCHEMA_FILENAME, files=files
+        )
+
+    def source_manifest(self):
+        output = self.output()
+        return SourceManifest(output.fs, output.path + SourceManifest.FILENAME)
+
+    def complete(self):
+        if not self.incremental:
+            return super().complete()
+
+        # Incomplete as soon as a new or modified source file shows up, or while the flag does not list every batch
+        source = self.input()["source_data"]
+        manifest = self.source_manifest()
+        if not super().complete() or manifest.pending(source.fs, source.files()):
+            return False
+        return sorted(self.output().manifest() or []) == sorted(manifest.files)
+
     def run(self):
+        if (self.incremental or self.fused) and self.clone(CleanData).compact:
+            # Compacting needs its own pass over the cleaned data, which fused runs avoid, and a schema planned on the
+            # first batch would not hold the values of later ones
+            raise ValueError("compact is set for CleanData, which fused and incremental runs of TransformData skip. "
+                             "Unset it, or run TransformData without fused and incremental")
+        if self.incremental:
+            return self.run_incremental()
+        if self.fused:
+            return self.run_fused()
+
+        import dask
+        from ..preprocess.transformdata import MAX_CATEGORIES, fit_categorical_vocabularies, transform_dataframe
+
         ddf = self.input()["source_data"].read_dask()
 
-        ddf = transform_dataframe(ddf)
+        vocabularies = fit_categorical_vocabularies(ddf, max_categories=MAX_CATEGORIES, compute=False)
+        ddf = transform_dataframe(ddf, vocabularies)
+
+        # The vocabularies are fitted in the same compute as the write, so the dataset is read once
+        output = self.output()
+        write = task_storage_profile(self).write(output, ddf, compute=False)
+        vocabularies, _ = dask.compute(vocabularies, write)
+
+        # Save the fitted state before the flag, which marks the task complete
+        self.save_state(vocabularies)
+        output.mark_complete()
+
+    @staticmethod
+    def preprocess(ddf, vocabularies=None):
+        '''Chains the stages of CleanData, ExtractFeatures and TransformData, returning each stage's dataframe and
+        the vocabularies of the transform. Unless given, the vocabularies are fitted on the extracted data as a dask
+        delayed object, to be computed together with the outputs so that the stages run once'''
+        from ..preprocess.cleandata import clean_datasets
+        from ..preprocess.extractfeatures import extract_features_from_dask_dataframe
+        from ..preprocess.transformdata import MAX_CATEGORIES, fit_categorical_vocabularies, transform_dataframe
+
+        cleaned = clean_datasets(ddf)
+        # Feature extraction assigns columns in place, copy so that the cleaned dataframe stays as it was
+        extracted = extract_features_from_dask_dataframe(cleaned.copy())
+        if vocabularies is None:
+            vocabularies = fit_categorical_vocabularies(extracted, max_categories=MAX_CATEGORIES, compute=False)
+        transformed = transform_dataframe(extracted, vocabularies)
+
+        return {"CleanData": cleaned, "ExtractFeatures": extracted, "TransformData": transformed}, vocabularies
+
+    def run_fused(self):
+        import dask
+        import pandas as pd
+
+        ddf = self.read_source()
+
+        stages, vocabularies = self.preprocess(ddf)
+
+        output = self.output()
+        profile = task_storage_profile(self)
+        transformed = stages.pop("TransformData")
+        writes = [profile.write(output, transformed, compute=False)]
+
+        if self.materialize_intermediates:
+            written = {transformed._name}
+            for name, intermediate in stages.items():
+                # A stage leaving its input as it is, e.g. without text features, has the same partitions as the one
+                # before it, which the parquet writer modifies in place, so write a copy of them
+                if intermediate._name in written:
+                    intermediate = intermediate.map_partitions(pd.DataFrame.copy)
+                written.add(intermediate._name)
+                target = ParquetTarget(output.path + "_intermediates/" + name + "/", glob="*.parquet")
+                writes.append(profile.write(target, intermediate, compute=False))
+
+        # A single compute shares the source read and the stages between the vocabularies and the writes
+        vocabularies, *_ = dask.compute(vocabularies, *writes)
+
+        # Save the fitted state before the flag, which marks the task complete
+        self.save_state(vocabularies)
+        output.mark_complete()
+
+    def run_incremental(self):
+        import dask
+        from ..preprocess.preprocessingstate import load_preprocessing_state
+
+        source = self.input()["source_data"]
+        output = self.output()
+
+        manifest = self.source_manifest()
+        # Partitions appended by a run that failed before committing its batch, whose source files are still pending
+        manifest.discard_uncommitted(output)
+        pending = manifest.pending(source.fs, source.files())
+
+        if pending:
+            ddf = self.read_source(files=[signature["path"] for signature in pending])
+
+            # The first batch fits the state, later ones reuse it so that the codes stay the same across batches
+            vocabularies = None
+            if output.fs.exists(self.state_path()):
+                vocabularies = load_preprocessing_state(self.state_path())["vocabularies"]
+
+            stages, vocabularies = self.preprocess(ddf, vocabularies)
+            ddf = stages["TransformData"]
+
+            # The first batch starts the dataset, later ones are appended after the existing partitions. Rows are
+            # deduplicated within a batch, not against the earlier batches. The flag is written once the batch is
+            # committed, so that it never lists partitions of an uncommitted batch
+            write = task_storage_profile(self).write(
+                output, ddf, compute=False, append=bool(output.files()), ignore_divisions=True
+            )
+            vocabularies, _ = dask.compute(vocabularies, write)
+            self.save_state(vocabularies)
+
+            # Saving the manifest commits the batch with the partitions it appended
+            manifest.add(pending, manifest.uncommitted(output))
+            manifest.save()
 
-        self.output().write_dask(ddf, compression='gzip')
+        output.mark_complete()
 
 
 class MakeDatasets(Task):
     TEST_AS_PERCENT_OF_DATASET = 0.20
 
     dir_path = luigi.Parameter(default="data")
+    # Columns identifying a row for the train-test split, leave empty to use all columns
+    key_columns = luigi.ListParameter(default=[])
+
+    fingerprint = Fingerprint(stage("..preprocess.splitdata"))
 
     requires = Requires()
+    source_data = Requirement(TransformData)
 
-    output = TargetOutput(
-        file_pattern="{task.dir_path}/{task.__class__.__name__}/",
+    train_output = TargetOutput(
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/train/",
         target_class=ParquetTarget,
         glob="*.parquet",
     )
-        
 
-class MakeTrainingSet(MakeDatasets):
-    source_data = Requirement(TransformData)
+    test_output = TargetOutput(
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/test/",
+        target_class=ParquetTarget,
+        glob="*.parquet",
+    )
+
+    def output(self):
+        return {"train": self.train_output(), "test": self.test_output()}
 
     def run(self):
+        import dask
+        from ..preprocess.splitdata import split_dataframe
+
         ddf = self.input()["source_data"].read_dask()
 
-        train, _ = ddf.random_split([
-            1 - self.TEST_AS_PERCENT_OF_DATASET,
-            self.TEST_AS_PERCENT_OF_DATASET],
-            random_state=123
-            )
+        train, test = split_dataframe(ddf, self.TEST_AS_PERCENT_OF_DATASET, list(self.key_columns) or None)
+
+        # Compute both writes together so that the source data is read only once
+        outputs = self.output()
+        profile = task_storage_profile(self)
+        dask.compute(
+            profile.write(outputs["train"], train, compute=False),
+            profile.write(outputs["test"], test, compute=False),
+        )
+
+        for target in outputs.values():
+            target.mark_complete()
 
-        self.output().write_dask(train, compression='gzip')
 
- 
-class MakeTestSet(MakeDatasets):
+class MakeTrainingSet(Task):
+    '''Training set written by MakeDatasets, exposed as its own target for downstream tasks'''
+    dir_path = luigi.Parameter(default="data")
+
+    fingerprint = Fingerprint()
+
+    requires = Requires()
+    source_data = Requirement(MakeDatasets)
+
+    def output(self):
+        return self.input()["source_data"]["train"]
+
+
+class MakeTestSet(Task):
+    '''Test set written by MakeDatasets, exposed as its own target for downstream tasks'''
+    dir_path = luigi.Parameter(default="data")
+
+    fingerprint = Fingerprint()
+
+    requires = Requires()
+    source_data = Requirement(MakeDatasets)
+
+    def output(self):
+        return self.input()["source_data"]["test"]
+
+
+class BenchmarkStorage(Task):
+    '''Compares the storage profiles on the transformed dataset, run it with
+    python -m luigi --module <project>.orchestration.orchestrate BenchmarkStorage --local-scheduler
+    '''
+    dir_path = luigi.Parameter(default="data")
+    profiles = luigi.ListParameter(default=list(STORAGE_PROFILES))
+    # Fraction of the rows to benchmark with, the sample is held in memory
+    sample_fraction = luigi.FloatParameter(default=1.0)
+
+    fingerprint = Fingerprint(stage("..utils.luigi.dask.storage"))
+
+    requires = Requires()
     source_data = Requirement(TransformData)
-        
+
+    def output(self):
+        return LocalTarget("{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/report.csv".format(task=self))
+
     def run(self):
+        import pandas as pd
+        from ..utils.luigi.dask.storage import benchmark_storage_profiles
+
         ddf = self.input()["source_data"].read_dask()
+        if self.sample_fraction < 1:
+            ddf = ddf.sample(frac=self.sample_fraction, random_state=123)
 
-        _, test = ddf.random_split([
-            1 - self.TEST_AS_PERCENT_OF_DATASET,
-            self.TEST_AS_PERCENT_OF_DATASET],
-            random_state=123
-            )
+        scratch_path = "{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/_scratch/".format(task=self)
+        profiles = {name: storage_profile({"profile": name}) for name in self.profiles}
 
-        self.output().write_dask(test, compression='gzip')
+        report = pd.DataFrame(benchmark_storage_profiles(ddf, scratch_path, profiles))
+        logger.info("Storage profiles of %s:\n%s", self, report.to_string(index=False))
+
+        self.output().makedirs()
+        with self.output().temporary_path() as temp_output_path:
+            report.to_csv(temp_output_path, index=False)
 
 
 class TrainModel(Task):
     dir_path = luigi.Parameter(default="data")
-    model_path = luigi.Parameter(default="data/Model/model.pckl")
+    model_path = luigi.Parameter(default="{task.dir_path}/Model/{task.fingerprint}/model.joblib")
+    # Train with partial_fit on batches streamed from the training set, instead of fit on all of it in memory
+    streaming = luigi.BoolParameter(default=False)
+    # With streaming: passes over the training set, shuffling of partitions and rows, and target batch size
+    epochs = luigi.IntParameter(default=1)
+    shuffle = luigi.BoolParameter(default=False)
+    memory_budget_mb = luigi.IntParameter(default=512)
+    random_state = luigi.IntParameter(default=0)
+
+    fingerprint = Fingerprint(stage("..model.trainmodel"))
 
     requires = Requires()
     source_data = Requirement(MakeTrainingSet)
+    source_state = Requirement(TransformData)
 
     def output(self):
-        return LocalTarget(self.model_path)
+        return LocalTarget(self.model_path.format(task=self))
+
+    def state_path(self):
+        '''Path of the preprocessing state the model was trained with, saved next to the model'''
+        return os.path.join(os.path.dirname(self.output().path), PREPROCESSING_STATE_FILENAME)
 
     def run(self):
+        from ..model.trainmodel import train_model
+        from ..model.modelstore import save_model
+        from ..preprocess.preprocessingstate import load_preprocessing_state, save_preprocessing_state
+
         train_ddf = self.input()["source_data"].read_dask()
 
-        model = train_model(train_ddf)
+        model, _ = train_model(
+            train_ddf, streaming=self.streaming, epochs=self.epochs, shuffle=self.shuffle,
+            memory_budget_mb=self.memory_budget_mb, random_state=self.random_state
+        )
 
         self.output().makedirs()
 
-        with self.output().temporary_path() as temp_output_path:
-            print(temp_output_path)
-            pickle.dump(model, open(temp_output_path, 'wb'))
+        # Keep the state with the model, so that new data can be transformed for it with TransformNewData
+        state = load_preprocessing_state(self.requires()["source_state"].state_path())
+        save_preprocessing_state(state, self.state_path())
+
+        # Written last, as the model file marks the task complete
+        save_model(model, self.output().path)
+
+
+class NewData(ExternalTask):
+    '''Directory of csv files to be transformed for an existing model'''
+    new_data_url = luigi.Parameter()
+
+    output = TargetOutput(
+        file_pattern="{task.new_data_url}",
+        flag="",
+        target_class=CSVTarget,
+        glob="*.csv",
+    )
+
+
+class TransformNewData(Task):
+    '''Transforms new data with the preprocessing state saved next to the model, with no fitting, run it with
+    python -m luigi --module <project>.orchestration.orchestrate TransformNewData --new-data-url <dir>/ --local-scheduler
+    '''
+    dir_path = luigi.Parameter(default="data")
+    new_data_url = luigi.Parameter()
+
+    # The new csv files are read as IngestData reads the training ones
+    fingerprint = Fingerprint(
+        stage("..preprocess.preprocessingstate"), stage("..preprocess.ingestdata"), stage("..preprocess.cleandata")
+    )
+
+    requires = Requires()
+    source_data = Requirement(NewData)
+    source_model = Requirement(TrainModel)
+
+    output = TargetOutput(
+        file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
+        target_class=ParquetTarget,
+        glob="*.parquet",
+    )
+
+    def run(self):
+        from ..preprocess.preprocessingstate import apply_preprocessing_state, load_preprocessing_state
+
+        output = self.output()
+        state = load_preprocessing_state(self.requires()["source_model"].state_path())
+
+        # With the dtypes and dropped columns of the training data, e.g. integers read as Int64
+        ddf = self.clone(IngestData).read_source(self.input()["source_data"], output.path + CSV_SCHEMA_FILENAME)
+
+        ddf = apply_preprocessing_state(ddf, state)
+
+        task_storage_profile(self).write(output, ddf)
 
 
 class VisualizeFeatureImportance(Task):
     dir_path = luigi.Parameter(default="data")
-    importance_path = luigi.Parameter(default="data/VisualizeFeatureSignificance/featureimportance.png")
+    importance_path = luigi.Parameter(
+        default="{task.dir_path}/VisualizeFeatureSignificance/{task.fingerprint}/featureimportance.png"
+    )
+    # Permutation importance, for models without feature_importances_: rows sampled, shuffles per feature, processes
+    sample_size = luigi.IntParameter(
+        default=module_constant(stage("..visualize.visualizefeaturesignificance"), "PERMUTATION_SAMPLE_ROWS")
+    )
+    n_repeats = luigi.IntParameter(
+        default=module_constant(stage("..visualize.visualizefeaturesignificance"), "PERMUTATION_REPEATS")
+    )
+    random_state = luigi.IntParameter(default=0)
+    # None for the threads of the shared dask cluster, so that the processes do not oversubscribe its cores
+    n_jobs = luigi.OptionalIntParameter(default=None, significant=False)
+
+    fingerprint = Fingerprint(stage("..visualize.visualizefeaturesignificance"))
 
     requires = Requires()
     source_data_testset = Requirement(MakeTestSet)
     source_model = Requirement(TrainModel)
 
     def output(self):
-        return LocalTarget(self.importance_path)
+        return LocalTarget(self.importance_path.format(task=self))
 
     def run(self):
+        from ..model.modelstore import load_model
+        from ..visualize.visualizefeaturesignificance import visualizefeaturesignificance
+
         test_ddf = self.input()["source_data_testset"].read_dask()
 
-        with open(self.input()["source_model"].fn, "rb") as file:
-            model = pickle.load(file)
+        model = load_model(self.input()["source_model"].path)
 
-        fig = visualizefeaturesignificance(model, test_ddf)
+        fig = visualizefeaturesignificance(
+            model, test_ddf, importance_cache_path=self.importance_cache_path(), sample_size=self.sample_size,
+            n_repeats=self.n_repeats, n_jobs=self.n_jobs, random_state=self.random_state
+        )
 
         self.output().makedirs()
 
         # https://mattiacinelli.com/tutorial-on-luigi-part-3-pipeline-input-and-output/
         fig.savefig(self.output().path)
-                       
+
+    def importance_cache_path(self):
+        '''Permutation importance is cached next to the model, keyed by the test set, the sampling and the code computing
+        it, so that changing only the plot reuses it'''
+        key = json.dumps([
+            self.requires()["source_data_testset"].fingerprint,
+            source_fingerprint(stage("..model.permutationimportance")),
+            self.sample_size, self.n_repeats, self.random_state,
+        ])
+        digest = hashlib.sha256(key.encode()).hexdigest()[:FINGERPRINT_LENGTH]
+        model_dir = os.path.dirname(self.input()["source_model"].path)
+        return os.path.join(model_dir, "importance", digest + ".json")
 
 
 class EvaluateModel(Task):
+    '''Predicts the test set to parquet, and to predicted.npy for VisualizePredictions.
+    Both hold the predictions in the row order of the test set, but not in its partitions: dask may fuse partitions
+    and the storage profile may repartition, so the parquet files, and the partition_rows of the array header, which
+    follow the files, do not match the partitions of the test set. Line predictions up with labels by row position
+    '''
     dir_path = luigi.Parameter(default="data")
-    predicted_values_path = luigi.Parameter(default="data/EvaluateModel/predicted.npy")
+    predicted_values_path = luigi.Parameter(default="{task.dir_path}/EvaluateModel/{task.fingerprint}/")
+    # Rows per call to model.predict within a partition, 0 to predict each partition at once
+    batch_size = luigi.IntParameter(default=100000, significant=False)
+
+    fingerprint = Fingerprint(stage("..model.evaluatemodel"))
 
     requires = Requires()
     source_data_testset = Requirement(MakeTestSet)
     source_model = Requirement(TrainModel)
 
     def output(self):
-        return LocalTarget(self.predicted_values_path)
+        path = self.predicted_values_path.format(task=self)
+        return {
+            "parquet": ParquetTarget(path + "predictions/", glob="*.parquet"),
+            "array": LocalTarget(path + "predicted.npy"),
+        }
 
     def run(self):
+        from ..model.evaluatemodel import evaluate_model, save_parquet_prediction_array
+        from ..model.modelstore import load_model
+
         test_ddf = self.input()["source_data_testset"].read_dask()
 
-        with open(self.input()["source_model"].fn, "rb") as file:
-            model = pickle.load(file)
+        model = load_model(self.input()["source_model"].path)
 
-        y_predicted = evaluate_model(model, test_ddf)
+        y_predicted = evaluate_model(model, test_ddf, batch_size=self.batch_size or None)
 
-        self.output().makedirs()
+        # The index is not unique after cleaning, so only the row order lines the predictions up with the test set
+        outputs = self.output()
+        task_storage_profile(self).write(outputs["parquet"], y_predicted)
 
-        np.save(self.output().path, y_predicted) 
+        # Then a typed array for readers wanting all the predictions, from the parquet rather than predicting again,
+        # with the rows of each file from its footer. Row i of the array is row i of the test set read in order
+        save_parquet_prediction_array(outputs["parquet"], outputs["array"].path)
 
 
 class VisualizePredictions(Task):
     dir_path = luigi.Parameter(default="data")
-    prediction_visualization_path = luigi.Parameter(default="data/VisualizePredictions/predictions.png")
+    prediction_visualization_path = luigi.Parameter(
+        default="{task.dir_path}/VisualizePredictions/{task.fingerprint}/predictions.png"
+    )
+    # Bins of the error histogram, "fixed" width or "quantile" binning, and whether to add a predicted vs actual heatmap
+    bins = luigi.IntParameter(default=module_constant(stage("..visualize.visualizepredictions"), "BINS"))
+    binning = luigi.ChoiceParameter(
+        default=module_constant(stage("..visualize.visualizepredictions"), "BINNING"),
+        choices=module_constant(stage("..visualize.visualizepredictions"), "BINNINGS"),
+    )
+    heatmap = luigi.BoolParameter(default=False)
+
+    fingerprint = Fingerprint(stage("..visualize.visualizepredictions"))
 
     requires = Requires()
     source_data_testset = Requirement(MakeTestSet)
     source_predictions = Requirement(EvaluateModel)
 
     def output(self):
-        return LocalTarget(self.prediction_visualization_path)
+        return LocalTarget(self.prediction_visualization_path.format(task=self))
 
     def run(self):
-        test_ddf = self.input()["source_data_testset"].read_dask()
+        import matplotlib.pyplot as plt
+        from ..visualize.visualizepredictions import LABEL, visualizepredictions
 
-        y_predicted = np.load(self.input()["source_predictions"].path, allow_pickle=True)
+        # Only the label is plotted, so skip reading the features
+        test_ddf = self.input()["source_data_testset"].read_dask(columns=[LABEL])
 
-        fig = visualizepredictions(y_predicted, test_ddf)
+        predictions_path = self.input()["source_predictions"]["array"].path
+
+        fig = visualizepredictions(
+            predictions_path, test_ddf, bins=self.bins, binning=self.binning, heatmap=self.heatmap
+        )
 
         self.output().makedirs()
 
         # https://mattiacinelli.com/tutorial-on-luigi-part-3-pipeline-input-and-output/
         fig.savefig(self.output().path)
-
-
-
-
-
+        plt.close(fig)
@@ -1,40 +1,130 @@
+import dask
 import numpy as np
+import pandas as pd
 
-def clean_data(ddf, drop_columns, target_name):
+# Specify list of columns to drop. Saved with the fitted preprocessing state, so new data is cleaned the same way
+DROP_COLUMNS = [<Add yours here>]
+
+# Specify label here.
+TARGET_NAME = "<Add yours here>"
+
+# Columns identifying a row, duplicates of its key are dropped keeping the first row. None to compare all the columns
+KEY_COLUMNS = None
+
+# Bits of the position of a row within its partition, the partition number takes the bits above
+ROW_BITS = 40
+
+
+def _complete_rows(df, required_columns):
+    '''Boolean numpy array, True for the rows with a value in every required column'''
+    return df[required_columns].notna().all(axis=1).to_numpy(copy=True)
+
+
+def _row_hashes(df, key_columns=None):
+    '''64-bit hashes of the row keys, stable across partitions, processes and runs'''
+    keys = df if key_columns is None else df[list(key_columns)]
+    # Factorizing before hashing only pays off on columns with few values, and the hashes are the same without it
+    return pd.util.hash_pandas_object(keys, index=False, categorize=False).to_numpy()
+
+
+def _row_occurrences(df, required_columns, key_columns, partition_info=None):
+    '''Hash and global position of each complete row of a partition, all that deduplication needs to shuffle'''
+    rows = np.flatnonzero(_complete_rows(df, required_columns))
+    return pd.DataFrame({
+        "hash": _row_hashes(df.iloc[rows], key_columns),
+        "position": (partition_info["number"] << ROW_BITS) + rows,
+    })
+
+
+def _later_occurrences(occurrences):
+    '''Positions of the rows whose key is found at a lower position, in a partition of occurrences shuffled by hash'''
+    duplicated = occurrences[occurrences["hash"].duplicated(keep=False)].sort_values("position")
+    return duplicated.loc[duplicated["hash"].duplicated(keep="first"), "position"]
+
+
+def _sorted_positions(positions):
+    return np.sort(positions.to_numpy())
+
+
+def find_duplicate_rows(ddf, required_columns, key_columns=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Finds the complete rows whose key was already found in a previous complete row, lazily, so that it runs in the
+    graph of whatever uses it. Only the 64-bit hash and position of each row are shuffled, whatever their width
+
+    :param ddf: dask dataframe
+            Dataframe object to be deduplicated
+    :param required_columns: list of strings
+            Column names that must have a value, rows missing any are not considered
+    :param key_columns: list of strings
+            Column names identifying a row. None to hash all the columns
+    :return: dask delayed sorted numpy array of the positions of the duplicate rows, the partition number shifted by
+             ROW_BITS plus the row number within the partition
+    '''
+
+    occurrences = ddf.map_partitions(
+        _row_occurrences, required_columns, key_columns, meta={"hash": "uint64", "position": "int64"}
+    )
+
+    later = occurrences.shuffle(on="hash").map_partitions(_later_occurrences, meta=("position", "int64"))
+
+    return dask.delayed(_sorted_positions, pure=True)(later)
+
+
+def _clean_partition(df, required_columns, duplicate_rows, partition_info=None):
+    '''Keeps the complete rows of a partition that are not duplicates, with a single mask'''
+    keep = _complete_rows(df, required_columns)
+
+    if duplicate_rows is not None and len(duplicate_rows):
+        start = partition_info["number"] << ROW_BITS
+        first, last = np.searchsorted(duplicate_rows, [start, start + (1 << ROW_BITS)])
+        keep[duplicate_rows[first:last] - start] = False
+
+    return df[keep].reset_index(drop=True)
+
+
+def clean_data(ddf, drop_columns, target_name, key_columns=None, deduplicate=True):
     ''' FRAMEWORK EXAMPLE - You can leave it mostly as is unless you have custom cleaning to do
     Dropping unnecessary columns, duplicate rows and empty rows of label or target.
 
+    Rows missing a numeric value or the label, and duplicates, are filtered with one mask per partition. Duplicates are
+    found on a 64-bit hash of the row key, so that only the hashes are shuffled, keeping the first row of each key.
+    Two different keys share a hash with a probability of about n^2 / 2^65 for n rows.
+
     :param ddf: dask dataframe
             Dataframe object to be cleaned
     :param drop_columns: list of strings
             Column names to be dropped
     :param target_name: string
             Name of the target variable
+    :param key_columns: list of strings
+            Column names identifying a row for deduplication. None to compare all the columns
+    :param deduplicate: boolean
+            False to keep duplicate rows
     :return: Cleaned dataframe
     '''
 
-    # Drop the columns asked to be dropped
-    ddf = ddf.drop(columns=drop_columns)
+    # Drop the columns asked to be dropped, unless they were not read in the first place
+    ddf = ddf.drop(columns=[column for column in drop_columns if column in ddf.columns])
 
-    # Drop rows that are duplicate based on all columns, except index
-    ddf = ddf.drop_duplicates(ignore_index=True)
-
-    # Drop all rows where the numeric columns contain nan
-    numeric_columns = list(ddf.select_dtypes(include=[np.number]).columns.values)
-    ddf = ddf.dropna(subset=numeric_columns, how="any").reset_index(drop=True)
+    # Rows must have all their numeric columns, and the label
+    required_columns = list(ddf.select_dtypes(include=[np.number]).columns.values)
+    if target_name not in required_columns:
+        required_columns.append(target_name)
 
     # # Drop all columns with object datatypes having null values
-    # object_columns = [x for x in list(ddf.columns) if x not in numeric_columns]
+    # object_columns = [x for x in list(ddf.columns) if x not in required_columns]
     # ddf = ddf.filter(ddf[object_columns].isNotNull())    
 
-    # Drop rows with label column having null values
-    ddf = ddf.dropna(subset=[target_name], how="any").reset_index(drop=True)
+    # Shuffling the row hashes finds the duplicate rows, usually few, whose positions go to every partition. It stays
+    # lazy, so the source is read once by the computation of the cleaned data, whose partitions wait for the hashes of
+    # all the partitions
+    duplicate_rows = find_duplicate_rows(ddf, required_columns, key_columns) if deduplicate else None
 
-    return ddf
+    return ddf.map_partitions(_clean_partition, required_columns, duplicate_rows, meta=ddf._meta)
 
 
 def clean_datasets(ddf):
-    ''' FRAMEWORK CODE - Input drop_columns and target_name. Leave the rest alone, or add other cleaning functions
+    ''' FRAMEWORK CODE - Input DROP_COLUMNS and TARGET_NAME above. Leave the rest alone, or add other cleaning functions
      Call functions to clean the dask dataframe.
 
     :param ddf: dask dataframe
@@ -42,12 +132,6 @@ def clean_datasets(ddf):
     :return: Cleaned dataframe
     '''
 
-    # Specify list of columns to drop.
-    drop_columns = [<Add yours here>]
-
-    # Specify label here.
-    target_name = "<Add yours here>"
-
     # FRAMEWORK CODE - Add other functions to clean in other ways
-    return clean_data(ddf=ddf, drop_columns=drop_columns, target_name=target_name)
+    return clean_data(ddf=ddf, drop_columns=DROP_COLUMNS, target_name=TARGET_NAME, key_columns=KEY_COLUMNS)
 
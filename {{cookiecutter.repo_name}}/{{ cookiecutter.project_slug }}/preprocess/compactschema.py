@@ -0,0 +1,221 @@
+import json
+
+import dask
+import fsspec
+import numpy as np
+import pandas as pd
+
+# String columns with at most this many distinct values become categoricals
+MAX_CATEGORY_VALUES = 1000
+
+# Largest relative error accepted when narrowing floats to float32, 0 to narrow only the columns it holds exactly
+FLOAT32_TOLERANCE = 0.0
+
+# Number of partial statistics merged together in each step of the tree reduction
+SPLIT_EVERY = 8
+
+# File name of the schema report, next to the compacted dataset. Parquet readers skip files starting with an underscore
+SCHEMA_REPORT_FILENAME = "_SCHEMA.json"
+
+INTEGER_DTYPES = ["int8", "int16", "int32", "int64"]
+
+
+def _is_string(series):
+    return pd.api.types.is_string_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def _column_stats(df, max_values):
+    '''Statistics of every column of a pandas dataframe needed to choose its compact dtype'''
+    stats = {}
+    for column in df.columns:
+        series = df[column]
+        stat = {"rows": len(series), "bytes": int(series.memory_usage(index=False, deep=True))}
+
+        if pd.api.types.is_bool_dtype(series.dtype):
+            pass
+        elif pd.api.types.is_integer_dtype(series.dtype) or pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy(dtype="float64", na_value=np.nan)
+            present = values[~np.isnan(values)]
+            stat["nulls"] = len(values) - len(present)
+            stat["min"] = float(present.min()) if len(present) else None
+            stat["max"] = float(present.max()) if len(present) else None
+            if pd.api.types.is_float_dtype(series.dtype):
+                stat["integral"] = bool(np.isfinite(present).all() and (present == np.trunc(present)).all())
+                with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+                    narrowed = present.astype("float32").astype("float64")
+                    errors = np.abs(narrowed - present) / np.abs(present)
+                # Exact values, including zeros and infinities, have no error, overflows an infinite one
+                errors[present == narrowed] = 0
+                stat["float32_error"] = float(errors.max()) if len(errors) else 0.0
+        elif _is_string(series):
+            uniques = series.dropna().unique()
+            stat["values"] = set(uniques.tolist()) if len(uniques) <= max_values else None
+
+        stats[column] = stat
+    return stats
+
+
+def _merge_stats(partial_stats, max_values):
+    '''Merges the column statistics of several partitions'''
+    merged = {}
+    for stats in partial_stats:
+        for column, stat in stats.items():
+            if column not in merged:
+                merged[column] = dict(stat)
+                continue
+            total = merged[column]
+            total["rows"] += stat["rows"]
+            total["bytes"] += stat["bytes"]
+            if "nulls" in stat:
+                total["nulls"] += stat["nulls"]
+                present = [value for value in (total["min"], stat["min"]) if value is not None]
+                total["min"] = min(present) if present else None
+                present = [value for value in (total["max"], stat["max"]) if value is not None]
+                total["max"] = max(present) if present else None
+            if "integral" in stat:
+                total["integral"] = total["integral"] and stat["integral"]
+                total["float32_error"] = max(total["float32_error"], stat["float32_error"])
+            if "values" in stat:
+                if total["values"] is None or stat["values"] is None:
+                    total["values"] = None
+                else:
+                    total["values"] = total["values"] | stat["values"]
+                    if len(total["values"]) > max_values:
+                        total["values"] = None
+    return merged
+
+
+def _smallest_integer(minimum, maximum):
+    for dtype in INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= minimum and maximum <= info.max:
+            return dtype
+    return None
+
+
+def _compact_dtype(stat, dtype, float32_tolerance):
+    '''Chooses the narrowest dtype holding a column without loss, returns it with its categories if categorical'''
+    if "values" in stat:
+        if stat["values"] is None or isinstance(dtype, pd.CategoricalDtype):
+            return str(dtype), None
+        return "category", sorted(stat["values"], key=str)
+
+    if "nulls" not in stat or stat["min"] is None:
+        return str(dtype), None
+
+    # Integers, and floats holding only whole numbers, with no nulls
+    if not stat["nulls"] and (pd.api.types.is_integer_dtype(dtype) or stat.get("integral")):
+        narrowest = _smallest_integer(stat["min"], stat["max"])
+        if narrowest is not None and np.dtype(narrowest).itemsize < dtype.itemsize:
+            return narrowest, None
+
+    if str(dtype) == "float64" and stat.get("float32_error", np.inf) <= float32_tolerance:
+        return "float32", None
+    return str(dtype), None
+
+
+def _compact_bytes(stat, dtype, categories):
+    '''Memory of a column once converted, from its statistics'''
+    if categories is not None:
+        codes = pd.Categorical([], categories=categories).codes
+        return stat["rows"] * codes.itemsize + int(pd.Index(categories).memory_usage(deep=True))
+    return stat["rows"] * np.dtype(dtype).itemsize
+
+
+def plan_compact_schema(ddf, max_category_values=MAX_CATEGORY_VALUES, float32_tolerance=FLOAT32_TOLERANCE):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Chooses the narrowest safe dtype of every column in a single pass over the data: integers, and floats holding
+    only whole numbers, get the smallest integer type holding their range, floats become float32 when it holds them
+    within the tolerance, and strings with few distinct values become categoricals
+
+    :param ddf: dask dataframe
+            Dataframe to be compacted
+    :param max_category_values: int
+            Maximum number of distinct values of string columns converted to categoricals
+    :param float32_tolerance: float
+            Largest relative error accepted when narrowing floats to float32
+    :return: dict, JSON serializable, with the rows, the memory before and after, and by column the dtypes and
+             memory before and after, and the categories of new categoricals
+    '''
+
+    stats = [dask.delayed(_column_stats)(partition, max_category_values) for partition in ddf.to_delayed()]
+    while len(stats) > 1:
+        stats = [
+            dask.delayed(_merge_stats)(stats[i:i + SPLIT_EVERY], max_category_values)
+            for i in range(0, len(stats), SPLIT_EVERY)
+        ]
+    stats = stats[0].compute() if stats else {}
+
+    columns = {}
+    for column, dtype in ddf.dtypes.items():
+        stat = stats.get(column, {"rows": 0, "bytes": 0})
+        compact, categories = _compact_dtype(stat, dtype, float32_tolerance)
+        columns[column] = {
+            "dtype_before": str(dtype),
+            "dtype_after": compact,
+            "bytes_before": stat["bytes"],
+            "bytes_after": stat["bytes"] if compact == str(dtype) else _compact_bytes(stat, compact, categories),
+        }
+        if categories is not None:
+            columns[column]["categories"] = categories
+
+    rows = next(iter(stats.values()))["rows"] if stats else 0
+    return {
+        "rows": rows,
+        "bytes_before": sum(column["bytes_before"] for column in columns.values()),
+        "bytes_after": sum(column["bytes_after"] for column in columns.values()),
+        "columns": columns,
+    }
+
+
+def apply_compact_schema(ddf, schema):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Converts the columns to the dtypes of a schema, without any pass over the data
+
+    :param ddf: dask dataframe
+            Dataframe to be compacted
+    :param schema: dict
+            Schema returned by plan_compact_schema
+    :return: Compacted dask dataframe, categoricals have known categories
+    '''
+
+    dtypes = {}
+    for column, entry in schema["columns"].items():
+        if "categories" in entry:
+            dtypes[column] = pd.CategoricalDtype(entry["categories"])
+        elif entry["dtype_after"] != entry["dtype_before"]:
+            dtypes[column] = entry["dtype_after"]
+
+    return ddf.astype(dtypes) if dtypes else ddf
+
+
+def compact_schema(ddf, max_category_values=MAX_CATEGORY_VALUES, float32_tolerance=FLOAT32_TOLERANCE):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Plans and applies the compact schema of a dataframe
+
+    :return: Tuple of the compacted dask dataframe and the schema, see plan_compact_schema
+    '''
+
+    schema = plan_compact_schema(ddf, max_category_values=max_category_values, float32_tolerance=float32_tolerance)
+
+    return apply_compact_schema(ddf, schema), schema
+
+
+def save_schema_report(schema, path, storage_options=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Writes the schema as JSON, through a temporary file
+
+    :param schema: dict
+            Schema returned by plan_compact_schema
+    :param path: string
+            Path or url of the JSON file
+    :param storage_options: dict
+            Options for the filesystem of path
+    '''
+
+    temp_path = path + ".tmp"
+    with fsspec.open(temp_path, "w", **(storage_options or {})) as f:
+        json.dump(schema, f, indent=2, default=str)
+
+    fs, _, _ = fsspec.core.get_fs_token_paths(path, storage_options=storage_options)
+    fs.mv(temp_path, path)
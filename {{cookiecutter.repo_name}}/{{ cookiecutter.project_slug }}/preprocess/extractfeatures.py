@@ -1,5 +1,16 @@
 import re
 
+import numpy as np
+
+# TODO: Edit here to specify logic for new features, as the word list to search by name of the feature to add
+# e.g. is_city = ["Boston", "Seattle"]
+# TEXT_FEATURES = {"is_city": is_city}
+TEXT_FEATURES = {}
+
+# Specify the text column to search for the words, e.g. "description"
+TEXT_COLUMN = "<Add yours here>"
+
+
 def extract_features_from_text_column(ddf, existing_text_feature_name, new_feature_name, extract_words):
     ''' Sample extraction function, useful for feature engineering
     Does regex search in the description column. Adds new binary column if any of the extract words are found
@@ -23,6 +34,124 @@ def extract_features_from_text_column(ddf, existing_text_feature_name, new_featu
     return ddf
 
 
+def trie_regex(words):
+    ''' Compiles a list of words into a regex alternation shaped as a prefix tree, e.g. ab(?:c|d) for abc and abd,
+    so that the regex engine follows a single branch per character instead of trying every word in turn.
+    Longer words are tried before the words they start with
+
+    :param words: list of strings
+             Words to be matched
+    :return: Regex pattern string, without word boundaries
+    '''
+
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def pattern(node):
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # A word ending here is tried only after the longer words continuing it
+        return '(?:' + body + ')?' if '' in node else body
+
+    return pattern(trie)
+
+
+class TextFeatureMatcher:
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Finds which of several word lists occur in a text with a single regex scan, with the same matches as
+    extract_features_from_text_column run once per word list.
+    All the words are compiled into one prefix tree regex (see trie_regex) inside a lookahead, so that every word
+    boundary is tried. At each boundary the regex finds the longest word followed by a word boundary; the shorter
+    words found at the same position are prefixes of it, and are resolved when compiling rather than when scanning.
+    '''
+
+    def __init__(self, extract_words_by_feature):
+        '''
+        :param extract_words_by_feature: dict
+                 Word list to be searched, by name of the feature to be added
+        '''
+        self.feature_names = list(extract_words_by_feature)
+
+        features_by_word = {}
+        for index, words in enumerate(extract_words_by_feature.values()):
+            for word in words:
+                features_by_word.setdefault(word, set()).add(index)
+
+        words = list(features_by_word)
+        # Without words the trie regex would match the empty string, and no text can set a flag anyway
+        self.regex = re.compile(r'\b(?=({})\b)'.format(trie_regex(words))) if words else None
+
+        # Features found when a word matches: its own and those of the shorter words it starts with, if a word
+        # boundary follows them within the longer word
+        self.features_by_match = {}
+        for longer in words:
+            found = set(features_by_word[longer])
+            for word in words:
+                if len(word) < len(longer) and re.match(re.escape(word) + r'\b', longer):
+                    found |= features_by_word[word]
+            self.features_by_match[longer] = sorted(found)
+
+    def flags(self, texts):
+        ''' Scans each text once
+        :param texts: iterable of strings
+                 Texts to be searched, values that are not strings (e.g. NaN) match nothing
+        :return: uint8 numpy array with a row per text and a column per feature, 1 where any word is found
+        '''
+        texts = list(texts)
+        flags = np.zeros((len(texts), len(self.feature_names)), dtype='uint8')
+        if self.regex is None:
+            return flags
+
+        # Collect the coordinates of the flags and set them all at once, indexing numpy per match is slow
+        rows, columns = [], []
+        findall, features_by_match = self.regex.findall, self.features_by_match
+        for row, text in enumerate(texts):
+            if not isinstance(text, str):
+                continue
+            for match in set(findall(text)):
+                features = features_by_match[match]
+                rows.extend([row] * len(features))
+                columns.extend(features)
+
+        flags[rows, columns] = 1
+
+        return flags
+
+    def add_features(self, df, existing_text_feature_name):
+        ''' Adds a uint8 column per feature to a pandas dataframe '''
+        flags = self.flags(df[existing_text_feature_name])
+
+        return df.assign(**{name: flags[:, index] for index, name in enumerate(self.feature_names)})
+
+
+def extract_features_from_text_column_batch(ddf, existing_text_feature_name, extract_words_by_feature):
+    ''' Batched version of extract_features_from_text_column, for many features on the same text column
+    Scans each partition of the text column once for all the word lists and adds a binary column per feature,
+    instead of one regex pass over the column per feature
+
+    :param ddf: dask dataframe
+             Dataframe object to be modified
+    :param existing_text_feature_name: string
+             Feature name of existing column from which to extract
+    :param extract_words_by_feature: dict
+             Word list to be searched, by name of the feature to be added
+    :return: Modified dataframe
+    '''
+
+    if not extract_words_by_feature:
+        return ddf
+
+    matcher = TextFeatureMatcher(extract_words_by_feature)
+
+    return ddf.map_partitions(matcher.add_features, existing_text_feature_name)
+
+
 def extract_features_from_dask_dataframe(ddf):
     ''' Customize as appropriate for your dataset
     Extracts features from the dataset and adds new columns as needed, also cleans up after feature engineering
@@ -31,14 +160,8 @@ def extract_features_from_dask_dataframe(ddf):
     :return: Modified dataframe
     '''
 
-    # TODO: Edit here to specify logic for new features
-    # e.g. is_city = ["Boston", "Seattle"]
-    # desc_extracting dict = {"is_city": is_city}
-
-
-    # Add the new features to train and test datasets
-    for key, value in desc_extracting_dict.items():
-        ddf = extract_features_from_text_column(ddf, key, value)
+    # Add all the new features with a single scan of the text column
+    ddf = extract_features_from_text_column_batch(ddf, TEXT_COLUMN, TEXT_FEATURES)
 
     # TODO: Add any other feature engineering calls before returning the modfiied dataframe
 
@@ -0,0 +1,142 @@
+import json
+
+import dask
+import fsspec
+import pandas as pd
+
+# Rows read from the start of every source file to infer the schema
+SAMPLE_ROWS = 10000
+
+# Bytes of csv parsed into each partition, e.g. "64MB", None for one partition per file
+BLOCKSIZE = "64MB"
+
+# Parser of the csv files: "pyarrow" for pyarrow's multithreaded csv reader, about twice as fast, or "c" for pandas' own
+ENGINE = "pyarrow"
+ENGINES = ("c", "pyarrow")
+
+# File name of the inferred schema, next to the dataset read with it. Parquet readers skip files starting with an
+# underscore
+CSV_SCHEMA_FILENAME = "_CSV_SCHEMA.json"
+
+CSV_SCHEMA_VERSION = 2
+
+
+def _sample_csv(fs, path, sample_rows):
+    '''Header and inferred dtypes of the first rows of a csv file'''
+    with fs.open(path, "rb") as f:
+        df = pd.read_csv(f, nrows=sample_rows)
+    return list(df.columns), {column: str(dtype) for column, dtype in df.dtypes.items()}
+
+
+def _read_dtype(dtypes):
+    '''Dtype to read a column with, given the dtypes sampled from each file'''
+    if all(pd.api.types.is_bool_dtype(dtype) for dtype in dtypes):
+        # Nullable, in case rows after the sample miss a value
+        return "boolean"
+    if all(pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in dtypes):
+        # Nullable, so a missing value after the sample does not turn the ids and counts into floats
+        return "Int64"
+    if all(pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) for dtype in dtypes):
+        # Floats, or integers in some files and floats in others
+        return "float64"
+    # Mixed or text columns are read as text, with the dtype pandas reads text with
+    text = [dtype for dtype in dtypes if not pd.api.types.is_numeric_dtype(dtype)]
+    return text[0] if text else "object"
+
+
+def infer_csv_schema(fs, paths, sample_rows=SAMPLE_ROWS):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Infers the columns and dtypes of csv files from the first rows of every file, sampled in parallel.
+    Integer columns are read as nullable Int64 and boolean columns as nullable booleans, so that a missing value after
+    the sample does not fail the read, and other numeric columns as float64. Columns sampled as text in any file are
+    read as text
+
+    :param fs: fsspec filesystem
+            Filesystem of the csv files
+    :param paths: list of strings
+            Paths of the csv files
+    :param sample_rows: int
+            Rows read from the start of each file
+    :return: dict, JSON serializable, with the columns in file order and the dtype of each
+    '''
+
+    if not paths:
+        raise ValueError("No csv files to infer a schema from")
+
+    samples = dask.compute(*[dask.delayed(_sample_csv)(fs, path, sample_rows) for path in paths])
+
+    # The files are split into blocks parsed with the header of the first file, so all of them must share it
+    columns = samples[0][0]
+    for path, (header, _) in zip(paths, samples):
+        if header != columns:
+            raise ValueError("csv file {} has columns {}, while {} has columns {}".format(
+                path, header, paths[0], columns
+            ))
+
+    return {
+        "version": CSV_SCHEMA_VERSION,
+        "columns": columns,
+        "dtypes": {column: _read_dtype([dtypes[column] for _, dtypes in samples]) for column in columns},
+        "sample_rows": sample_rows,
+        "files": len(paths),
+    }
+
+
+def load_csv_schema(path, fs, paths, sample_rows=SAMPLE_ROWS, storage_options=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Reads the schema cached at path, or infers it from the csv files and caches it there, through a temporary file
+
+    :param path: string
+            Path or url of the JSON schema file
+    :param fs: fsspec filesystem
+            Filesystem of the csv files
+    :param paths: list of strings
+            Paths of the csv files, sampled only when no schema is cached
+    :param storage_options: dict
+            Options for the filesystem of path
+    :return: dict, see infer_csv_schema
+    '''
+
+    schema_fs, _, _ = fsspec.core.get_fs_token_paths(path, storage_options=storage_options)
+    if schema_fs.exists(path):
+        with schema_fs.open(path, "r") as f:
+            schema = json.load(f)
+        if schema.get("version") == CSV_SCHEMA_VERSION:
+            return schema
+
+    schema = infer_csv_schema(fs, paths, sample_rows=sample_rows)
+
+    temp_path = path + ".tmp"
+    with fsspec.open(temp_path, "w", **(storage_options or {})) as f:
+        json.dump(schema, f, indent=2)
+    schema_fs.mv(temp_path, path)
+
+    return schema
+
+
+def csv_read_options(schema, drop_columns=(), blocksize=BLOCKSIZE, engine=ENGINE):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Keyword arguments of CSVTarget.read_dask reading csv files with a schema
+
+    :param schema: dict
+            Schema returned by infer_csv_schema
+    :param drop_columns: list of strings
+            Column names never parsed, e.g. the DROP_COLUMNS of cleandata.py
+    :param blocksize: string or int
+            Bytes of csv parsed into each partition, None for one partition per file
+    :param engine: string
+            One of ENGINES
+    :return: dict with the columns to read, their dtypes, the blocksize and the engine
+    '''
+
+    if engine not in ENGINES:
+        raise ValueError("Unknown csv engine {!r}, use one of {}".format(engine, ", ".join(ENGINES)))
+
+    columns = [column for column in schema["columns"] if column not in set(drop_columns)]
+
+    return {
+        "columns": columns,
+        "dtype": {column: schema["dtypes"][column] for column in columns},
+        "blocksize": blocksize,
+        "engine": engine,
+    }
@@ -0,0 +1,99 @@
+import json
+
+import fsspec
+
+from . import cleandata
+from .extractfeatures import TEXT_COLUMN, TEXT_FEATURES, extract_features_from_text_column_batch
+from .transformdata import apply_categorical_vocabularies
+
+# Bump when the layout of the state changes, so that stale artifacts are refused instead of misapplied
+PREPROCESSING_STATE_VERSION = 1
+
+# File name of the state, next to the transformed dataset and next to the model. Parquet readers skip files
+# starting with an underscore, so the state does not get in the way of reading or appending to the dataset
+PREPROCESSING_STATE_FILENAME = "_PREPROCESSING.json"
+
+
+def build_preprocessing_state(vocabularies):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Gathers everything fitted or configured while preprocessing the training data, so that new data can be
+    transformed the same way without refitting
+
+    :param vocabularies: dict
+            Vocabularies returned by fit_categorical_vocabularies
+    :return: dict, JSON serializable
+    '''
+
+    return {
+        "version": PREPROCESSING_STATE_VERSION,
+        "drop_columns": list(cleandata.DROP_COLUMNS),
+        "target_name": cleandata.TARGET_NAME,
+        "text_column": TEXT_COLUMN,
+        "text_features": {name: list(words) for name, words in TEXT_FEATURES.items()},
+        "vocabularies": vocabularies,
+    }
+
+
+def save_preprocessing_state(state, path, storage_options=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Writes the state as JSON, through a temporary file so that readers never see a partial state
+
+    :param state: dict
+            State returned by build_preprocessing_state
+    :param path: string
+            Path or url of the JSON file
+    :param storage_options: dict
+            Options for the filesystem of path
+    '''
+
+    temp_path = path + ".tmp"
+    with fsspec.open(temp_path, "w", **(storage_options or {})) as f:
+        json.dump(state, f, indent=2, default=str)
+
+    fs, _, _ = fsspec.core.get_fs_token_paths(path, storage_options=storage_options)
+    fs.mv(temp_path, path)
+
+
+def load_preprocessing_state(path, storage_options=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Reads a state written by save_preprocessing_state
+
+    :param path: string
+            Path or url of the JSON file
+    :param storage_options: dict
+            Options for the filesystem of path
+    :return: dict
+    '''
+
+    with fsspec.open(path, "r", **(storage_options or {})) as f:
+        state = json.load(f)
+
+    if state.get("version") != PREPROCESSING_STATE_VERSION:
+        raise ValueError(
+            "Preprocessing state {} has version {!r}, expected {}. Rerun TransformData and TrainModel to refit it".format(
+                path, state.get("version"), PREPROCESSING_STATE_VERSION
+            )
+        )
+    return state
+
+
+def apply_preprocessing_state(ddf, state):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Transforms new data with a fitted state, in a single streaming pass with no fitting.
+    Rows are kept as they are, so that every new row gets transformed: duplicates and rows with missing values are
+    not dropped, and the label may be missing. Categories never seen when fitting are encoded as -1
+
+    :param ddf: dask dataframe
+            New data, with the columns of the source data
+    :param state: dict
+            State returned by load_preprocessing_state
+    :return: Transformed dataframe
+    '''
+
+    ddf = ddf.drop(columns=[column for column in state["drop_columns"] if column in ddf.columns])
+
+    ddf = extract_features_from_text_column_batch(ddf, state["text_column"], state["text_features"])
+
+    vocabularies = {column: vocabulary for column, vocabulary in state["vocabularies"].items() if column in ddf.columns}
+
+    return apply_categorical_vocabularies(ddf, vocabularies)
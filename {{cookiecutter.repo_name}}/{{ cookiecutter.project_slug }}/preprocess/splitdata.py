@@ -0,0 +1,46 @@
+import pandas as pd
+
+# Number of hash buckets rows are spread over; the test fraction is rounded to a multiple of 1 / HASH_BUCKETS
+HASH_BUCKETS = 10000
+
+
+def assign_test_rows(df, test_fraction, key_columns=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Flags the rows of a pandas dataframe that belong to the test set.
+    The flag is derived from a stable hash of the row key, so a row lands in the same set no matter which partition
+    it is in or how the upstream data was partitioned
+
+    :param df: pandas dataframe
+            Partition of the dataset to be split
+    :param test_fraction: float
+            Fraction of the rows to be assigned to the test set
+    :param key_columns: list of strings
+            Column names identifying a row. None to hash all the columns
+    :return: Boolean pandas series, True for the rows of the test set
+    '''
+
+    keys = df if key_columns is None else df[list(key_columns)]
+
+    # hash_pandas_object uses a fixed hash key, so the hashes are the same across runs and python processes
+    hashes = pd.util.hash_pandas_object(keys, index=False)
+
+    return (hashes % HASH_BUCKETS) < int(round(test_fraction * HASH_BUCKETS))
+
+
+def split_dataframe(ddf, test_fraction, key_columns=None):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Splits a dask dataframe into training and test sets by hashing the row key.
+    Both sets share the same source graph, so computing them together reads the source data only once
+
+    :param ddf: dask dataframe
+            Dataframe object to be split
+    :param test_fraction: float
+            Fraction of the rows to be assigned to the test set
+    :param key_columns: list of strings
+            Column names identifying a row. None to hash all the columns
+    :return: Tuple of dask dataframes (train, test)
+    '''
+
+    is_test = ddf.map_partitions(assign_test_rows, test_fraction, key_columns, meta=(None, "bool"))
+
+    return ddf[~is_test], ddf[is_test]
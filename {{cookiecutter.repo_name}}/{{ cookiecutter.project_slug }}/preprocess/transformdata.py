@@ -1,55 +1,173 @@
-from dask_ml.preprocessing import OrdinalEncoder, Categorizer
+import dask
+import numpy as np
+import pandas as pd
+
+# Number of partial vocabularies merged together in each step of the tree reduction
+SPLIT_EVERY = 8
+
+# With a cap on the categories of a column, each partial vocabulary keeps this many times the cap of the most
+# frequent values, which bounds memory on high-cardinality columns
+CANDIDATES_PER_CATEGORY = 10
+
+# Cap the categories of high-cardinality columns, e.g. 1000, None to keep them all
+MAX_CATEGORIES = None
+
+
+def _count_values(df, limit=None):
+    '''Counts the non-null values of every column of a pandas dataframe, keeping the limit most frequent, as a
+    dataframe with a row per column and value, so that the counts of several partitions concatenate'''
+    counts = []
+    for column in df.columns:
+        column_counts = df[column].value_counts(dropna=True)
+        if limit is not None:
+            column_counts = column_counts.nlargest(limit)
+        counts.append(pd.DataFrame({
+            "column": pd.Series(column, index=range(len(column_counts)), dtype=object),
+            # Values of every column share this one, as objects so that they keep their python types
+            "value": pd.Series(np.asarray(column_counts.index, dtype=object), dtype=object),
+            "count": column_counts.to_numpy(dtype="int64"),
+        }))
+    return pd.concat(counts, ignore_index=True)
+
+
+def _merge_counts(counts, limit=None):
+    '''Merges the concatenated value counts of several partitions, keeping the limit most frequent values of every
+    column'''
+    merged = counts.groupby(["column", "value"], sort=False, as_index=False)["count"].sum()
+    if limit is not None:
+        merged = merged.sort_values("count", ascending=False, kind="stable").groupby("column", sort=False).head(limit)
+    return merged
+
+
+def _vocabularies_from_counts(counts, columns, limit, max_categories, vocabularies):
+    '''Completes the vocabularies with those of the counted columns, from the counts of all the partitions'''
+    counts = _merge_counts(counts, limit)
+    vocabularies = dict(vocabularies)
+    for column in columns:
+        column_counts = counts[counts["column"] == column].set_index("value")["count"]
+        capped = max_categories is not None and len(column_counts) > max_categories
+        if capped:
+            column_counts = column_counts.nlargest(max_categories)
+        vocabularies[column] = {"categories": sorted(column_counts.index.tolist(), key=str), "other": capped}
+    return vocabularies
+
+
+def categorical_columns(ddf):
+    '''Names of the columns encoded by the vocabularies, from the dataframe dtypes'''
+    return list(ddf.select_dtypes(include=["object", "category", "string"]).columns)
+
+
+def fit_categorical_vocabularies(ddf, max_categories=None, compute=True):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Finds the categorical columns from the dataframe dtypes, and their categories in a single pass over the data:
+    values are counted per partition, and the counts merged in a tree reduction
 
-def encode_categorical_data(ddf):
-    ''' FRAMEWORK CODE - Modify only if you don't want all categorical fields to be encoded or to change encoder
-    Encodes all categorical data column-wise in the dask dataframe with OrdinalEncoder
     :param ddf: dataframe
-                Dask dataframe that will be encoded
-    :return: Dask dataframe with encoded categorical data
+                Dask dataframe to learn the categories from
+    :param max_categories: int
+                Maximum number of categories per column, the most frequent ones are kept and the other values share
+                an "other" code. None to keep all categories
+    :param compute: boolean
+                If False, returns a lazy dask scalar instead, which apply_categorical_vocabularies accepts. Computing
+                it together with the encoded data then prepares the data once for both the fit and the encoding
+    :return: dict by column name of dicts with the sorted "categories" and whether there is an "other" bucket
     '''
-    """encode data with OrdinalEncoder
 
-            Parameters
-            ----------
-            train_df: dataframe
-                training dataframe object to fit and transform
-            test_df: dataframe
-                test dataframe object to transform
+    columns = categorical_columns(ddf)
+
+    # Categoricals with known categories need no pass over the data
+    vocabularies = {}
+    for column in columns:
+        if str(ddf[column].dtype) == "category" and ddf[column].cat.known and max_categories is None:
+            vocabularies[column] = {"categories": sorted(ddf[column].cat.categories, key=str), "other": False}
+
+    columns = [column for column in columns if column not in vocabularies]
+    if not columns:
+        return vocabularies
 
-            Returns
-            -------
-            transformed training and test dataframe
-            """
+    limit = None if max_categories is None else max_categories * CANDIDATES_PER_CATEGORY
 
-    # Call this function only if this list which should be defined outside the framework and contains 1 or more item.
-    # column list to ordinal encode
-    categorizer = Categorizer()
-    categorizer_series = categorizer.fit_transform(ddf).dtypes
-    categorical_columns = list(categorizer_series[categorizer_series == "category"].index)
+    # A reduction of the dataframe rather than delayed calls on its partitions, so that it stays in the graph of the
+    # dataframe and shares its partitions with whatever is computed at the same time
+    fitted = ddf[columns].reduction(
+        _count_values,
+        combine=_merge_counts,
+        aggregate=_vocabularies_from_counts,
+        chunk_kwargs={"limit": limit},
+        combine_kwargs={"limit": limit},
+        aggregate_kwargs={
+            "columns": columns, "limit": limit, "max_categories": max_categories, "vocabularies": vocabularies,
+        },
+        meta=object,
+        split_every=SPLIT_EVERY,
+    )
 
-    # Per https://github.com/dask/dask-ml/issues/362 - workaround to mark columns as categorical
-    cat = Categorizer(columns=categorical_columns)
-    ddf_cat = cat.fit_transform(ddf)
+    return fitted.compute() if compute else fitted
 
-    # transform train and test datasets
-    # create ordinal encode object
-    # object assigns -1 to the first-time-seen values of the test set
-    ordinal_encoder = OrdinalEncoder(columns=categorical_columns)
 
-    # fit object on the train dataset
-    encoded_ddf = ordinal_encoder.fit_transform(ddf_cat)
+def _encode_partition(df, vocabularies):
+    '''Replaces the categorical columns of a pandas dataframe with their int32 codes'''
+    encoded = {}
+    for column, vocabulary in vocabularies.items():
+        categories = vocabulary["categories"]
+        # -1 for nulls and values outside the categories, which pd.Categorical is deprecating
+        codes = pd.Index(categories).get_indexer(df[column]).astype("int32")
+        if vocabulary["other"]:
+            codes[(codes == -1) & df[column].notna().values] = len(categories)
+        encoded[column] = codes
+    return df.assign(**encoded)
 
-    return encoded_ddf
 
+def apply_categorical_vocabularies(ddf, vocabularies):
+    ''' FRAMEWORK CODE - Modify at your own peril
+    Encodes categorical columns with the codes of their vocabulary, without any pass over the data.
+    Nulls are encoded as -1, values of capped columns outside the vocabulary as the number of categories ("other"),
+    and other values never seen when fitting as -1
 
-def transform_dataframe(ddf):
+    :param ddf: dataframe
+                Dask dataframe to be encoded
+    :param vocabularies: dict, or lazy dask scalar
+                Vocabularies returned by fit_categorical_vocabularies. Lazy ones must be fitted on ddf, or on a
+                dataframe with the same categorical columns
+    :return: Dask dataframe with encoded categorical data
+    '''
+
+    columns = categorical_columns(ddf) if dask.is_dask_collection(vocabularies) else list(vocabularies)
+    meta = ddf._meta.astype({column: "int32" for column in columns})
+
+    return ddf.map_partitions(_encode_partition, vocabularies, meta=meta)
+
+
+def encode_categorical_data(ddf, max_categories=None):
+    ''' FRAMEWORK CODE - Modify only if you don't want all categorical fields to be encoded or to change encoder
+    Encodes all categorical data column-wise in the dask dataframe with ordinal codes, learning the categories in a
+    single pass over the data
+    :param ddf: dataframe
+                Dask dataframe that will be encoded
+    :param max_categories: int
+                Maximum number of categories per column, the others share an "other" code. None for no cap
+    :return: Dask dataframe with encoded categorical data
+    '''
+
+    vocabularies = fit_categorical_vocabularies(ddf, max_categories=max_categories)
+
+    return apply_categorical_vocabularies(ddf, vocabularies)
+
+
+def transform_dataframe(ddf, vocabularies=None):
     ''' FRAMEWORK CODE - Modify only to add additional transformation such as normalization, scaling, encoding, etc.
     Called by orchestrator to transform dask dataframe
     :param ddf: dask dataframe
                 Dataframe to be transformed
+    :param vocabularies: dict
+                Vocabularies returned by fit_categorical_vocabularies, e.g. from a saved preprocessing state.
+                None to fit them on ddf
     :return: Transformed dataframe
     '''
+    if vocabularies is None:
+        vocabularies = fit_categorical_vocabularies(ddf, max_categories=MAX_CATEGORIES)
+
     # transform data
-    encoded_data = encode_categorical_data(ddf)
+    encoded_data = apply_categorical_vocabularies(ddf, vocabularies)
 
-    return encoded_data
\ No newline at end of file
+    return encoded_data
@@ -0,0 +1,228 @@
+# Content-addressed task outputs
+
+import hashlib
+import inspect
+import json
+import re
+import time
+
+import luigi
+from luigi.task import flatten
+from fsspec.core import get_fs_token_paths
+
+from ..modules import module_source
+
+# Number of hex characters of the sha256 digest used in output paths
+FINGERPRINT_LENGTH = 16
+
+
+def file_signature(fs, path):
+    '''Identifies the version of a file from its metadata, without reading its content
+
+    :param fs: fsspec filesystem
+    :param path: string
+            Path of the file on the filesystem
+    :return: dict with the path, size and the modification stamps the filesystem provides (mtime, etag)
+    '''
+    info = fs.info(path)
+    signature = {"path": path, "size": info.get("size")}
+    for key in ("ETag", "etag", "mtime", "LastModified", "last_modified", "updated"):
+        if info.get(key) is not None:
+            signature[key.lower()] = str(info[key])
+    return signature
+
+
+def source_fingerprint(stage):
+    '''Hashes the source of the module defining a stage function, so helpers called by the function count too
+
+    :param stage: function, or string
+            Stage function, or the absolute name of its module, which is then read without being imported
+    '''
+    if isinstance(stage, str):
+        source = module_source(stage)
+    else:
+        source = inspect.getsource(inspect.getmodule(stage))
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def target_fingerprint(target):
+    '''Hashes the file signatures of a target that is not produced by a fingerprinted task, e.g. source data'''
+    digest = hashlib.sha256()
+    for path in target.files():
+        digest.update(json.dumps(file_signature(target.fs, path), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class Fingerprint:
+    """Descriptor giving the content address of a task's output
+
+    The fingerprint hashes the task family, its significant parameters, the source of the modules implementing its
+    stage functions and the fingerprints of its requirements. Requirements without a fingerprint, such as external
+    data, contribute the signatures of their files instead. Use it in output paths so that editing a stage, or
+    changing its inputs, writes to a new location while unchanged stages are reused.
+
+    Tasks with a true ``incremental`` parameter track their source files in a manifest and keep their address as new
+    files are appended; the tasks downstream of them hash those source files in turn.
+
+    Stages may be given as functions, or as absolute module names whose source is read without importing them, so
+    that defining and scheduling the tasks does not import the libraries of the stages.
+
+    Example::
+
+        class CleanData(Task):
+            fingerprint = Fingerprint("project.preprocess.cleandata")
+
+            output = TargetOutput(
+                file_pattern="{task.dir_path}/{task.__class__.__name__}/{task.fingerprint}/",
+                target_class=ParquetTarget,
+            )
+
+        >>> CleanData().fingerprint
+        '3f0c5e1d9a7b2c44'
+
+    """
+
+    def __init__(self, *functions):
+        self.functions = functions
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, task, cls):
+        if task is None:
+            return self
+
+        # Fingerprints do not change during the life of a task instance, so resolve them once
+        value = task.__dict__[self.name] = self(task)
+        return value
+
+    def __call__(self, task):
+        digest = hashlib.sha256()
+        digest.update(task.get_task_family().encode())
+        digest.update(json.dumps(task.to_str_params(only_significant=True), sort_keys=True).encode())
+
+        for function in self.functions:
+            digest.update(source_fingerprint(function).encode())
+
+        requirements = task.requires()
+        if isinstance(requirements, dict):
+            requirements = [requirements[key] for key in sorted(requirements)]
+
+        for requirement in flatten(requirements):
+            upstream = getattr(requirement, "fingerprint", None)
+            if upstream is None:
+                # Incremental tasks track the files of their sources in a manifest instead
+                if getattr(task, "incremental", False):
+                    continue
+                upstream = "".join(target_fingerprint(target) for target in flatten(requirement.output()))
+            elif getattr(requirement, "incremental", False):
+                # An incremental output keeps its address as it grows, so depend on the source files it will hold
+                upstream += "".join(target_fingerprint(target) for target in flatten(requirement.input()))
+            digest.update(upstream.encode())
+
+        return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+class OutputCache:
+    """Size-bounded cache of fingerprinted outputs, evicting the least recently used entries
+
+    Entries are the directories ``<root>/<TaskFamily>/<fingerprint>/``. Each use of an entry stamps it with the time
+    of access, and :meth:`evict` deletes the entries used longest ago until the cache fits within ``max_bytes``.
+    """
+
+    ACCESS_FLAG = "_ACCESSED"
+    # Glob and regular expression of the entry directories, relative to the root
+    ENTRY_GLOB = "/*/*"
+    ENTRY_PATTERN = "/[^/]+/" + "[0-9a-f]" * FINGERPRINT_LENGTH
+
+    def __init__(self, root, max_bytes, storage_options=None):
+        self.fs, _, paths = get_fs_token_paths(root, storage_options=storage_options)
+        self.root = paths[0].rstrip("/")
+        self.max_bytes = max_bytes
+        self._entry_pattern = re.compile("^" + re.escape(self.root) + self.ENTRY_PATTERN + "$")
+
+    def entry(self, path):
+        '''Returns the cache entry containing path, or None if path is not in a cache entry'''
+        _, _, paths = get_fs_token_paths(path)
+        parts = paths[0].rstrip("/").split("/")
+        for depth in range(len(parts), 0, -1):
+            candidate = "/".join(parts[:depth])
+            if self._entry_pattern.match(candidate):
+                return candidate
+        return None
+
+    def touch(self, path):
+        '''Marks the entry containing path as used now'''
+        entry = self.entry(path)
+        if entry is not None and self.fs.exists(entry):
+            with self.fs.open(entry + "/" + self.ACCESS_FLAG, "w") as f:
+                f.write(repr(time.time()))
+        return entry
+
+    def last_access(self, entry):
+        '''Time the entry was last used, falling back to its modification time if it was never stamped'''
+        try:
+            with self.fs.open(entry + "/" + self.ACCESS_FLAG, "r") as f:
+                return float(f.read())
+        except (FileNotFoundError, ValueError):
+            mtime = self.fs.info(entry).get("mtime")
+            return float(mtime) if mtime is not None else 0.0
+
+    def entries(self):
+        '''Lists the cache entries as (entry, last access time, size in bytes), least recently used first'''
+        entries = [
+            (entry, self.last_access(entry), self.fs.du(entry))
+            for entry in self.fs.glob(self.root + self.ENTRY_GLOB)
+            if self._entry_pattern.match(entry.rstrip("/")) and self.fs.isdir(entry)
+        ]
+        return sorted(entries, key=lambda item: item[1])
+
+    def evict(self, keep=(), min_age=0):
+        '''Deletes least recently used entries until the cache fits within max_bytes
+
+        :param keep: list of strings
+                Entries never to be evicted, e.g. those in use by the running task
+        :param min_age: float
+                Entries used less than min_age seconds ago are kept, so that a build does not evict the outputs its
+                pending tasks are about to read
+        :return: list of evicted entries
+        '''
+        entries = self.entries()
+        total = sum(size for _, _, size in entries)
+        cutoff = time.time() - min_age
+        evicted = []
+        for entry, accessed, size in entries:
+            if total <= self.max_bytes or accessed > cutoff:
+                break
+            if entry in keep:
+                continue
+            self.fs.rm(entry, recursive=True)
+            total -= size
+            evicted.append(entry)
+        return evicted
+
+
+class OutputCacheConfig(luigi.Config):
+    # Size limit of the fingerprinted outputs under a task's dir_path, 0 for no limit
+    max_bytes = luigi.IntParameter(default=50 * 2 ** 30)
+    # Outputs used within this many seconds are never evicted
+    min_age_seconds = luigi.IntParameter(default=3600)
+
+
+def update_output_cache(task):
+    '''Event handler stamping the outputs and inputs of a successful task as used, then evicting the cache
+
+    Register it with ``Task.event_handler(Event.SUCCESS)``. Tasks without a ``dir_path`` are ignored.
+    '''
+    root = getattr(task, "dir_path", None)
+    if root is None:
+        return []
+
+    config = OutputCacheConfig()
+    cache = OutputCache(root, config.max_bytes)
+    targets = flatten(task.output()) + flatten(task.input())
+    in_use = {cache.touch(target.path) for target in targets if hasattr(target, "path")}
+
+    if not config.max_bytes:
+        return []
+    return cache.evict(keep=in_use, min_age=config.min_age_seconds)
@@ -0,0 +1,80 @@
+# Local dask cluster shared by the tasks of a build
+
+import os
+from contextlib import contextmanager
+
+# Address of the shared scheduler, exported to the luigi worker processes
+SCHEDULER_ADDRESS_ENV = "PIPELINE_DASK_SCHEDULER_ADDRESS"
+
+# Dask clients of this process by pid, as luigi workers fork a process per task
+_CLIENTS = {}
+
+
+@contextmanager
+def local_dask_cluster(processes, threads_per_worker=1, memory_limit="auto"):
+    """Starts a local dask cluster for the duration of a build, and exports its address
+
+    Tasks connect to it through :func:`connect_dask_client`, so every task of the build shares the same pool of dask
+    worker processes, sized to the machine, instead of each running its own threaded scheduler. Process workers also
+    sidestep the GIL for pandas-heavy work such as string matching.
+
+    Example::
+
+        with local_dask_cluster(processes=4, threads_per_worker=2):
+            build(tasks, workers=2, local_scheduler=True)
+
+    :param processes: int
+            Number of dask worker processes, 0 to start no cluster and keep dask's default scheduler
+    :param threads_per_worker: int
+            Threads in each dask worker process
+    :param memory_limit: string or int
+            Memory limit of each dask worker process, "auto" to share the machine's memory between them
+    """
+    if not processes:
+        yield None
+        return
+
+    from distributed import LocalCluster
+
+    cluster = LocalCluster(
+        n_workers=processes, threads_per_worker=threads_per_worker, processes=True, memory_limit=memory_limit
+    )
+    previous = os.environ.get(SCHEDULER_ADDRESS_ENV)
+    os.environ[SCHEDULER_ADDRESS_ENV] = cluster.scheduler_address
+    try:
+        yield cluster
+    finally:
+        if previous is None:
+            os.environ.pop(SCHEDULER_ADDRESS_ENV, None)
+        else:
+            os.environ[SCHEDULER_ADDRESS_ENV] = previous
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
+        cluster.close()
+
+
+def cluster_threads():
+    '''Total threads of the workers of the shared cluster, the CPU budget of the build, None without a cluster'''
+    client = connect_dask_client()
+    if client is None:
+        return None
+    return sum(client.nthreads().values())
+
+
+def connect_dask_client(task=None):
+    '''Event handler connecting the running process to the shared cluster, if any, as its default dask scheduler
+
+    Register it with ``Task.event_handler(Event.START)``. Each process connects once, and reuses its client for the
+    following tasks it runs.
+    '''
+    address = os.environ.get(SCHEDULER_ADDRESS_ENV)
+    if not address:
+        return None
+
+    pid = os.getpid()
+    if pid not in _CLIENTS:
+        from distributed import Client
+
+        _CLIENTS[pid] = Client(address, set_as_default=True)
+    return _CLIENTS[pid]
@@ -0,0 +1,199 @@
+# Opt-in profiling of the dask computations run by each task
+
+import importlib.util
+import json
+import os
+import threading
+import time
+
+import luigi
+
+from ..report import RUN_ID_ENV
+
+PROFILES_DIR = "_profiles"
+
+# Profilers of the tasks running in this process, by task id
+_RUNNING = {}
+
+
+class ProfileConfig(luigi.Config):
+    """Dask profiling of task runs, off by default, set in luigi.cfg or with ``python -m <project> --profile``
+
+    Example::
+
+        [ProfileConfig]
+        enabled=true
+        tasks=["CleanData", "TransformData"]
+
+    """
+    enabled = luigi.BoolParameter(default=False)
+    # Task families to profile, empty for all
+    tasks = luigi.ListParameter(default=[])
+
+
+def _distributed_client():
+    if importlib.util.find_spec("distributed") is None:
+        return None
+    from distributed import default_client
+
+    try:
+        return default_client()
+    except ValueError:
+        return None
+
+
+class WorkerMemorySampler:
+    """Polls the memory of the workers of a dask cluster in a background thread, keeping the peak of each"""
+
+    def __init__(self, client, interval=0.5):
+        self.client = client
+        self.interval = interval
+        self.workers = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while True:
+            try:
+                workers = self.client.scheduler_info(n_workers=-1)["workers"]
+            except (OSError, TimeoutError):
+                # The cluster may be shutting down, keep the peaks sampled so far
+                workers = {}
+            for address, info in workers.items():
+                metrics = info.get("metrics", {})
+                spilled = metrics.get("spilled_bytes") or {}
+                peak = self.workers.setdefault(address, {"peak_memory_bytes": 0, "spilled_bytes": 0})
+                peak["peak_memory_bytes"] = max(peak["peak_memory_bytes"], metrics.get("memory", 0))
+                peak["spilled_bytes"] = max(peak["spilled_bytes"], spilled.get("disk", 0))
+                peak["memory_limit_bytes"] = info.get("memory_limit")
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.workers
+
+
+def summarize_task_stream(records):
+    '''Aggregates task stream records by operation, e.g. all the partitions of a drop_duplicates
+
+    :param records: list of dicts
+            Records of the distributed task stream, or converted from the local profiler, with ``key`` and
+            ``startstops`` of {"action", "start", "stop"}
+    :return: dict with the operations sorted by compute time, and the transfer totals
+    '''
+    from dask.utils import key_split
+
+    operations = {}
+    transfers = {"count": 0, "seconds": 0.0, "bytes": 0}
+    for record in records:
+        operation = operations.setdefault(
+            key_split(record["key"]), {"tasks": 0, "compute_seconds": 0.0, "transfer_seconds": 0.0, "nbytes": 0}
+        )
+        operation["tasks"] += 1
+        operation["nbytes"] += record.get("nbytes") or 0
+        for startstop in record["startstops"]:
+            seconds = startstop["stop"] - startstop["start"]
+            if startstop["action"] == "transfer":
+                operation["transfer_seconds"] += seconds
+                transfers["count"] += 1
+                transfers["seconds"] += seconds
+                transfers["bytes"] += record.get("nbytes") or 0
+            elif startstop["action"] == "compute":
+                operation["compute_seconds"] += seconds
+
+    operations = dict(sorted(operations.items(), key=lambda item: item[1]["compute_seconds"], reverse=True))
+    return {"operations": operations, "transfers": transfers}
+
+
+def profile_dir(task):
+    return os.path.join(task.dir_path, PROFILES_DIR, task.get_task_family(), os.environ[RUN_ID_ENV])
+
+
+def start_task_profile(task):
+    '''Event handler starting to profile a task, register it with ``Task.event_handler(Event.START)`` after the
+    handler connecting the dask client
+
+    On a distributed cluster, records the task stream, the peak memory of the workers, and the dask performance report
+    if bokeh is installed. Otherwise, records the tasks and resources seen by the local scheduler.
+    '''
+    config = ProfileConfig()
+    if not config.enabled or getattr(task, "dir_path", None) is None:
+        return
+    if config.tasks and task.get_task_family() not in config.tasks:
+        return
+
+    path = profile_dir(task)
+    os.makedirs(path, exist_ok=True)
+    profile = {"path": path, "start": time.time(), "contexts": []}
+
+    client = _distributed_client()
+    if client is not None:
+        from distributed import get_task_stream, performance_report
+
+        profile["client"] = client
+        if importlib.util.find_spec("bokeh") is not None:
+            profile["contexts"].append(performance_report(filename=os.path.join(path, "performance_report.html")))
+        profile["task_stream"] = get_task_stream(client)
+        profile["contexts"].append(profile["task_stream"])
+        profile["memory"] = WorkerMemorySampler(client).start()
+    else:
+        from dask.diagnostics import Profiler, ResourceProfiler
+
+        profile["profiler"] = Profiler()
+        profile["resources"] = ResourceProfiler(dt=0.25)
+        profile["contexts"] += [profile["profiler"], profile["resources"]]
+
+    for context in profile["contexts"]:
+        context.__enter__()
+    _RUNNING[task.task_id] = profile
+
+
+def finish_task_profile(task, *args):
+    '''Event handler writing the profile of a task, register it for ``Event.SUCCESS`` and ``Event.FAILURE``
+
+    :return: dict, the summary written to ``summary.json``
+    '''
+    profile = _RUNNING.pop(task.task_id, None)
+    if profile is None:
+        return None
+
+    for context in reversed(profile["contexts"]):
+        context.__exit__(None, None, None)
+
+    if "client" in profile:
+        records = [
+            {key: value for key, value in record.items() if key in ("key", "worker", "nbytes", "startstops", "status")}
+            for record in profile["task_stream"].data
+        ]
+        workers = profile["memory"].stop()
+    else:
+        records = [
+            {
+                "key": result.key,
+                "worker": "thread-{}".format(result.worker_id),
+                "startstops": [{"action": "compute", "start": result.start_time, "stop": result.end_time}],
+            }
+            for result in profile["profiler"].results
+        ]
+        memory = [result.mem for result in profile["resources"].results]
+        workers = {"local": {"peak_memory_bytes": int(max(memory) * 2 ** 20) if memory else None}}
+
+    summary = {
+        "task_id": task.task_id,
+        "wall_seconds": time.time() - profile["start"],
+        "scheduler": "distributed" if "client" in profile else "local",
+        "workers": workers,
+    }
+    summary.update(summarize_task_stream(records))
+
+    with open(os.path.join(profile["path"], "task_stream.json"), "w") as f:
+        json.dump(records, f, default=str)
+    with open(os.path.join(profile["path"], "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    return summary
@@ -0,0 +1,178 @@
+# Storage profiles for parquet datasets
+
+import time
+
+import luigi
+from fsspec.core import get_fs_token_paths
+
+
+class StorageProfile:
+    """Codec and layout used to write a parquet dataset
+
+    :param codec: string
+            One of snappy, zstd, lz4, gzip or none
+    :param level: int
+            Compression level for codecs that have one (zstd, gzip), None for the codec default
+    :param row_group_size: int
+            Rows per parquet row group, None for the engine default
+    :param partition_size: string or int
+            Target in-memory size of each partition, e.g. "128MB", None to keep the partitions as they are.
+            Dask computes the size of every partition to repartition, so this costs an extra pass over the data
+    :param engine: string
+            Parquet engine, pyarrow or fastparquet
+
+    Example::
+
+        profile = StorageProfile(codec="zstd", level=3, row_group_size=100000)
+        profile.write(ParquetTarget("data/CleanData/"), ddf)
+
+    """
+
+    CODECS = ("snappy", "zstd", "lz4", "gzip", "none")
+
+    def __init__(self, codec="snappy", level=None, row_group_size=None, partition_size=None, engine="pyarrow"):
+        if codec not in self.CODECS:
+            raise ValueError("Unknown codec {!r}, use one of {}".format(codec, ", ".join(self.CODECS)))
+        self.codec = codec
+        self.level = level
+        self.row_group_size = row_group_size
+        self.partition_size = partition_size
+        self.engine = engine
+
+    def __repr__(self):
+        return "StorageProfile(codec={!r}, level={!r}, row_group_size={!r}, partition_size={!r}, engine={!r})".format(
+            self.codec, self.level, self.row_group_size, self.partition_size, self.engine
+        )
+
+    def write_kwargs(self):
+        '''Keyword arguments for :func:`dask.dataframe.to_parquet` implementing the profile'''
+        codec = None if self.codec == "none" else self.codec
+        kwargs = {"engine": self.engine}
+
+        if self.engine == "fastparquet":
+            if codec is not None and self.level is not None:
+                codec = {"_default": {"type": codec.upper(), "args": {"level": self.level}}}
+            if self.row_group_size is not None:
+                kwargs["row_group_offsets"] = self.row_group_size
+        else:
+            if self.level is not None:
+                kwargs["compression_level"] = self.level
+            if self.row_group_size is not None:
+                kwargs["row_group_size"] = self.row_group_size
+
+        kwargs["compression"] = codec
+        return kwargs
+
+    def prepare(self, ddf):
+        '''Repartitions ddf to the target partition size, if any'''
+        if self.partition_size is None:
+            return ddf
+        return ddf.repartition(partition_size=self.partition_size)
+
+    def write(self, target, ddf, **kwargs):
+        '''Writes ddf to a dask target with this profile, see :meth:`BaseDaskTarget.write_dask`'''
+        write_kwargs = self.write_kwargs()
+        write_kwargs.update(kwargs)
+        return target.write_dask(self.prepare(ddf), **write_kwargs)
+
+
+# Profiles compared by the storage benchmark, and usable by name in StorageConfig
+STORAGE_PROFILES = {
+    "snappy": dict(codec="snappy"),
+    "zstd": dict(codec="zstd", level=3),
+    "zstd-high": dict(codec="zstd", level=9),
+    "lz4": dict(codec="lz4"),
+    "gzip": dict(codec="gzip"),
+    "none": dict(codec="none"),
+}
+
+
+class StorageConfig(luigi.Config):
+    """Storage profile of each task writing parquet, set in luigi.cfg
+
+    Example::
+
+        [StorageConfig]
+        default={"profile": "snappy"}
+        stages={"CleanData": {"profile": "zstd", "row_group_size": 100000}, "TransformData": {"codec": "lz4"}}
+
+    """
+    default = luigi.DictParameter(default={"profile": "snappy"})
+    # Settings by task family, see storage_profile
+    stages = luigi.DictParameter(default={})
+
+
+def task_storage_profile(task):
+    '''Returns the StorageProfile configured for a task in StorageConfig'''
+    config = StorageConfig()
+    return storage_profile(config.stages.get(task.get_task_family(), config.default))
+
+
+def storage_profile(settings):
+    '''Builds a StorageProfile from its settings
+
+    :param settings: dict
+            Either {"profile": name} for one of STORAGE_PROFILES, optionally overriding some of its fields,
+            or the keyword arguments of StorageProfile
+    :return: StorageProfile
+    '''
+    settings = dict(settings)
+    base = dict(STORAGE_PROFILES[settings.pop("profile")]) if "profile" in settings else {}
+    base.update(settings)
+    return StorageProfile(**base)
+
+
+def benchmark_storage_profiles(ddf, scratch_path, profiles, storage_options=None):
+    '''Measures write throughput, read throughput and on-disk size of a dataframe for each storage profile
+
+    The dataframe is persisted first, so that the timings do not include computing it.
+
+    :param ddf: dask dataframe
+            Data to benchmark with, e.g. a sample of an intermediate dataset
+    :param scratch_path: string
+            Directory ending with a path separator where each profile is written, then deleted
+    :param profiles: dict
+            StorageProfile by name
+    :param storage_options: dict
+            Options for the filesystem of scratch_path
+    :return: list of dicts, one per profile
+    '''
+    import dask.dataframe as dd
+
+    fs, _, _ = get_fs_token_paths(scratch_path, storage_options=storage_options)
+
+    ddf = ddf.persist()
+    rows = len(ddf)
+    memory_bytes = int(ddf.memory_usage(deep=True).sum().compute())
+
+    results = []
+    for name, profile in profiles.items():
+        path = scratch_path + name + "/"
+
+        start = time.perf_counter()
+        profile.prepare(ddf).to_parquet(path, storage_options=storage_options, **profile.write_kwargs())
+        write_seconds = time.perf_counter() - start
+
+        disk_bytes = fs.du(path)
+
+        # Decode every column, as a downstream task would
+        start = time.perf_counter()
+        dd.read_parquet(path, engine=profile.engine, storage_options=storage_options).map_partitions(len).compute()
+        read_seconds = time.perf_counter() - start
+
+        fs.rm(path, recursive=True)
+
+        results.append({
+            "profile": name,
+            "settings": repr(profile),
+            "rows": rows,
+            "memory_bytes": memory_bytes,
+            "disk_bytes": disk_bytes,
+            "compression_ratio": memory_bytes / disk_bytes if disk_bytes else None,
+            "write_seconds": write_seconds,
+            "read_seconds": read_seconds,
+            "write_mb_per_second": memory_bytes / 2 ** 20 / write_seconds,
+            "read_mb_per_second": memory_bytes / 2 ** 20 / read_seconds,
+        })
+
+    return results
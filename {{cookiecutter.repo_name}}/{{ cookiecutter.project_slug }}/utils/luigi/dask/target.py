@@ -0,0 +1,206 @@
+# csci_utils.luigi.dask.target
+
+import json
+
+from luigi import Target
+from fsspec.core import get_fs_token_paths
+
+
+class BaseDaskTarget(Target):
+    """Base target for dask collections stored as a directory of files
+
+    Directory datasets must be specified with an ending path separator. The target is complete once its flag file
+    (``_SUCCESS`` by default) has been written next to the data; pass ``flag=""`` for external data that is never
+    written by a task, in which case the directory existing is enough.
+
+    The flag doubles as a manifest listing the data files, so that checking completeness is a single stat of the flag,
+    and listing or reading the dataset needs no directory listing, which is slow on object storage. Flags written
+    empty by earlier versions fall back to listing the directory.
+
+    Example::
+
+        target = ParquetTarget("data/CleanData/", glob="*.parquet")
+        target.write_dask(ddf, compression="gzip")
+        ddf = target.read_dask(columns=["price"], filters=[("year", ">=", 2019)])
+
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, path, glob=None, flag="_SUCCESS", storage_options=None, fs=None):
+        self.path = path
+        self.glob = glob
+        self.flag = flag
+        self.storage_options = storage_options or {}
+
+        # Reuse the filesystem already resolved for the path, e.g. by TargetOutput
+        if fs is None:
+            fs, _, _ = get_fs_token_paths(path, storage_options=self.storage_options)
+        self.fs = fs
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.path)
+
+    @property
+    def flag_path(self):
+        return self.path + self.flag
+
+    def exists(self):
+        if self.flag:
+            return self.fs.exists(self.flag_path)
+        return self.fs.exists(self.path)
+
+    def mark_complete(self):
+        '''Writes the flag, listing the data files of the target as they are now'''
+        if not self.flag:
+            return
+
+        root = self._root()
+        manifest = {
+            "version": self.MANIFEST_VERSION,
+            "files": [path[len(root):] for path in self._list_files()],
+        }
+
+        # Through a temporary file, so that a partial flag never marks the target complete
+        temp_path = self.flag_path + ".tmp"
+        with self.fs.open(temp_path, "w") as f:
+            json.dump(manifest, f)
+        self.fs.mv(temp_path, self.flag_path)
+
+    def manifest(self):
+        '''Reads the data files listed by the flag, relative to the target path
+
+        :return: list of strings, or None for targets without a flag, not complete yet, or flagged by an empty file
+        '''
+        if not self.flag:
+            return None
+        try:
+            with self.fs.open(self.flag_path, "r") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if manifest.get("version") != self.MANIFEST_VERSION:
+            return None
+        return manifest["files"]
+
+    def _root(self):
+        # Target path as the filesystem lists it, without protocol and with a trailing separator
+        return self.fs._strip_protocol(self.path).rstrip("/") + "/"
+
+    def _read_path(self):
+        return self.path + self.glob if self.glob else self.path
+
+    def _list_files(self):
+        return sorted(self.fs.glob(self._read_path()))
+
+    def files(self):
+        '''Lists the data files of the target, sorted, from the flag of a complete target'''
+        names = self.manifest()
+        if names is None:
+            return self._list_files()
+        root = self._root()
+        return [root + name for name in names]
+
+    def _qualify(self, path):
+        # fsspec strips the protocol from listed paths, put it back so readers pick the right filesystem
+        if "://" in self.path and "://" not in path:
+            return self.path.split("://")[0] + "://" + path
+        return path
+
+    def read_dask(self, columns=None, filters=None, storage_options=None, files=None, **kwargs):
+        '''Reads the target as a dask collection
+
+        :param columns: list of strings
+                Column names to read. None reads all columns
+        :param filters: list of tuples
+                Row filters in DNF form, e.g. [("year", ">=", 2019)], pushed down to the reader where the format
+                supports it so that row groups that cannot match are never read
+        :param storage_options: dict
+                Options for the filesystem, defaults to the options of the target
+        :param files: list of strings
+                Subset of :meth:`files` to read, defaults to the whole target, as listed by its flag if complete
+        :return: dask collection
+        '''
+        if storage_options is None:
+            storage_options = self.storage_options
+        if storage_options:
+            kwargs["storage_options"] = storage_options
+
+        if files is None:
+            names = self.manifest()
+            if names:
+                files = [self._root() + name for name in names]
+
+        path = self._read_path() if files is None else [self._qualify(file) for file in files]
+
+        return self._read(path, columns=columns, filters=filters, **kwargs)
+
+    def write_dask(self, collection, compute=True, storage_options=None, **kwargs):
+        '''Writes a dask collection to the target, and marks it complete
+
+        :param collection: dask collection
+                Collection to be written
+        :param compute: boolean
+                If False, returns the delayed write and leaves calling :meth:`mark_complete` to the caller
+        :param storage_options: dict
+                Options for the filesystem, defaults to the options of the target
+        :return: Result of the write, or a delayed object if compute is False
+        '''
+        if storage_options is None:
+            storage_options = self.storage_options
+        if storage_options:
+            kwargs["storage_options"] = storage_options
+
+        out = self._write(collection, self.path, compute=compute, **kwargs)
+        if compute:
+            self.mark_complete()
+        return out
+
+    @classmethod
+    def _read(cls, path, columns=None, filters=None, **kwargs):
+        raise NotImplementedError()
+
+    @classmethod
+    def _write(cls, collection, path, **kwargs):
+        raise NotImplementedError()
+
+
+class ParquetTarget(BaseDaskTarget):
+    """Target for a directory of parquet files
+
+    Column projection and row filters are handed to the parquet reader, so only the requested columns, and the row
+    groups whose statistics can satisfy the filters, are read from storage.
+    """
+
+    @classmethod
+    def _read(cls, path, columns=None, filters=None, **kwargs):
+        import dask.dataframe as dd
+
+        return dd.read_parquet(path, columns=columns, filters=filters, **kwargs)
+
+    @classmethod
+    def _write(cls, collection, path, **kwargs):
+        return collection.to_parquet(path, **kwargs)
+
+
+class CSVTarget(BaseDaskTarget):
+    """Target for a directory of csv files
+
+    Columns are projected while parsing. Row filters need a columnar format, so read a :class:`ParquetTarget` to use
+    them.
+    """
+
+    @classmethod
+    def _read(cls, path, columns=None, filters=None, **kwargs):
+        if filters:
+            raise NotImplementedError("Row filters are not supported when reading csv, use a ParquetTarget")
+        if columns is not None:
+            kwargs["usecols"] = columns
+
+        import dask.dataframe as dd
+
+        return dd.read_csv(path, **kwargs)
+
+    @classmethod
+    def _write(cls, collection, path, **kwargs):
+        return collection.to_csv(path + "part-*.csv", **kwargs)
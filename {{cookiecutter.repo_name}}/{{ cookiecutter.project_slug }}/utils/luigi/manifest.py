@@ -0,0 +1,90 @@
+# Manifest of the source files processed into an incrementally built dataset
+
+import json
+
+from .cache import file_signature
+
+
+class SourceManifest:
+    """Record of the source files already processed into a dataset
+
+    Files are identified by their path, size and modification stamps (mtime and/or etag), so a new file, or a file
+    rewritten in place, is pending until it is added to the manifest. Each batch also records the data files it
+    appended to the dataset. The manifest is stored as JSON next to the dataset, and rewritten through a temporary file,
+    so saving it commits a batch: data files appended by a run that failed before saving are not recorded, and
+    :meth:`discard_uncommitted` deletes them before their source files are processed again.
+
+    Example::
+
+        manifest = SourceManifest(target.fs, target.path + SourceManifest.FILENAME)
+        manifest.discard_uncommitted(target)
+        pending = manifest.pending(source.fs, source.files())
+        ...  # process and append the pending files
+        manifest.add(pending, manifest.uncommitted(target))
+        manifest.save()
+
+    """
+
+    FILENAME = "_SOURCES.json"
+
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.path = path
+        self.batches = []
+        # Data files of the dataset appended by the batches, relative to its path
+        self.files = []
+
+        if fs.exists(path):
+            with fs.open(path, "r") as f:
+                manifest = json.load(f)
+            self.batches = manifest["batches"]
+            self.files = manifest["files"]
+
+    @staticmethod
+    def _key(signature):
+        return json.dumps(signature, sort_keys=True)
+
+    @property
+    def processed(self):
+        '''Set of keys of the file signatures already processed'''
+        return {self._key(signature) for batch in self.batches for signature in batch}
+
+    def pending(self, fs, paths):
+        '''Returns the signatures of the files in paths which have not been processed yet
+
+        :param fs: fsspec filesystem of the source files
+        :param paths: list of strings
+                Paths of the source files
+        :return: list of dicts, see :func:`file_signature`
+        '''
+        processed = self.processed
+        signatures = [file_signature(fs, path) for path in paths]
+        return [signature for signature in signatures if self._key(signature) not in processed]
+
+    def uncommitted(self, target):
+        '''Returns the data files of a target not recorded by any batch, relative to the target path'''
+        root = target._root()
+        committed = set(self.files)
+        return [path[len(root):] for path in target._list_files() if path[len(root):] not in committed]
+
+    def discard_uncommitted(self, target):
+        '''Deletes the data files a failed run appended to the target before saving the manifest
+
+        :return: list of the deleted files, relative to the target path
+        '''
+        orphans = self.uncommitted(target)
+        if orphans:
+            target.fs.rm([target._root() + name for name in orphans])
+        return orphans
+
+    def add(self, signatures, files=()):
+        '''Records a batch of processed source files, and the data files it appended to the dataset'''
+        if signatures:
+            self.batches.append(list(signatures))
+        self.files.extend(files)
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with self.fs.open(temp_path, "w") as f:
+            json.dump({"batches": self.batches, "files": self.files}, f, indent=2)
+        self.fs.mv(temp_path, self.path)
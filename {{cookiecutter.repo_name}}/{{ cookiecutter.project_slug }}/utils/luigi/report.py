@@ -0,0 +1,257 @@
+# Performance report of the tasks run by a build
+
+import json
+import os
+import resource
+import threading
+import time
+
+from luigi.task import flatten
+
+from .dask.cluster import connect_dask_client
+from .dask.target import BaseDaskTarget
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+# Identifies the build in the report directory. Set once by the first process to import this module, and inherited by
+# the worker processes luigi forks
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+os.environ.setdefault(RUN_ID_ENV, time.strftime("%Y%m%d-%H%M%S") + "-" + str(os.getpid()))
+
+REPORTS_DIR = "_reports"
+
+# Measurements of the tasks running in this process, by task id
+_RUNNING = {}
+
+
+class PeakMemory:
+    """Samples the resident memory of this process in a background thread, keeping the peak
+
+    Luigi runs several tasks in the same process with a single worker, so the lifetime peak of the process
+    (``ru_maxrss``) would not tell the tasks apart. Without psutil, it is the fallback.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        process = psutil.Process()
+        while True:
+            self.peak = max(self.peak, process.memory_info().rss)
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        '''Stops sampling, and returns the peak resident memory in bytes'''
+        if self._thread is None:
+            # ru_maxrss is in kilobytes on linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+def _worker_cpu_seconds(client):
+    '''CPU time used so far by each dask worker process, by worker address'''
+    try:
+        return client.run(time.process_time)
+    except (OSError, TimeoutError):
+        return {}
+
+
+class WorkerUsage:
+    """Measures the CPU time and peak memory of the dask workers of the shared cluster while a task runs
+
+    Under the cluster started by ``__main__``, the dask work of a task runs in the worker processes, not in the luigi
+    process measured by :class:`PeakMemory`. The workers are shared, so tasks running at the same time are each
+    charged the work of both.
+    """
+
+    def __init__(self, client):
+        from .dask.profile import WorkerMemorySampler
+
+        self.client = client
+        self.cpu = _worker_cpu_seconds(client)
+        self.memory = WorkerMemorySampler(client).start()
+
+    def stop(self):
+        '''Stops measuring, and returns the CPU seconds of the workers and the sum of their peak memory in bytes'''
+        peaks = self.memory.stop()
+        cpu = _worker_cpu_seconds(self.client)
+        # Workers restarted during the task are left out of the CPU time
+        cpu_seconds = sum(cpu[address] - self.cpu[address] for address in cpu if address in self.cpu)
+        return cpu_seconds, sum(peak["peak_memory_bytes"] for peak in peaks.values())
+
+
+def target_stats(target):
+    '''Measures a target from its file listing and metadata, without reading its data
+
+    :return: dict with the path, and the number of files, bytes and rows where they can be known. Rows are read
+             from the footers of parquet files
+    '''
+    stats = {"path": getattr(target, "path", repr(target)), "files": None, "bytes": None, "rows": None}
+
+    if isinstance(target, BaseDaskTarget):
+        if not target.exists():
+            return stats
+        files = target.files()
+        stats["files"] = len(files)
+        stats["bytes"] = sum(target.fs.size(path) for path in files)
+        if files and all(path.endswith(".parquet") for path in files):
+            import pyarrow.parquet as pq
+
+            rows = 0
+            for path in files:
+                with target.fs.open(path, "rb") as f:
+                    rows += pq.ParquetFile(f).metadata.num_rows
+            stats["rows"] = rows
+    elif hasattr(target, "path") and os.path.isfile(target.path):
+        stats["files"] = 1
+        stats["bytes"] = os.path.getsize(target.path)
+
+    return stats
+
+
+def _total(stats, key):
+    values = [item[key] for item in stats if item[key] is not None]
+    return sum(values) if values else None
+
+
+def report_dir(dir_path):
+    return os.path.join(dir_path, REPORTS_DIR, os.environ[RUN_ID_ENV])
+
+
+def start_task_report(task):
+    '''Event handler starting the measurements of a task, register it with ``Task.event_handler(Event.START)``'''
+    client = connect_dask_client(task)
+    _RUNNING[task.task_id] = {
+        "wall": time.perf_counter(),
+        "cpu": time.process_time(),
+        "memory": PeakMemory().start(),
+        "workers": WorkerUsage(client) if client is not None else None,
+        "started": time.time(),
+    }
+
+
+def finish_task_report(task, status):
+    '''Ends the measurements of a task, and writes them to the report directory of the build
+
+    :return: dict, the record of the task
+    '''
+    running = _RUNNING.pop(task.task_id, None)
+    dir_path = getattr(task, "dir_path", None)
+    if running is None or dir_path is None:
+        return None
+
+    client_cpu_seconds = time.process_time() - running["cpu"]
+    client_peak_rss_bytes = running["memory"].stop()
+    worker_cpu_seconds, worker_peak_memory_bytes = None, None
+    if running["workers"] is not None:
+        worker_cpu_seconds, worker_peak_memory_bytes = running["workers"].stop()
+
+    inputs = [target_stats(target) for target in flatten(task.input())]
+    outputs = [target_stats(target) for target in flatten(task.output())]
+
+    record = {
+        "task_id": task.task_id,
+        "task_family": task.get_task_family(),
+        "status": status,
+        "started": running["started"],
+        "wall_seconds": time.perf_counter() - running["wall"],
+        # The luigi process running the task, and the dask workers of the shared cluster, if any
+        "cpu_seconds": client_cpu_seconds + (worker_cpu_seconds or 0),
+        "peak_rss_bytes": client_peak_rss_bytes + (worker_peak_memory_bytes or 0),
+        "client_cpu_seconds": client_cpu_seconds,
+        "client_peak_rss_bytes": client_peak_rss_bytes,
+        "worker_cpu_seconds": worker_cpu_seconds,
+        "worker_peak_memory_bytes": worker_peak_memory_bytes,
+        "rows_in": _total(inputs, "rows"),
+        "rows_out": _total(outputs, "rows"),
+        "partitions_in": _total(inputs, "files"),
+        "partitions_out": _total(outputs, "files"),
+        "bytes_in": _total(inputs, "bytes"),
+        "bytes_out": _total(outputs, "bytes"),
+        "inputs": inputs,
+        "outputs": outputs,
+    }
+
+    path = report_dir(dir_path)
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, task.task_id + ".json"), "w") as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def succeed_task_report(task):
+    '''Event handler, register it with ``Task.event_handler(Event.SUCCESS)``'''
+    return finish_task_report(task, "SUCCESS")
+
+
+def fail_task_report(task, exception):
+    '''Event handler, register it with ``Task.event_handler(Event.FAILURE)``'''
+    return finish_task_report(task, "FAILURE")
+
+
+def write_run_report(dir_path):
+    '''Gathers the records of the tasks of this build into ``run_report.json``
+
+    :param dir_path: string
+            Data directory of the tasks
+    :return: dict with the run id and the task records, in the order the tasks started
+    '''
+    path = report_dir(dir_path)
+    records = []
+    if os.path.isdir(path):
+        for name in os.listdir(path):
+            if name.endswith(".json") and name != "run_report.json":
+                with open(os.path.join(path, name), "r") as f:
+                    records.append(json.load(f))
+
+    report = {"run_id": os.environ[RUN_ID_ENV], "tasks": sorted(records, key=lambda record: record["started"])}
+    if records:
+        with open(os.path.join(path, "run_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def _format(value, scale=1, digits=1):
+    return "-" if value is None else "{:.{}f}".format(value / scale, digits)
+
+
+def summarize_run_report(report):
+    '''Formats a run report as a compact table, one line per task. CPU time and peak memory add up the luigi process
+    and the dask workers of the shared cluster'''
+    header = ("task", "status", "wall s", "cpu s", "peak MB", "rows in", "rows out", "parts out", "MB in", "MB out")
+    lines = [header]
+    for record in report["tasks"]:
+        lines.append((
+            record["task_family"],
+            record["status"],
+            _format(record["wall_seconds"]),
+            _format(record["cpu_seconds"]),
+            _format(record["peak_rss_bytes"], 2 ** 20),
+            _format(record["rows_in"], digits=0),
+            _format(record["rows_out"], digits=0),
+            _format(record["partitions_out"], digits=0),
+            _format(record["bytes_in"], 2 ** 20),
+            _format(record["bytes_out"], 2 ** 20),
+        ))
+
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return "\n".join(
+        "  ".join(value.ljust(width) if column == 0 else value.rjust(width)
+                  for column, (value, width) in enumerate(zip(line, widths)))
+        for line in lines
+    )
@@ -0,0 +1,111 @@
+# Local read-through cache of remote source files
+
+import hashlib
+import json
+import os
+
+import luigi
+
+from .cache import OutputCache, file_signature
+
+
+class SourceCache(OutputCache):
+    """Size-bounded local copy of source files, evicting the least recently used files
+
+    Each file is stored in ``<root>/<key>/<file name>``, where the key hashes its path, size and modification stamps
+    (mtime and/or etag), so a file rewritten in place is fetched again while unchanged files are read from disk across
+    runs and tasks. Missing files are fetched in one call to the source filesystem, which downloads them concurrently
+    on object storage. Eviction is that of :class:`OutputCache`.
+
+    Example::
+
+        cache = SourceCache("data/_source_cache", max_bytes=20 * 2 ** 30)
+        local_paths = cache.fetch(source.fs, source.files())
+        cache.evict(keep=cache.entries_of(local_paths))
+
+    """
+
+    ENTRY_GLOB = "/*"
+    ENTRY_PATTERN = "/" + "[0-9a-f]" * 64
+
+    def __init__(self, root, max_bytes):
+        super().__init__(root, max_bytes)
+        self.fs.makedirs(self.root, exist_ok=True)
+
+    def key(self, fs, path):
+        '''Cache key of the current version of a source file, from its metadata only'''
+        return hashlib.sha256(json.dumps(file_signature(fs, path), sort_keys=True).encode()).hexdigest()
+
+    def local_path(self, fs, path):
+        return "/".join([self.root, self.key(fs, path), os.path.basename(path.rstrip("/"))])
+
+    def fetch(self, fs, paths):
+        '''Copies the source files missing from the cache, and marks all of them as used
+
+        :param fs: fsspec filesystem of the source files
+        :param paths: list of strings
+                Paths of the source files
+        :return: list of strings, local paths of the cached copies, in the order of paths
+        '''
+        local_paths = [self.local_path(fs, path) for path in paths]
+
+        missing = [(path, local) for path, local in zip(paths, local_paths) if not self.fs.exists(local)]
+        if missing:
+            # Through temporary files, so that an interrupted download is never taken for a cached file
+            temp_paths = [local + ".tmp" for _, local in missing]
+            for _, local in missing:
+                self.fs.makedirs(self.entry(local), exist_ok=True)
+            fs.get([path for path, _ in missing], temp_paths)
+            for temp_path, (_, local) in zip(temp_paths, missing):
+                self.fs.mv(temp_path, local)
+
+        for local in local_paths:
+            self.touch(local)
+        return local_paths
+
+    def entries_of(self, local_paths):
+        '''Entries holding the given cached files'''
+        return {self.entry(local) for local in local_paths}
+
+
+class SourceCacheConfig(luigi.Config):
+    # Cache remote source files on local disk, read them from there
+    enabled = luigi.BoolParameter(default=True)
+    # Directory of the cache, None for _source_cache/ under the dir_path of the reading task
+    path = luigi.OptionalParameter(default=None)
+    # Size limit of the cache, least recently used files are evicted beyond it, 0 for no limit
+    max_bytes = luigi.IntParameter(default=20 * 2 ** 30)
+    # Read local sources in place. Disable to cache them too, e.g. to try the cache with a local directory standing
+    # in for a bucket
+    remote_only = luigi.BoolParameter(default=True)
+
+
+def is_local(fs):
+    protocols = fs.protocol if isinstance(fs.protocol, (tuple, list)) else [fs.protocol]
+    return any(protocol in ("file", "local") for protocol in protocols)
+
+
+def cache_source_files(target, files, dir_path):
+    '''Reads source files through the cache set up in the [SourceCacheConfig] section of luigi.cfg
+
+    :param target: BaseDaskTarget
+            Source target, e.g. the csv files of DownloadData
+    :param files: list of strings
+            Files of the target to be read
+    :param dir_path: string
+            Directory of the reading task's outputs, holding the cache unless a path is configured
+    :return: tuple of a target of the same class over the local cache, and the cached copies of files to read from
+             it. The target and files as given when caching is disabled, or does not apply to a local source
+    '''
+    config = SourceCacheConfig()
+    if not config.enabled or (config.remote_only and is_local(target.fs)):
+        return target, files
+
+    root = config.path or dir_path.rstrip("/") + "/_source_cache"
+    cache = SourceCache(root, config.max_bytes)
+    local_paths = cache.fetch(target.fs, files)
+
+    if config.max_bytes:
+        cache.evict(keep=cache.entries_of(local_paths))
+
+    return target.__class__(cache.root + "/", glob=target.glob, flag=""), local_paths
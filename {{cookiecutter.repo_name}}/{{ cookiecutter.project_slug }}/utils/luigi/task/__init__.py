@@ -3,7 +3,9 @@
 from luigi import LocalTarget
 from functools import partial
 
-from dask.bytes.core import get_fs_token_paths
+from fsspec.core import get_fs_token_paths
+
+from ..dask.target import BaseDaskTarget
 
 
 class Requirement:
@@ -104,7 +106,16 @@ class TargetOutput:
         return partial(self.__call__, task)
         # return lambda: self(task)
 
-    def __call__(self, task):      
+    def __call__(self, task):
+        # Luigi calls output() many times while scheduling, and task parameters never change, so resolve the target
+        # and its filesystem once per task instance
+        targets = task.__dict__.setdefault("_target_outputs", {})
+        if self not in targets:
+            targets[self] = self.resolve(task)
+        return targets[self]
+
+    def resolve(self, task):
+        '''Builds the target of a task'''
         # Use either ext to specify extensions or no ext in which case custom params go to 
         revised_kwargs = {i: self.target_kwargs[i] for i in self.target_kwargs if i != "ext"}
 
@@ -119,16 +130,17 @@ class TargetOutput:
         # Note that these targets force you to specify directory datasets with an ending /; Dask (annoyingly) is
         # inconsistent on this, so you may find yourself manipulating paths inside ParquetTarget and CSVTarget
         # differently. The user of these targets should not need to worry about these details!
-        path_sep = get_fs_token_paths(target_path)[0].sep
-        if target_path[-1] != path_sep:
+        fs, _, _ = get_fs_token_paths(target_path, storage_options=self.target_kwargs.get("storage_options"))
+        if target_path[-1] != fs.sep:
             if target_path[-1] == "/":
                 target_path = target_path[:-1]
-            target_path = target_path + path_sep
-        fs, _, _ = get_fs_token_paths(target_path)
+            target_path = target_path + fs.sep
 
         if "{ext}" not in self.file_pattern and not "" == self.ext:
             target_path = target_path + self.ext
 
-        return self.target_class(target_path, **revised_kwargs)
-
+        # Dask targets reuse the filesystem instead of resolving it again
+        if issubclass(self.target_class, BaseDaskTarget):
+            revised_kwargs["fs"] = fs
 
+        return self.target_class(target_path, **revised_kwargs)
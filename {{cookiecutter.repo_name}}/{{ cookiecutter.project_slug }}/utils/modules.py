@@ -0,0 +1,48 @@
+# Reads the source and constants of modules without importing them, so that task definitions stay quick to import
+
+import ast
+import importlib.util
+import tokenize
+
+
+def module_source(name):
+    '''Returns the source of a module found on the path, without importing it
+
+    :param name: string
+            Absolute name of the module, e.g. "project.preprocess.cleandata". Its parent packages are imported
+    :return: string
+    '''
+    spec = importlib.util.find_spec(name)
+    if spec is None or not spec.has_location or not spec.origin.endswith(".py"):
+        raise ImportError("No python source found for module {}".format(name))
+
+    # Decoded as the interpreter would, honoring any encoding declaration
+    with tokenize.open(spec.origin) as f:
+        return f.read()
+
+
+def module_constant(name, constant):
+    '''Reads a module level constant assigned a literal, e.g. ``BINS = 20``, without importing the module
+
+    Useful for parameter defaults of tasks, whose stage modules import heavy libraries.
+
+    :param name: string
+            Absolute name of the module
+    :param constant: string
+            Name of the constant. Its last assignment in the module body is used
+    :return: the value of the literal
+    '''
+    found, value = False, None
+    for node in ast.parse(module_source(name)).body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        if any(isinstance(target, ast.Name) and target.id == constant for target in targets):
+            found, value = True, ast.literal_eval(node.value)
+
+    if not found:
+        raise AttributeError("module {} assigns no constant {}".format(name, constant))
+    return value
@@ -3,11 +3,21 @@ import seaborn as sns
 import pandas as pd
 import numpy as np
 
-def plot_feature_importance(model, feature_names):
+from ..model.permutationimportance import cached_permutation_importance, permutation_importance
+
+# Specify label or target column name
+LABEL = "<add yours here>"
+
+# Rows of the test set sampled to compute permutation importance, for models without feature_importances_
+PERMUTATION_SAMPLE_ROWS = 10000
+PERMUTATION_REPEATS = 5
+
+
+def plot_feature_importance(importances, feature_names):
     ''' Sample - modify if you need to plot the feature importance in any other way
-    Plots feature importances given the model and feature names as a list
-    :param model: model
-                Fitted model
+    Plots feature importances given the importances and feature names as lists
+    :param importances: list of floats
+                Importance of each feature, e.g. model.feature_importances_
     :param feature_names: list of strings
                 List of column names in the data set used to fit the model
     :return: matplotlib fig object containing visualization which can be displayed or saved to file
@@ -16,7 +26,7 @@ def plot_feature_importance(model, feature_names):
     feature_importance = (
         pd.DataFrame({
             'feature': feature_names,
-            'importance': model.feature_importances_})
+            'importance': importances})
         )
 
     feature_importance = (feature_importance.sort_values(by="importance", ascending=False))
@@ -32,22 +42,58 @@ def plot_feature_importance(model, feature_names):
 
     return fig
 
-def visualizefeaturesignificance(model, ddf):
-    ''' FRAMEWORK CODE - Modify only the label
-    Called by orchestrator after model is trained to visualize significance of features for the specified label
+def sample_rows(ddf, rows, random_state=0):
+    ''' Samples about the given number of rows of a dask dataframe into pandas
+    :param ddf: dataframe
+                Dask dataframe to sample
+    :param rows: int
+                Number of rows wanted, all rows if the dataframe has fewer
+    :return: pandas dataframe
+    '''
+
+    total = len(ddf)
+    if total <= rows:
+        return ddf.compute()
+    return ddf.sample(frac=rows / total, random_state=random_state).compute()
+
+
+def visualizefeaturesignificance(model, ddf, importance_cache_path=None, sample_size=PERMUTATION_SAMPLE_ROWS,
+                                 n_repeats=PERMUTATION_REPEATS, n_jobs=None, random_state=0):
+    ''' FRAMEWORK CODE - Modify only LABEL at the top of this file
+    Called by orchestrator after model is trained to visualize significance of features for the specified label.
+    Uses the feature_importances_ of the model, or permutation importance on a sample of ddf for models without them
     :param model: model
                 Fitted model
     :param ddf: dataframe
                 Dask dataframe used to fit the model.
                 Note that this could have been just the list of column names, but passing dataframe to permit changes
+    :param importance_cache_path: string
+                JSON file caching the permutation importance, None not to cache it. ddf is only sampled when nothing
+                is cached there
+    :param sample_size: int
+                Rows sampled from ddf for permutation importance
+    :param n_repeats: int
+                Shuffles of each feature for permutation importance
+    :param n_jobs: int
+                Worker processes for permutation importance, None for the threads of the build's dask cluster
     :return: matplotlib fig to be displayed or saved
     '''
 
-    # Specify label or target column name
-    label = "<add yours here>"
-
     # FRAMEWORK CODE begins
-    X_test = ddf.drop(label, axis=1)
+    X_test = ddf.drop(LABEL, axis=1)
     features = X_test.columns
-    
-    return plot_feature_importance(model, features)
\ No newline at end of file
+
+    importances = getattr(model, "feature_importances_", None)
+    if importances is None:
+        def load_sample():
+            sample = sample_rows(ddf, sample_size, random_state)
+            return sample.drop(LABEL, axis=1), sample[LABEL]
+
+        kwargs = dict(n_repeats=n_repeats, n_jobs=n_jobs, random_state=random_state)
+        if importance_cache_path is None:
+            result = permutation_importance(model, *load_sample(), **kwargs)
+        else:
+            result = cached_permutation_importance(model, load_sample, importance_cache_path, **kwargs)
+        importances = result["importances_mean"]
+
+    return plot_feature_importance(importances, features)
@@ -1,58 +1,163 @@
+import dask
+import dask.array as da
 import matplotlib.pyplot as plt
-import pandas as pd
+import numpy as np
 
-def plot_predicted_vs_actual(x, predictions, actuals):
+from ..model.evaluatemodel import prediction_dask_array
+
+# Specify the label. The orchestrator reads only this column of the test set
+LABEL = "<Add yours here>"
+
+# Number of bins of the histogram and heatmap, and how their edges are placed: "fixed" for equal widths between the
+# minimum and maximum, "quantile" for equal counts
+BINS = 20
+BINNING = "fixed"
+BINNINGS = ("fixed", "quantile")
+
+# Percentiles computed per chunk for each quantile bin edge. Dask merges the percentiles of the chunks by
+# interpolating between those computed, so only computing the edges places them far off in the tails
+PERCENTILES_PER_BIN = 100
+
+
+def series_dask_array(series):
     '''
-    Plots predicted vs actuals
-    :param x: series
-            x values useful for scatterplots
-    :param predictions: series
-            Series containing predictions from model evaluation
-    :param actuals: series
-            Series containing actual values, e.g. from test set
-    :return: matplotlib fig to display or save
+    Converts a dask series to a dask array with known chunk sizes, reading the series once to count its rows.
+    The partitions are taken from the optimized graph, as dask may fuse small parquet files when reading few columns
+    :param series: dask series
+            Series to convert
+    :return: dask array, one chunk per partition
+    '''
+
+    partitions = series.to_delayed()
+    lengths = dask.compute(*[dask.delayed(len)(partition) for partition in partitions])
+
+    return da.concatenate([
+        da.from_delayed(partition.to_numpy(), shape=(length,), dtype=series.dtype)
+        for partition, length in zip(partitions, lengths)
+    ])
+
+
+def bin_edges(values, bins=BINS, binning=BINNING):
+    '''
+    Finds the bin edges of a dask array with a single pass over it
+    :param values: dask array
+            Values to be binned
+    :param bins: int
+            Number of bins
+    :param binning: string
+            "fixed" or "quantile", see BINNING
+    :return: numpy array of increasing edges, at most bins + 1 of them
     '''
 
-    fig = plt.figure(figsize=(30, 15))
+    if binning not in BINNINGS:
+        raise ValueError("Unknown binning {!r}, use one of {}".format(binning, ", ".join(BINNINGS)))
+
+    if binning == "quantile":
+        # Percentiles are approximated per chunk and merged, the exact minimum and maximum keep every value in range
+        percentiles = da.percentile(values, np.linspace(0, 100, bins * PERCENTILES_PER_BIN + 1))
+        low, high, percentiles = dask.compute(values.min(), values.max(), percentiles)
+        edges = percentiles[::PERCENTILES_PER_BIN]
+        edges = np.unique(np.clip(edges, low, high))
+        edges[0], edges[-1] = low, high
+    else:
+        low, high = dask.compute(values.min(), values.max())
+        edges = np.linspace(low, high, bins + 1)
+
+    if len(edges) < 2 or edges[0] == edges[-1]:
+        edges = np.array([low - 0.5, high + 0.5])
+    return edges
+
+
+def error_histogram(actuals, predictions, bins=BINS, binning=BINNING):
+    '''
+    Counts the prediction errors in bins with dask reductions
+    :param actuals: dask array
+            Actual values, e.g. from the test set
+    :param predictions: dask array
+            Predicted values, chunked as actuals
+    :return: Tuple of numpy arrays (counts, edges)
+    '''
+
+    errors = actuals - predictions
+    edges = bin_edges(errors, bins, binning)
+    counts, _ = da.histogram(errors, bins=edges)
+
+    return counts.compute(), edges
+
+
+def prediction_heatmap(actuals, predictions, bins=BINS, binning=BINNING):
+    '''
+    Counts the (actual, predicted) pairs in a 2D grid of bins with dask reductions. Both axes share the same edges, so
+    accurate predictions fall on the diagonal
+    :param actuals: dask array
+            Actual values, e.g. from the test set
+    :param predictions: dask array
+            Predicted values, chunked as actuals
+    :return: Tuple of numpy arrays (counts by actual then predicted bin, edges)
+    '''
+
+    edges = bin_edges(da.concatenate([actuals, predictions.astype(actuals.dtype)]), bins, binning)
+    counts, _, _ = da.histogram2d(actuals, predictions, bins=[edges, edges])
+
+    return counts.compute(), edges
+
+
+def plot_prediction_errors(counts, edges, heatmap=None):
+    '''
+    Plots the histogram of prediction errors, and the predicted vs actual heatmap if given, in a single figure
+    :param counts: numpy array
+            Counts of errors in each bin
+    :param edges: numpy array
+            Bin edges of the errors
+    :param heatmap: tuple
+            Counts and edges returned by prediction_heatmap, None to plot only the histogram
+    :return: matplotlib fig to display or save
+    '''
 
-    fig, ax = plt.subplots()
     plt.rcParams['font.size'] = 24
+    fig, axes = plt.subplots(1, 1 if heatmap is None else 2, figsize=(30 if heatmap is None else 45, 15), squeeze=False)
 
-    # ax.scatter(x = range(0, actuals.size), y=actuals, c = 'blue', label = 'Actual', alpha = 0.3)
-    # ax.scatter(x = range(0, predictions.size), y=predictions, c = 'red', label = 'Predicted', alpha = 0.3)
-    # plt.title('Actual and predicted values')
-    # plt.xlabel('Observations')
-    # plt.ylabel('mpg')
-    # plt.legend()
+    ax = axes[0, 0]
+    ax.stairs(counts, edges, fill=True)
+    ax.set_title('Histogram of prediction errors')
+    ax.set_xlabel('Prediction error')
+    ax.set_ylabel('Frequency')
 
-    diff = actuals - predictions
-    diff.hist(bins = 20)
-    plt.title('Histogram of prediction errors')
-    plt.xlabel('Prediction error')
-    plt.ylabel('Frequency')
+    if heatmap is not None:
+        heatmap_counts, heatmap_edges = heatmap
+        ax = axes[0, 1]
+        mesh = ax.pcolormesh(heatmap_edges, heatmap_edges, heatmap_counts.T, cmap="viridis")
+        ax.plot(heatmap_edges[[0, -1]], heatmap_edges[[0, -1]], color="red", linewidth=1)
+        ax.set_title('Predicted vs actual')
+        ax.set_xlabel('Actual')
+        ax.set_ylabel('Predicted')
+        fig.colorbar(mesh, ax=ax, label='Frequency')
 
     return fig
 
 
-def visualizepredictions(y_predicted, test_ddf):
-    ''' FRAMEWORK CODE - Only modify label and x_axis_column name
-    Called by orchstrator to visualize predictions
-    :param y_predicted: numpy array
-                    Contains predicted values of the label
+def visualizepredictions(predictions_path, test_ddf, bins=BINS, binning=BINNING, heatmap=False):
+    ''' FRAMEWORK CODE - Only modify LABEL at the top of this file
+    Called by orchstrator to visualize predictions. Errors are binned with dask reductions over the test set, so only
+    the bin counts are held in memory whatever its size
+    :param predictions_path: string
+                    Path of the prediction array written by EvaluateModel, in the row order of test_ddf
     :param test_ddf: dataframe
-                    Test set
+                    Test set, containing at least the LABEL column
+    :param bins: int
+                    Number of bins
+    :param binning: string
+                    "fixed" or "quantile", see BINNING
+    :param heatmap: boolean
+                    Also plot a binned heatmap of predicted vs actual values
     :return: matplotlib fig to display or save
     '''
 
-    label = "<Add yours here>"
-    x_axis_column = "<Add yours here>"
+    # Chunk the predictions as the label column, so that both line up row by row
+    actuals = series_dask_array(test_ddf[LABEL])
+    predictions = prediction_dask_array(predictions_path, actuals.chunks[0])
 
-    y_test = test_ddf[label]
-    x = test_ddf[x_axis_column]
+    counts, edges = error_histogram(actuals, predictions, bins, binning)
+    heatmap_bins = prediction_heatmap(actuals, predictions, bins, binning) if heatmap else None
 
-    # Convert predictions which is a numpy array to a pandas series
-    # Convert actuals which is a Dask series to a pandas series
-    predictions = pd.Series(y_predicted)
-    actuals = y_test.compute()
-    
-    return plot_predicted_vs_actual(x, predictions, actuals)
\ No newline at end of file
+    return plot_prediction_errors(counts, edges, heatmap_bins)